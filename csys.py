@@ -24,6 +24,7 @@ class Cartisian(object):
         z = np.cross(vec1, vec2)
         self.__z = z/np.linalg.norm(z)
         self.__y = np.cross(self.z, self.x)
+        self.__V=None
         self.__name=uuid.uuid1() if name==None else name
         
     @property
@@ -48,13 +49,15 @@ class Cartisian(object):
         
     @property
     def transform_matrix(self):
-        x=self.x
-        y=self.y
-        z=self.z
-        V=np.array([[x[0],y[0],z[0]],
-                  [x[1],y[1],z[1]],
-                  [x[2],y[2],z[2]]])
-        return V.transpose()
+        """
+        3x3 rotation matrix with the local axes as rows, it is formed once and
+        kept until the axes change. The returned array is read-only.
+        """
+        if self.__V is None:
+            V=np.array([self.x,self.y,self.z],dtype=float)
+            V.flags.writeable=False
+            self.__V=V
+        return self.__V
     
     def set_by_3pts(self,origin, pt1, pt2):
         """
@@ -62,16 +65,17 @@ class Cartisian(object):
         pt1: tuple 3
         pt2: tuple 3
         """
-        self.origin=origin    
+        self.__origin=origin    
         vec1 = np.array([pt1[0] - origin[0] , pt1[1] - origin[1] , pt1[2] - origin[2]])
         vec2 = np.array([pt2[0] - origin[0] , pt2[1] - origin[1] , pt2[2] - origin[2]])
         cos = np.dot(vec1, vec2)/np.linalg.norm(vec1)/np.linalg.norm(vec2)
         if  cos == 1 or cos == -1:
             raise Exception("Three points should not in a line!!")        
-        self.x = vec1/np.linalg.norm(vec1)
+        self.__x = vec1/np.linalg.norm(vec1)
         z = np.cross(vec1, vec2)
-        self.z = z/np.linalg.norm(z)
-        self.y = np.cross(self.z, self.x)
+        self.__z = z/np.linalg.norm(z)
+        self.__y = np.cross(self.z, self.x)
+        self.__V=None
     
     def set_origin(self,x, y, z):
         """
@@ -79,12 +83,13 @@ class Cartisian(object):
         pt1: tuple 3
         pt2: tuple 3
         """
-        self.origin = (x,y,z)
+        self.__origin = (x,y,z)
     
     def align_with_global(self):
         self.__x=np.array([1,0,0])
         self.__y=np.array([0,1,0])
         self.__z=np.array([0,0,1])
+        self.__V=None
 
 if __name__=='__main__':
     csys=Cartisian((0,0,0),(1,1,0),(0,1,0))
@@ -10,33 +10,234 @@ __all__=[]
 import numpy as np
 
 import scipy.sparse as spr
-from scipy.sparse import linalg as sl
 import logger
 from .node import Node
-from .element import Beam,Membrane3,Membrane4
+from .element import Beam,Membrane3,Membrane4,beam_matrices,beam_cache_info,condense_batch,\
+membrane3_B,membrane3_stiffness,\
+membrane4_B,membrane4_stiffness,GAUSS_2x2_WEIGHTS,QUAD4_EXTRAPOLATION
+from .table import NodeTable,BeamTable
+from .damping import Damping,matrix_arrays
+from .symmetric import FORMATS,as_operator
+from .matrix_free import ElementOperator
+from .out_of_core import Scratch
+
+def _scatter(dofs,Ae,triu=False):
+    """
+    Expand stacked element matrices to triplets of a global matrix.
+    
+    params:
+        dofs: nxm array of global DOFs of elements.
+        Ae: nxmxm array of element matrices on global csys.
+        triu: if True, only entries on and above the diagonal are kept.
+    return:
+        data,row,col of the non-zero entries.
+    """
+    m=dofs.shape[1]
+    row=np.repeat(dofs,m,axis=1).ravel()
+    col=np.tile(dofs,(1,m)).ravel()
+    data=Ae.ravel()
+    nz=data!=0
+    if triu:
+        nz&=row<=col
+    return data[nz],row[nz],col[nz]
+
+def _scatter_blocks(conn,Ae):
+    """
+    Expand stacked element matrices to 6x6 node blocks of a global matrix.
+    
+    params:
+        conn: nxm array of hids of element nodes.
+        Ae: nx6mx6m array of element matrices on global csys.
+    return:
+        blocks,row,col of the non-zero blocks, row and col are node hids.
+    """
+    n,m=conn.shape
+    blocks=Ae.reshape((n,m,6,m,6)).transpose(0,1,3,2,4).reshape((-1,6,6))
+    row=np.repeat(conn,m,axis=1).ravel()
+    col=np.tile(conn,(1,m)).ravel()
+    nz=blocks.any(axis=(1,2))
+    return blocks[nz],row[nz],col[nz]
+
+def _triplets(conn,Ae,fmt):
+    """
+    Entries of stacked element matrices in the form the global format is 
+    built from, see _scatter and _scatter_blocks.
+    """
+    if fmt=='bsr':
+        return _scatter_blocks(conn,Ae)
+    m=conn.shape[1]
+    dofs=(conn[:,:,None]*6+np.arange(6)).reshape((-1,6*m))
+    if fmt=='ebe':
+        return dofs,Ae
+    return _scatter(dofs,Ae,fmt=='triu')
+
+def _build(ijv,n_nodes,fmt='full',scratch=None,name='K'):
+    """
+    Build a global matrix from lists of triplets.
+    
+    params:
+        ijv: list of data,row,col arrays.
+        n_nodes: number of nodes.
+        fmt: 'full', 'triu' for csr matrix, 'bsr' for 6x6 blocked matrix, 
+            or 'ebe' for matrix-free operator.
+        scratch: Scratch, if given, csr and bsr matrices are built on 
+            memory-mapped arrays named after name.
+    """
+    n=n_nodes*6
+    if fmt=='ebe':
+        return ElementOperator(ijv,n_nodes)
+    if scratch is not None and fmt in ('full','triu'):
+        return scratch.csr(name,ijv,n)
+    if scratch is not None and fmt=='bsr':
+        return scratch.bsr(name,ijv,n_nodes)
+    if fmt=='bsr':
+        if ijv==[]:
+            return spr.bsr_matrix((n,n),blocksize=(6,6))
+        blocks,row,col=(np.concatenate(a) for a in zip(*ijv))
+        #sum blocks on the same position
+        key=row*n_nodes+col
+        order=np.argsort(key,kind='stable')
+        key=key[order]
+        start=np.concatenate([[0],np.nonzero(np.diff(key))[0]+1]) if key.shape[0]>0 else np.zeros(0,dtype=int)
+        data=np.add.reduceat(blocks[order],start,axis=0) if start.shape[0]>0 else np.zeros((0,6,6))
+        key=key[start]
+        indptr=np.concatenate([[0],np.cumsum(np.bincount(key//n_nodes,minlength=n_nodes))])
+        return spr.bsr_matrix((data,key%n_nodes,indptr),shape=(n,n))
+    if ijv==[]:
+        return spr.csr_matrix((n,n))
+    data,row,col=(np.concatenate(a) for a in zip(*ijv))
+    return spr.coo_matrix((data,(row,col)),shape=(n,n)).tocsr()
+
+def _diagonal_positions(A):
+    """
+    Positions of the diagonal entries in data of a canonical csr matrix, or
+    of the diagonal blocks of a bsr matrix.
+    
+    return:
+        array of rows (block rows), -1 where the diagonal is not stored.
+    """
+    n=A.indptr.shape[0]-1
+    rows=np.repeat(np.arange(n),np.diff(A.indptr))
+    on_diag=np.nonzero(A.indices==rows)[0]
+    pos=np.full(n,-1)
+    pos[rows[on_diag]]=on_diag
+    return pos
+
+def _penalize(A,dofs,alpha,copy=np.copy,chunk=None):
+    """
+    Enlarge diagonal entries of given DOFs of a csr or bsr matrix.
+    Only the values are copied, the result shares the index arrays with A.
+    
+    params:
+        copy: function to copy the values.
+        chunk: number of entries of csr matrix scanned at once, None for all.
+            Duplicated diagonal entries are all enlarged.
+    """
+    if isinstance(A,ElementOperator):
+        return A.penalized(dofs,alpha)
+    if A.format=='bsr':
+        A_=spr.bsr_matrix((copy(A.data),A.indices,A.indptr),shape=A.shape)
+        pos=_diagonal_positions(A)[dofs//6]
+        k=(dofs%6)[pos>=0]
+        A_.data[pos[pos>=0],k,k]*=alpha
+        return A_
+    A_=spr.csr_matrix((copy(A.data),A.indices,A.indptr),shape=A.shape,copy=False)
+    fixed=np.zeros(A.shape[0],dtype=bool)
+    fixed[dofs]=True
+    nnz=A.indices.shape[0]
+    chunk=max(nnz,1) if chunk is None else chunk
+    for i in range(0,nnz,chunk):
+        k=np.arange(i,min(i+chunk,nnz))
+        rows=np.searchsorted(A.indptr,k,side='right')-1
+        on=(A.indices[k]==rows)&fixed[rows]
+        A_.data[k[on]]*=alpha
+    return A_
+
+def _resize(A,n):
+    """
+    Pad a csr or bsr matrix with empty rows and columns to order n, the 
+    result shares the arrays with A.
+    """
+    m=A.indptr.shape[0]-1
+    rows=n//A.blocksize[0] if A.format=='bsr' else n
+    indptr=np.concatenate([A.indptr,np.full(rows-m,A.indptr[-1],dtype=A.indptr.dtype)])
+    if A.format=='bsr':
+        return spr.bsr_matrix((A.data,A.indices,indptr),shape=(n,n))
+    return spr.csr_matrix((A.data,A.indices,indptr),shape=(n,n),copy=False)
+
+def _add(A,B):
+    """
+    A+B of two csr or two bsr matrices. B is added into the values of A in 
+    place if all of its entries are stored in A, otherwise a new matrix is
+    formed. The rows of B are scanned one by one, so B is supposed to be 
+    small.
+    
+    return:
+        matrix of the sum.
+    """
+    if A.shape[0]<B.shape[0]:
+        A=_resize(A,B.shape[0])
+    if not A.has_sorted_indices:
+        A.sort_indices()
+    B.sum_duplicates()
+    indptr,indices=A.indptr,A.indices
+    pos=[]
+    for r in np.nonzero(np.diff(B.indptr))[0]:
+        cols=B.indices[B.indptr[r]:B.indptr[r+1]]
+        p=indptr[r]+np.searchsorted(indices[indptr[r]:indptr[r+1]],cols)
+        if (p>=indptr[r+1]).any() or (indices[np.minimum(p,indices.shape[0]-1)]!=cols).any():
+            #new entries, the pattern has to be formed again
+            if A.format=='bsr':
+                return spr.bsr_matrix(A+B,blocksize=A.blocksize)
+            return (A+B).tocsr()
+        pos.append(p)
+    if pos!=[]:
+        A.data[np.concatenate(pos)]+=B.data
+    return A
 
 class Model:
-    def __init__(self):
-        self.__nodes={}
-        self.__beams={}
+    def __init__(self,storage='object'):
+        """
+        params:
+            storage: 'object' to keep nodes and beams as python objects, or
+                'array' to keep them in compact structure-of-arrays tables, 
+                node and beam objects are then handed out as views on demand.
+        """
+        assert(storage in ('object','array'))
+        self.__storage=storage
+        if storage=='array':
+            self.__nodes=NodeTable()
+            self.__beams=BeamTable(self.__nodes)
+        else:
+            self.__nodes={}
+            self.__beams={}
         self.__membrane3s={}
         self.__membrane4s={}
+        #stacked rotation matrices of nodes and elements, formed once per mesh
+        self.__transforms={}
+        #stacked geometry and strain matrices of membranes, formed once per mesh
+        self.__stacks={}
                 
         self.__index=[]
         self.__dof=None
         #without restraint
         self.__K=None
         self.__M=None
-        self.__C=None
         self.__f=None
         self.__d=None
         #with restraint
         self.__K_=None
         self.__M_=None
-        self.__C_=None
         self.__f_=None
+        #damping is kept as a model, C is never formed
+        self.__damping=None
+        #'full', 'triu', 'bsr' or 'ebe', storage of K and M
+        self.__fmt='full'
+        #memory-mapped storage of out-of-core analysis
+        self.__scratch=None
         
         #results
+        self.__solve_info=None
         self.__d_=None
         self.__r_=None
         self.__omega_=None
@@ -44,13 +245,24 @@ class Model:
         
         self.is_solved=False
         
+    @property
+    def storage(self):
+        return self.__storage
+
+    @property
+    def matrix_format(self):
+        """
+        storage of K, M and their restrained versions, see assemble_KM.
+        """
+        return self.__fmt
+
     @property
     def node_count(self):
-        return len(self.__nodes.items())
+        return len(self.__nodes)
 
     @property
     def beam_count(self):
-        return len(self.__beams.items())
+        return len(self.__beams)
     
     @property
     def nodes(self):
@@ -87,8 +299,20 @@ class Model:
     def M(self):
         return self.__M 
     @property
+    def damping(self):
+        return self.__damping
+    @damping.setter
+    def damping(self,damping):
+        assert(damping is None or isinstance(damping,Damping))
+        self.__damping=damping
+    @property
     def C(self):
-        return self.__C   
+        """
+        LinearOperator of damping matrix, None if no damping is set.
+        """
+        if self.__damping is None or self.__K is None:
+            return None
+        return self.__damping.operator(as_operator(self.__K,self.__fmt),as_operator(self.__M,self.__fmt))
     @property
     def f(self):
         return self.__f
@@ -109,20 +333,46 @@ class Model:
     def C_(self):
         if not self.is_assembled:
             raise Exception('The model has to be assembled first.')
-        return self.__C_
+        if self.__damping is None:
+            return None
+        return self.__damping.operator(as_operator(self.__K_,self.__fmt),as_operator(self.__M_,self.__fmt))
     @property
     def f_(self):
         if not self.is_assembled:
             raise Exception('The model has to be assembled first.')
         return self.__f_
     
+    @property
+    def scratch(self):
+        """
+        Scratch for out-of-core analysis, or None. With a scratch, triplets, 
+        csr or bsr arrays of K, M and their restrained versions, and d_, r_ 
+        are kept in memory-mapped files, and results are recovered in chunks.
+        """
+        return self.__scratch
+    @scratch.setter
+    def scratch(self,scratch):
+        assert(scratch is None or isinstance(scratch,Scratch))
+        self.__scratch=scratch
+    
+    @property
+    def solve_info(self):
+        """
+        dict of method, preconditioner, iterations and timings of the last 
+        iterative solve.
+        """
+        return self.__solve_info
+    @solve_info.setter
+    def solve_info(self,info):
+        self.__solve_info=info
+    
     @property
     def d_(self):
         return self.__d_
     @d_.setter
     def d_(self,d):
         assert(d.shape==(self.node_count*6,1))
-        self.__d_=d
+        self.__d_=d if self.__scratch is None else self.__scratch.copy('d_',d)
         
     @property
     def r_(self):
@@ -130,7 +380,7 @@ class Model:
     @r_.setter
     def r_(self,r):
         assert(r.shape==(self.node_count*6,1))
-        self.__r_=r
+        self.__r_=r if self.__scratch is None else self.__scratch.copy('r_',r)
         
     @property
     def omega_(self):
@@ -159,6 +409,12 @@ class Model:
         if node already exits, node will not be added.
         return: node hidden id
         """
+        if self.__storage=='array':
+            res=self.__nodes.find(x,y,z,tol) if check_dup else []
+            if res!=[]:
+                return res[0]
+            self.__transforms.pop('node',None)
+            return self.__nodes.append(x,y,z)
         node=Node(x,y,z)
         if check_dup:
             res=[a.hid for a in self.__nodes.values() if abs(a.x-node.x)+abs(a.y-node.y)+abs(a.z-node.z)<1e-6]
@@ -168,10 +424,58 @@ class Model:
             res=len(self.__nodes)
             node.hid=res
             self.__nodes[res]=node
+            self.__transforms.pop('node',None)
         else:
             res=res[0]
         return res
         
+    def add_nodes(self,xyz):
+        """
+        add nodes to model in batch, duplicates are not checked.
+        
+        params:
+            xyz: nx3 array-like, coordinates of nodes.
+        return:
+            array of hids of the new nodes.
+        """
+        xyz=np.asarray(xyz,dtype=float).reshape((-1,3))
+        if self.__storage=='array':
+            self.__transforms.pop('node',None)
+            return self.__nodes.extend(xyz)
+        return np.array([self.add_node(x,y,z) for x,y,z in xyz.tolist()],dtype=int)
+    
+    def node_coordinates(self):
+        """
+        return:
+            nx3 array of coordinates of nodes, in order of hids.
+        """
+        if self.__storage=='array':
+            return self.__nodes.xyz.copy()
+        return np.array([[node.x,node.y,node.z] for node in self.__nodes.values()],dtype=float).reshape((-1,3))
+    
+    def move_nodes(self,hids,xyz):
+        """
+        Set coordinates of nodes. Beams on the nodes have to be updated with
+        update_beams to follow them, membranes are not updated.
+        
+        params:
+            hids: array of hids of nodes.
+            xyz: nx3 array-like, new coordinates.
+        """
+        if self.__storage!='array':
+            raise Exception('Nodes can only be moved in array storage.')
+        self.__nodes.xyz[np.asarray(hids,dtype=int)]=np.asarray(xyz,dtype=float).reshape((-1,3))
+        
+    def clear_node_forces(self):
+        """
+        Reset nodal forces to zero, before the loads of a case are applied.
+        """
+        if self.__storage=='array':
+            self.__nodes.load[:]=0
+        else:
+            for node in self.__nodes.values():
+                node.fn=np.zeros((6,1))
+        
     def set_node_force(self,node,force,append=False):
         """
         add node force to model.
@@ -221,7 +525,7 @@ class Model:
             if restraint[i]:
                 disp.append(0)
             else:
-                disp.append(self.__nodes[node].dn[i])
+                disp.append(self.__nodes[node].dn.reshape(6)[i])
         self.__nodes[node].dn=np.array(disp).reshape((6,1))
         
     def add_beam(self,node0,node1,E, mu, A, I2, I3, J, rho,check_dup=False):
@@ -234,6 +538,15 @@ class Model:
         return: 
             beam hidden id
         """
+        if self.__storage=='array':
+            if check_dup:
+                conn=self.__beams.conn
+                res=list(np.nonzero(((conn[:,0]==node0)&(conn[:,1]==node1))|
+                                    ((conn[:,0]==node1)&(conn[:,1]==node0)))[0])
+                if res!=[]:
+                    return res[0]
+            self.__transforms.pop('beam',None)
+            return self.__beams.append(node0,node1,E, mu, A, I2, I3, J, rho)
         node0=self.nodes[node0]
         node1=self.nodes[node1]
         beam=Beam(node0,node1,E, mu, A, I2, I3, J, rho)
@@ -247,10 +560,69 @@ class Model:
             res=len(self.__beams)
             beam.hid=res
             self.__beams[res]=beam
+            self.__transforms.pop('beam',None)
         else:
             res=res[0]
         return res
     
+    def add_beams(self,conn,prop):
+        """
+        add beams to model in batch, duplicates are not checked.
+        
+        params:
+            conn: nx2 array-like, hids of end nodes.
+            prop: nx7 array-like, E, mu, A, I2, I3, J, rho of beams.
+        return:
+            array of hids of the new beams.
+        """
+        conn=np.asarray(conn,dtype=int).reshape((-1,2))
+        prop=np.asarray(prop,dtype=float).reshape((-1,7))
+        if self.__storage=='array':
+            self.__transforms.pop('beam',None)
+            hids=self.__beams.extend(conn,prop)
+            if self.__K is not None:
+                self._patch(*self._beam_global_matrices(hids))
+            return hids
+        return np.array([self.add_beam(i,j,*p) for (i,j),p in zip(conn.tolist(),prop.tolist())],dtype=int)
+    
+    def update_beams(self,hids,conn,prop):
+        """
+        Reconnect beams and set their properties. If K and M are assembled,
+        the changes of the element matrices are patched into them, see 
+        _patch.
+        
+        params:
+            hids: array of hids of beams.
+            conn: nx2 array-like, hids of end nodes.
+            prop: nx7 array-like, E, mu, A, I2, I3, J, rho of beams.
+        """
+        if self.__storage!='array':
+            raise Exception('Beams can only be updated in array storage.')
+        hids=np.asarray(hids,dtype=int).reshape(-1)
+        if self.__K is None:
+            self.__beams.update(hids,conn,prop)
+            return
+        conn0,K0,M0=self._beam_global_matrices(hids)
+        self.__beams.update(hids,conn,prop)
+        conn1,K1,M1=self._beam_global_matrices(hids)
+        self._patch(np.vstack([conn0,conn1]),np.concatenate([-K0,K1]),np.concatenate([-M0,M1]))
+    
+    def remove_beams(self,hids):
+        """
+        Remove beams, hids of other beams are kept. If K and M are assembled,
+        the element matrices are taken out of them, see _patch.
+        
+        params:
+            hids: array of hids of beams.
+        """
+        if self.__storage!='array':
+            raise Exception('Beams can only be removed in array storage.')
+        hids=np.asarray(hids,dtype=int).reshape(-1)
+        if self.__K is not None:
+            conn,Ke,Me=self._beam_global_matrices(hids)
+            self._patch(conn,-Ke,-Me)
+        self.__beams.remove(hids)
+    
     def set_beam_axis(self,beam,x,y,z):
         """
         set beams axis.
@@ -316,6 +688,8 @@ class Model:
         res=len(self.__membrane3s)
         elm.hid=res
         self.__membrane3s[res]=elm
+        self.__transforms.pop('membrane3',None)
+        self.__stacks={}
         return res
     
     def add_membrane4(self,node0, node1, node2, node3, t, E, mu, rho, name=None):
@@ -332,125 +706,271 @@ class Model:
         res=len(self.__membrane4s)
         elm.hid=res
         self.__membrane4s[res]=elm
+        self.__transforms.pop('membrane4',None)
+        self.__stacks={}
         return res
         
-    def assemble_KM(self):
+    def add_membranes(self,conn,prop):
+        """
+        add membranes to model in batch.
+        
+        params:
+            conn: nx3 or nx4 array-like, hids of corner nodes of membrane3s
+                or membrane4s.
+            prop: nx4 array-like, t, E, mu, rho of membranes.
+        return:
+            array of hids of the new membranes.
+        """
+        conn=np.asarray(conn,dtype=int)
+        prop=np.asarray(prop,dtype=float).reshape((-1,4))
+        add=self.add_membrane3 if conn.shape[1]==3 else self.add_membrane4
+        return np.array([add(*(c+p)) for c,p in zip(conn.tolist(),prop.tolist())],dtype=int)
+        
+    def _transform_stack(self,kind):
+        """
+        Rotation matrices of nodes or elements stacked in one array.
+        The stack is formed at the first call after a mesh change and reused
+        by assembly and result resolving afterwards.
+        
+        params:
+            kind: 'node', 'beam', 'membrane3' or 'membrane4'.
+        return:
+            nx3x3 array, rows of each matrix are the local axes.
+        """
+        if self.__storage=='array' and kind=='node':
+            return self.__nodes.V
+        if self.__storage=='array' and kind=='beam':
+            return self.__beams.V
+        V=self.__transforms.get(kind)
+        if V is None:
+            if kind=='node':
+                objs=self.__nodes.values()
+            elif kind=='beam':
+                objs=self.__beams.values()
+            elif kind=='membrane3':
+                objs=self.__membrane3s.values()
+            elif kind=='membrane4':
+                objs=self.__membrane4s.values()
+            else:
+                raise Exception('Unknown kind of transform %s'%kind)
+            V=np.array([obj.local_csys.transform_matrix if kind=='node' 
+                        else obj._local_csys.transform_matrix for obj in objs]).reshape((-1,3,3))
+            V.flags.writeable=False
+            self.__transforms[kind]=V
+        return V
+
+    def reset_transforms(self):
+        """
+        Drop the stacked rotation matrices, call it after a local csys of a 
+        node or an element is changed in place.
+        """
+        self.__transforms={}
+        self.__stacks={}
+
+    def _membrane_stacks(self,kind):
+        """
+        Collect membranes into stacked arrays, which are formed once per mesh
+        and shared by assembly and stress recovery.
+        
+        params:
+            kind: 'membrane3' or 'membrane4'.
+        return:
+            dict of
+            conn: nxm array of hids of corner nodes.
+            V: nx3x3 array of local csys.
+            x2D: nxmx2 array of corner coordinates on local csys.
+            D: nx3x3 array of elastic matrices.
+            t: n array of thickness.
+            B: nxgx3x2m array of strain matrices on evaluate points.
+            w: nxg array of areas the evaluate points stand for.
+            Me: nx6mx6m array of local mass matrices.
+        """
+        stack=self.__stacks.get(kind)
+        if stack is None:
+            elms=list(self.__membrane3s.values() if kind=='membrane3' else self.__membrane4s.values())
+            m=3 if kind=='membrane3' else 4
+            stack={}
+            stack['conn']=np.array([[node.hid for node in elm.nodes] for elm in elms],dtype=int).reshape((-1,m))
+            stack['V']=self._transform_stack(kind)
+            stack['x2D']=np.array([elm._x2D for elm in elms],dtype=float).reshape((-1,m,2))
+            stack['D']=np.array([elm._D for elm in elms],dtype=float).reshape((-1,3,3))
+            stack['t']=np.array([elm._t for elm in elms],dtype=float)
+            if kind=='membrane3':
+                B,area=membrane3_B(stack['x2D'])
+                stack['B']=B[:,None]
+                stack['w']=area[:,None]
+            else:
+                B,detJ=membrane4_B(stack['x2D'])
+                stack['B']=B
+                stack['w']=detJ*GAUSS_2x2_WEIGHTS
+            stack['Me']=np.array([elm.Me.toarray() for elm in elms]).reshape((-1,6*m,6*m))
+            self.__stacks[kind]=stack
+        return stack
+
+    def _beam_stacks(self,idx=None):
+        """
+        Collect beams into stacked arrays.
+        
+        params:
+            idx: array of hids of beams, None for all.
+        return:
+            conn: nx2 array of hids of end nodes.
+            V: nx3x3 array of local csys.
+            Ke,Me: nx12x12 arrays of local matrices without condensation.
+            releases: nx12 boolean array of end releases.
+        """
+        if self.__storage=='array':
+            table=self.__beams
+            idx=slice(None) if idx is None else idx
+            conn=table.conn[idx]
+            V=table.V[idx]
+            releases=table.releases[idx]
+            active=table.active[idx]
+            Ke=np.zeros((conn.shape[0],12,12))
+            Me=np.zeros((conn.shape[0],12,12))
+            if not active.any():
+                return conn,V,Ke,Me,releases
+            #members with the same signature are formed once, removed ones
+            #are left zero
+            sig,inv=np.unique(np.column_stack([table.prop[idx],table.length[idx]])[active],axis=0,return_inverse=True)
+            inv=inv.reshape(-1)
+            KM=[beam_matrices(*s,mass=table._mass) for s in sig]
+            Ke[active]=np.array([k.toarray() for k,m in KM])[inv]
+            Me[active]=np.array([m.toarray() for k,m in KM])[inv]
+            return conn,V,Ke,Me,releases
+        beams=list(self.__beams.values())
+        V=self._transform_stack('beam')
+        if idx is not None:
+            beams=[beams[i] for i in idx]
+            V=V[idx]
+        conn=np.array([[elm.nodes[0].hid,elm.nodes[1].hid] for elm in beams],dtype=int).reshape((-1,2))
+        Ke=np.array([elm.Ke.toarray() for elm in beams]).reshape((-1,12,12))
+        Me=np.array([elm.Me.toarray() for elm in beams]).reshape((-1,12,12))
+        releases=np.array([np.ravel(elm.releases) for elm in beams],dtype=bool).reshape((-1,12))
+        return conn,V,Ke,Me,releases
+    
+    def _beam_global_matrices(self,idx=None):
+        """
+        Element matrices of beams on global csys, releases are condensed.
+        
+        params:
+            idx: array of hids of beams, None for all.
+        return:
+            conn: nx2 array of hids of end nodes.
+            Ke,Me: nx12x12 arrays of element matrices.
+        """
+        conn,V,Ke,Me,releases=self._beam_stacks(idx)
+        
+        #Static condensation to consider releases, beams are grouped by 
+        #release pattern and unreleased beams skip the step.
+        if releases.any():
+            patterns,group=np.unique(releases,axis=0,return_inverse=True)
+            group=group.reshape(-1)
+            for p in range(patterns.shape[0]):
+                if not patterns[p].any():
+                    continue
+                i=np.nonzero(group==p)[0]
+                Ke[i],Me[i],_=condense_batch(Ke[i],Me[i],None,patterns[p])
+        
+        #transform to global csys
+        T=np.zeros((conn.shape[0],12,12))
+        T[:,:3,:3]=T[:,3:6,3:6]=T[:,6:9,6:9]=T[:,9:,9:]=V
+        Tt=T.transpose(0,2,1)
+        Ke=np.matmul(np.matmul(Tt,Ke),T)
+        Me=np.matmul(np.matmul(Tt,Me),T)
+        return conn,Ke,Me
+    
+    def _patch(self,conn,Ke,Me):
+        """
+        Add element matrices into the assembled K and M, nodes added after
+        the assembly are taken in. If the boundary conditions were assembled,
+        K_ and M_ are formed again, loads and results are cleared.
+        
+        params:
+            conn: nxm array of hids of element nodes.
+            Ke,Me: nx6mx6m arrays of element matrices on global csys, the
+                changes of the elements.
+        """
+        fmt=self.__fmt
+        if fmt=='ebe' or self.__scratch is not None:
+            raise Exception('Only assembled matrices in memory can be patched.')
+        n_nodes=self.node_count
+        self.__K=_add(self.__K,_build([_triplets(conn,Ke,fmt)],n_nodes,fmt))
+        self.__M=_add(self.__M,_build([_triplets(conn,Me,fmt)],n_nodes,fmt))
+        self.__f=np.zeros((n_nodes*6,1))
+        self.__f_=None
+        self.__d_=None
+        self.__r_=None
+        self.is_solved=False
+        if self.is_assembled:
+            self.assemble_boundary('KM')
+        
+    def assemble_KM(self,fmt='full'):
         """
         Assemble integrated stiffness matrix and mass matrix.
         Meanwhile, The force vector will be initialized.
+        
+        params:
+            fmt: 'full' to store both triangles, or 'triu' to store the upper
+                triangle and the diagonal only, which halves the memory. 
+                Matrices in 'triu' should be used through fe_model.symmetric.
+                'bsr' stores 6x6 blocks of nodes, each block is indexed once.
+                'ebe' keeps the element matrices only and applies K and M 
+                element by element, for models too large to be assembled. 
+                They have to be solved by iterative solvers.
         """
+        assert(fmt in FORMATS)
         logger.info('Assembling K and M..')
+        self.__fmt=fmt
         n_nodes=self.node_count
-        self.__K = spr.csr_matrix((n_nodes*6, n_nodes*6))
-        self.__M = spr.csr_matrix((n_nodes*6, n_nodes*6))
-        self.__C = spr.eye(n_nodes*6).tocsr()*0.05
         self.__f = np.zeros((n_nodes*6, 1))
+        #triplets of all the elements, the matrices are built once at last
+        K_ijv=[]
+        M_ijv=[]
+        scratch=self.__scratch
+        keep=(lambda a:a) if scratch is None else scratch.spill
         #Beam load and displacement, and reset the index 
-        row_k=[]
-        col_k=[]
-        data_k=[]
-        row_m=[]
-        col_m=[]
-        data_m=[]
-        for elm in self.__beams.values():
-            i = elm.nodes[0].hid
-            j = elm.nodes[1].hid
-            T=elm.transform_matrix
-            Tt = T.transpose()
-
-            #Static condensation to consider releases
-            elm.static_condensation()
-            Ke=elm.Ke_
-            Me=elm.Me_
-
-            Ke_ = (Tt*Ke*T).tocoo()
-            Me_ = (Tt*Me*T).tocoo()
-            
-            data_k.extend(Ke_.data)
-            row_k.extend([i*6+r if r<6 else j*6+r-6 for r in Ke_.row])
-            col_k.extend([i*6+c if c<6 else j*6+c-6 for c in Ke_.col])
-            
-            data_m.extend(Me_.data)
-            row_m.extend([i*6+r if r<6 else j*6+r-6 for r in Me_.row])
-            col_m.extend([i*6+c if c<6 else j*6+c-6 for c in Me_.col])
-#                        
-#            row=[a for a in range(0*6,0*6+6)]+[a for a in range(1*6,1*6+6)]
-#            col=[a for a in range(i*6,i*6+6)]+[a for a in range(j*6,j*6+6)]
-#            data=[1]*(2*6)
-#            G=spr.csr_matrix((data,(row,col)),shape=(2*6,n_nodes*6))
-#            
-#            Ke_ = Tt*Ke*T
-#            Me_ = Tt*Me*T
-#            self.__K+=G.transpose()*Ke_*G #sparse matrix use * as dot.
-#            self.__M+=G.transpose()*Me_*G #sparse matrix use * as dot.
-            
-        self.__K=spr.coo_matrix((data_k,(row_k,col_k)),shape=(n_nodes*6, n_nodes*6)).tocsr()
-        self.__M=spr.coo_matrix((data_m,(row_m,col_m)),shape=(n_nodes*6, n_nodes*6)).tocsr()
+        cache0=beam_cache_info()
+        conn,Ke,Me=self._beam_global_matrices()
         
-        for elm in self.__membrane3s.values():
-            i = elm.nodes[0].hid
-            j = elm.nodes[1].hid
-            k = elm.nodes[2].hid
-            
-            T=elm.transform_matrix
-            Tt = T.transpose()
-
-            Ke=elm.Ke
-            Me=elm.Me
-            
-            #expand
-            row=[a for a in range(0*6,0*6+6)]+\
-                [a for a in range(1*6,1*6+6)]+\
-                [a for a in range(2*6,2*6+6)]
-
-            col=[a for a in range(i*6,i*6+6)]+\
-                [a for a in range(j*6,j*6+6)]+\
-                [a for a in range(k*6,k*6+6)]
-            elm_node_count=elm.node_count
-            data=[1]*(elm_node_count*6)
-            G=spr.csr_matrix((data,(row,col)),shape=(elm_node_count*6,n_nodes*6))
-            
-            Ke_ = spr.csr_matrix(np.dot(np.dot(Tt,Ke),T))
-            Me_ = spr.csr_matrix(np.dot(np.dot(Tt,Me),T))
-
-            self.__K+=G.transpose()*Ke_*G #sparse matrix use * as dot.
-            self.__M+=G.transpose()*Me_*G #sparse matrix use * as dot.
-            
-        for elm in self.__membrane4s.values():
-            i = elm.nodes[0].hid
-            j = elm.nodes[1].hid
-            k = elm.nodes[2].hid
-            l = elm.nodes[3].hid
-            
-            T=elm.transform_matrix
-            Tt = T.transpose()
-
-            Ke=elm.Ke
-            Me=elm.Me
+        K_ijv.append(keep(_triplets(conn,Ke,fmt)))
+        M_ijv.append(keep(_triplets(conn,Me,fmt)))
+        del Ke,Me
+        cache=beam_cache_info()
+        hits=cache['hits']-cache0['hits']
+        misses=cache['misses']-cache0['misses']
+        logger.info('Beam matrix cache: %d hits, %d misses, hit rate %.1f%%'%(
+                hits,misses,hits/max(hits+misses,1)*100))
+        
+        #membranes of a kind are integrated and assembled at once
+        for kind,stiffness in [('membrane3',membrane3_stiffness),('membrane4',membrane4_stiffness)]:
+            if len(self.__membrane3s if kind=='membrane3' else self.__membrane4s)==0:
+                continue
+            stack=self._membrane_stacks(kind)
+            conn=stack['conn']
+            V=stack['V']
+            m=conn.shape[1]
+            Ke=stiffness(stack['x2D'],stack['D'],stack['t'])
+            Me=stack['Me']
             
             #transform
-            Ke_ = spr.csr_matrix(Tt.dot(Ke).dot(T))
-            Me_ = spr.csr_matrix(Tt.dot(Me).dot(T))
-            
-            #expand
-            row=[a for a in range(0*6,0*6+6)]+\
-                [a for a in range(1*6,1*6+6)]+\
-                [a for a in range(2*6,2*6+6)]+\
-                [a for a in range(3*6,3*6+6)]
-
-            col=[a for a in range(i*6,i*6+6)]+\
-                [a for a in range(j*6,j*6+6)]+\
-                [a for a in range(k*6,k*6+6)]+\
-                [a for a in range(l*6,l*6+6)]
-            elm_node_count=elm.node_count
-            data=[1]*(elm_node_count*6)
+            T=np.zeros((conn.shape[0],6*m,6*m))
+            for b in range(2*m):
+                T[:,b*3:b*3+3,b*3:b*3+3]=V
+            Tt=T.transpose(0,2,1)
+            Ke=np.matmul(np.matmul(Tt,Ke),T)
+            Me=np.matmul(np.matmul(Tt,Me),T)
             
-            G=spr.csr_matrix((data,(row,col)),shape=(elm_node_count*6,n_nodes*6))
             #assemble
-            self.__K+=G.transpose()*Ke_*G #sparse matrix use * as dot.
-            self.__M+=G.transpose()*Me_*G #sparse matrix use * as dot.
-#        print(self.__K)
+            K_ijv.append(keep(_triplets(conn,Ke,fmt)))
+            M_ijv.append(keep(_triplets(conn,Me,fmt)))
         #### other elements
+        
+        self.__K=_build(K_ijv,n_nodes,fmt,scratch,'K')
+        self.__M=_build(M_ijv,n_nodes,fmt,scratch,'M')
+        if scratch is not None and fmt!='ebe':
+            del K_ijv,M_ijv
+            scratch.release_spilled()
 
     def assemble_f(self):
         """
@@ -458,88 +978,184 @@ class Model:
         """
         logger.info('Assembling f..')
         n_nodes=self.node_count
-#        self.__f = spr.coo_matrix((n_nodes*6,1))
-        #Beam load and displacement, and reset the index
-        data_f=[]
-        row_f=[]
-        col_f=[]
-        for node in self.__nodes.values():
-            Tt=node.transform_matrix.transpose()
-#            self.__f[node.hid*6:node.hid*6+6,0]=np.dot(Tt,node.fn) 
-            fn_=np.dot(Tt,node.fn)
-            k=0
-            for f in fn_.reshape(6):
-                if f!=0:
-                    data_f.append(f)
-                    row_f.append(node.hid*6+k)
-                    col_f.append(0)
-                k+=1
-            
-        for beam in self.__beams.values():
-            i = beam.nodes[0].hid
-            j = beam.nodes[1].hid 
-            #Transform matrix
-            Vl=np.matrix(beam._local_csys.transform_matrix)
-            V=np.zeros((12, 12))
-            V[:3,:3] =V[3:6,3:6]=V[6:9,6:9]=V[9:,9:]=Vl
-            Vt = V.transpose()
-            
-            re_=np.dot(Vt,beam.re)
-            k=0
-            for r in re_.reshape(12):
-                if r!=0:
-                    data_f.append(r)
-                    row_f.append(i*6+k if k<6 else j*6+k-6)
-                    col_f.append(0)
-                k+=1    
-#            row=[a for a in range(0*6,0*6+6)]+[a for a in range(1*6,1*6+6)]
-#            col=[a for a in range(i*6,i*6+6)]+[a for a in range(j*6,j*6+6)]
-#            data=[1]*(2*6)
-#            G=spr.csr_matrix((data,(row,col)),shape=(2*6,n_nodes*6))
-#            #Assemble nodal force vector
-#            self.__f += G.transpose()*np.dot(Vt,beam.re)
+        #nodal loads to global csys, Tt.fn for all the nodes at once
+        if self.__storage=='array':
+            fn=self.__nodes.load
+        else:
+            fn=np.array([node.fn.reshape(6) for node in self.__nodes.values()],dtype=float).reshape((-1,6))
+        V=self._transform_stack('node')
+        f=np.einsum('nji,nkj->nki',V,fn.reshape((-1,2,3))).reshape(-1)
+        
+        #beam end forces
+        if self.__storage=='array':
+            table=self.__beams
+            idx=np.nonzero(table.active&table.re.any(axis=1))[0]
+            conn=table.conn[idx]
+            re=table.re[idx]
+        else:
+            beams=[beam for beam in self.__beams.values() if beam.re.any()]
+            idx=np.array([beam.hid for beam in beams],dtype=int)
+            conn=np.array([[beam.nodes[0].hid,beam.nodes[1].hid] for beam in beams],dtype=int).reshape((-1,2))
+            re=np.array([beam.re.reshape(12) for beam in beams],dtype=float).reshape((-1,12))
+        if idx.shape[0]>0:
+            V=self._transform_stack('beam')[idx]
+            re_=np.einsum('nji,nkj->nki',V,re.reshape((-1,4,3))).reshape((-1,12))
+            dofs=np.hstack([conn[:,:1]*6+np.arange(6),conn[:,1:]*6+np.arange(6)])
+            f+=np.bincount(dofs.ravel(),weights=re_.ravel(),minlength=n_nodes*6)
         #### other elements
-        self.__f=spr.coo_matrix((data_f,(row_f,col_f)),shape=(n_nodes*6,1)).tocsr()
+        nz=np.nonzero(f)[0]
+        self.__f=spr.csr_matrix((f[nz],(nz,np.zeros_like(nz))),shape=(n_nodes*6,1))
 
 
-    def assemble_boundary(self,mode='KMCf'):
+    def _node_disps(self):
+        """
+        return:
+            nx6 array of specified nodal displacements, NaN for free DOFs.
+        """
+        if self.__storage=='array':
+            return self.__nodes.disp
+        disp=np.full((self.node_count,6),np.nan)
+        for node in self.__nodes.values():
+            for j,d in enumerate(node.dn.reshape(6)):
+                d=np.asarray(d,dtype=object).reshape(-1)[0]
+                if d is not None:
+                    disp[node.hid,j]=d
+        return disp
+
+    def restrained_dofs(self):
+        """
+        return:
+            array of DOFs with specified displacements.
+        """
+        return np.nonzero(~np.isnan(self._node_disps().reshape(-1)))[0]
+
+    def _penalize(self,A,dofs,alpha,name):
+        """
+        see _penalize, the values are copied to the scratch if there is one.
+        """
+        if self.__scratch is None:
+            return _penalize(A,dofs,alpha)
+        copy=lambda data:self.__scratch.copy(name+'_data',data)
+        return _penalize(A,dofs,alpha,copy,self.__scratch.chunk)
+
+    def assemble_boundary(self,mode='KMf'):
         """
         assemble boundary conditions,using diagonal element englarging method.
+        The restrained matrices share index arrays with K and M, only the 
+        values are copied. Damping is applied through the damping model, so 
+        C is not copied.
         params:
-            mode: 'K','M','C','f' or their combinations
+            mode: 'K','M','f' or their combinations, 'C' is accepted for 
+            compatibility and takes no effect.
         """
         logger.info('Assembling boundary condition..')
+        alpha=1e10
+        disp=self._node_disps().reshape(-1)
+        fixed=np.nonzero(~np.isnan(disp))[0]
         if 'K' in mode:
-            self.__K_=self.K.copy()
+            self.__K_=self._penalize(self.K,fixed,alpha,'K_')
         if 'M' in mode:
-            self.__M_=self.M.copy()
-        if 'C' in mode:
-            self.__C_=self.C.copy()
+            self.__M_=self._penalize(self.M,fixed,alpha,'M_')
         if 'f' in mode:
-            self.__f_=self.f.copy()
-        self.__dof=self.node_count*6
-        alpha=1e10
-        for node in self.__nodes.values():
-            i=node.hid
-            for j in range(6):
-                if node.dn[j]!= None:
-                    if 'K' in mode:
-                        self.__K_[i*6+j,i*6+j]*=alpha
-                    if 'M' in mode:
-                        self.__M_[i*6+j,i*6+j]*=alpha
-                    if 'C' in mode:
-                        self.__C_[i*6+j,i*6+j]*=alpha
-                    if 'f' in mode:
-                        self.__f_[i*6+j]=self.__K_[i*6+j,i*6+j]*node.dn[j]
-                    self.__dof-=1
-                    
+            f_=self.f.toarray().reshape(-1)
+            f_[fixed]=self.__K_.diagonal()[fixed]*disp[fixed]
+            nz=np.nonzero(f_)[0]
+            self.__f_=spr.csr_matrix((f_[nz],(nz,np.zeros_like(nz))),shape=self.f.shape)
+        self.__dof=self.node_count*6-fixed.shape[0]
+
+    def memory_audit(self):
+        """
+        Audit memory held by global matrices and vectors. Arrays shared 
+        between matrices are counted once, arrays which are equal copies of
+        another matrix's arrays are reported as duplicated.
+        
+        return:
+            dict of
+            matrices: dict of matrix name and bytes it refers to.
+            total: bytes actually held.
+            shared: bytes referred by more than one matrix.
+            duplicated: bytes of equal copies which could be shared.
+        """
+        mats=[('K',self.__K),('M',self.__M),('f',self.__f),
+              ('K_',self.__K_),('M_',self.__M_),('f_',self.__f_)]
+        seen=[]
+        report={'matrices':{},'total':0,'shared':0,'duplicated':0}
+        for name,A in mats:
+            arrays=matrix_arrays(A)
+            report['matrices'][name]=sum(a.nbytes for a in arrays.values())
+            for a in arrays.values():
+                if any(np.shares_memory(a,b) for b in seen):
+                    report['shared']+=a.nbytes
+                    continue
+                if any(a.shape==b.shape and a.dtype==b.dtype and np.array_equal(a,b) for b in seen):
+                    report['duplicated']+=a.nbytes
+                seen.append(a)
+                report['total']+=a.nbytes
+        logger.info('Global matrices hold %.1f MB, %.1f MB shared, %.1f MB duplicated'%(
+                report['total']/2**20,report['shared']/2**20,report['duplicated']/2**20))
+        return report
+
+    def save_matrices(self,path,**extra):
+        """
+        Save K and M to a .npz file in the current storage format, matrices 
+        in 'triu' are saved as the upper triangle only.
+        
+        params:
+            path: str, file path.
+            extra: other arrays to be saved in the file.
+        """
+        if self.__K is None:
+            raise Exception('The model has to be assembled first.')
+        if self.__fmt=='ebe':
+            raise Exception('Matrix-free operators cannot be saved.')
+        arrays=dict(extra)
+        arrays.update({'fmt':np.array(self.__fmt),'shape':np.array(self.__K.shape)})
+        #data of bsr matrices keeps its block shape
+        for name,A in [('K',self.__K),('M',self.__M)]:
+            arrays[name+'_data']=A.data
+            arrays[name+'_indices']=A.indices
+            arrays[name+'_indptr']=A.indptr
+        np.savez(path,**arrays)
+
+    def load_matrices(self,path):
+        """
+        Load K and M saved by save_matrices, the storage format is restored.
+        
+        params:
+            path: str, file path.
+        """
+        with np.load(path) as arrays:
+            shape=tuple(arrays['shape'])
+            if shape!=(self.node_count*6,self.node_count*6):
+                raise Exception("The matrices don't match the model.")
+            self.__fmt=str(arrays['fmt'])
+            matrix=spr.bsr_matrix if self.__fmt=='bsr' else spr.csr_matrix
+            self.__K=matrix((arrays['K_data'],arrays['K_indices'],arrays['K_indptr']),shape=shape)
+            self.__M=matrix((arrays['M_data'],arrays['M_indices'],arrays['M_indptr']),shape=shape)
+        self.__f=np.zeros((shape[0],1))
+
+    def _to_local(self,u,hids=None):
+        """
+        Rotate a global nodal vector to nodal csys.
+        
+        params:
+            u: array of size 6n, global nodal vector.
+            hids: hids of nodes to rotate, None for all the nodes.
+        return:
+            nx6 array of local nodal vectors.
+        """
+        V=self._transform_stack('node')
+        u=u.reshape((-1,2,3))
+        if hids is not None:
+            V,u=V[hids],u[hids]
+        return np.einsum('nij,nkj->nki',V,np.asarray(u,dtype=float)).reshape((-1,6))
+
     def resolve_node_disp(self,node_id):
         if not self.is_solved:
             raise Exception('The model has to be solved first.')
         if node_id in self.__nodes.keys():
-            node=self.__nodes[node_id]
-            T=node.transform_matrix
-            return T.dot(self.d_[node_id*6:node_id*6+6]).reshape(6)
+            V=self._transform_stack('node')[node_id]
+            return np.dot(self.d_[node_id*6:node_id*6+6].reshape((2,3)),V.T).reshape(6)
         else:
             raise Exception("The node doesn't exists.")
     
@@ -547,11 +1163,38 @@ class Model:
         if not self.is_solved:
             raise Exception('The model has to be solved first.')
         if node_id in self.__nodes.keys():
-            node=self.__nodes[node_id]
-            T=node.transform_matrix
-            return T.dot(self.r_[node_id*6:node_id*6+6,0]).reshape(6)
+            V=self._transform_stack('node')[node_id]
+            return np.dot(np.asarray(self.r_[node_id*6:node_id*6+6]).reshape((2,3)),V.T).reshape(6)
         else:
             raise Exception("The node doesn't exists.")       
+
+    def resolve_node_disps(self,hids=None):
+        """
+        resolve displacements of nodes at once.
+        
+        params:
+            hids: hids of nodes, None for all the nodes.
+        return:
+            nx6 array of local nodal displacement, row i for node of hid i,
+            or in the order of hids.
+        """
+        if not self.is_solved:
+            raise Exception('The model has to be solved first.')
+        return self._to_local(self.d_,hids)
+    
+    def resolve_node_reactions(self,hids=None):
+        """
+        resolve reactions of nodes at once.
+        
+        params:
+            hids: hids of nodes, None for all the nodes.
+        return:
+            nx6 array of local nodal reaction, row i for node of hid i,
+            or in the order of hids.
+        """
+        if not self.is_solved:
+            raise Exception('The model has to be solved first.')
+        return self._to_local(self.r_,hids)
     
     def resolve_beam_force(self,beam_id):
         if not self.is_solved:
@@ -560,7 +1203,9 @@ class Model:
             beam=self.__beams[beam_id]
             i=beam.nodes[0].hid
             j=beam.nodes[1].hid
-            T=beam.transform_matrix
+            V=self._transform_stack('beam')[beam_id]
+            T=np.zeros((12,12))
+            T[:3,:3]=T[3:6,3:6]=T[6:9,6:9]=T[9:,9:]=V
             ue=np.vstack([
                         self.d_[i*6:i*6+6],
                         self.d_[j*6:j*6+6]
@@ -582,17 +1227,118 @@ class Model:
         if not self.is_solved:
             raise Exception('The model has to be solved first.')
         if node_id in self.__nodes.keys():
-            node=self.__nodes[node_id]
-            T=node.transform_matrix
-            return T.dot(self.mode_[node_id*6:node_id*6+6,k-1]).reshape(6)
+            V=self._transform_stack('node')[node_id]
+            return np.dot(self.mode_[node_id*6:node_id*6+6,k-1].reshape((2,3)),V.T).reshape(6)
         else:
             raise Exception("The node doesn't exists.")
+
+    def resolve_modal_displacements(self,k):
+        """
+        resolve modal displacement of all the nodes at once.
+        
+        params:
+            k: order of vibration mode.
+        return:
+            nx6 array of local nodal displacement, row i for node of hid i.
+        """
+        if not self.is_solved:
+            raise Exception('The model has to be solved first.')
+        return self._to_local(self.mode_[:,k-1])
     
+    def resolve_membrane_stresses(self,kind):
+        """
+        resolve stresses of all the membranes of a kind at once.
+        
+        params:
+            kind: 'membrane3' or 'membrane4'.
+        return:
+            nxgx3 array of s11,s22,s12 on evaluate points in element csys,
+            g is 1 for membrane3 and 2x2 Gauss points for membrane4.
+        """
+        if not self.is_solved:
+            raise Exception('The model has to be solved first.')
+        stack=self._membrane_stacks(kind)
+        conn=stack['conn']
+        n,m=conn.shape
+        #gather nodal displacements and rotate them to element csys
+        d=np.asarray(self.d_).reshape(-1)
+        ue=d[conn[:,:,None]*6+np.arange(3)] #nxmx3
+        ue=np.einsum('nij,nmj->nmi',stack['V'],ue)[:,:,:2].reshape((n,2*m))
+        DB=np.matmul(stack['D'][:,None],stack['B']) #nxgx3x2m
+        return np.einsum('ngij,nj->ngi',DB,ue)
+
+    def resolve_membrane_mean_stresses(self,kind):
+        """
+        resolve area-weighted mean stresses of all the membranes of a kind.
+        
+        params:
+            kind: 'membrane3' or 'membrane4'.
+        return:
+            nx3 array of s11,s22,s12 in element csys.
+        """
+        w=self._membrane_stacks(kind)['w']
+        S=self.resolve_membrane_stresses(kind)
+        return np.einsum('ngi,ng->ni',S,w)/w.sum(axis=1)[:,None]
+
     def resolve_membrane3_stress(self,membrane_id):
-        pass
+        """
+        resolve stress of a membrane3, which is constant over the element.
+        
+        return:
+            3-array of s11,s22,s12 in element csys.
+        """
+        if membrane_id not in self.__membrane3s.keys():
+            raise Exception("The element doesn't exists.")
+        return self.resolve_membrane_stresses('membrane3')[membrane_id,0]
     
     def resolve_membrane4_stress(self,membrane_id):
-        pass
+        """
+        resolve stresses of a membrane4 on its Gauss points.
+        
+        return:
+            4x3 array of s11,s22,s12 in element csys.
+        """
+        if membrane_id not in self.__membrane4s.keys():
+            raise Exception("The element doesn't exists.")
+        return self.resolve_membrane_stresses('membrane4')[membrane_id]
+
+    def _averaging_matrix(self):
+        """
+        Sparse matrix which averages corner values of all the membranes on 
+        the nodes, the rows are nodes and the columns are corners of 
+        membrane3s followed by corners of membrane4s.
+        """
+        A=self.__stacks.get('average')
+        if A is None:
+            nodes=np.concatenate([self._membrane_stacks(kind)['conn'].ravel() 
+                                  for kind in ('membrane3','membrane4')])
+            count=np.bincount(nodes,minlength=self.node_count)
+            A=spr.csr_matrix((1/count[nodes],(nodes,np.arange(nodes.shape[0]))),
+                             shape=(self.node_count,nodes.shape[0]))
+            self.__stacks['average']=A
+        return A
+
+    def resolve_membrane_nodal_stresses(self):
+        """
+        resolve nodal stresses averaged over membranes sharing the nodes. 
+        Stresses of membrane4s are extrapolated from Gauss points to the 
+        corners. The components are in element csys, the average is only 
+        meaningful where the neighbouring membranes share the csys.
+        
+        return:
+            nx3 array of s11,s22,s12, row i for node of hid i, zeros for 
+            nodes without membranes.
+        """
+        corners=[]
+        if len(self.__membrane3s)>0:
+            S=self.resolve_membrane_stresses('membrane3')
+            corners.append(np.repeat(S,3,axis=1).reshape((-1,3)))
+        if len(self.__membrane4s)>0:
+            S=self.resolve_membrane_stresses('membrane4')
+            corners.append(np.matmul(QUAD4_EXTRAPOLATION,S).reshape((-1,3)))
+        if corners==[]:
+            return np.zeros((self.node_count,3))
+        return self._averaging_matrix().dot(np.vstack(corners))
         
     def find(self,nodes,target,tol=1e-6):
         """
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:20:05 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse.linalg as sl
+
+class Damping(object):
+    """
+    Damping model of a structure.
+    The damping matrix is never formed, it is described by Rayleigh
+    coefficients alpha and beta together with an optional low-rank part
+    U.diag(d).U^T, so that C=alpha*M+beta*K+U.diag(d).U^T.
+    """
+    @property
+    def coefficients(self):
+        """
+        return:
+            alpha,beta: Rayleigh coefficients of mass and stiffness.
+        """
+        return 0.,0.
+
+    def lowrank(self,M):
+        """
+        params:
+            M: global mass matrix.
+        return:
+            U,d: nxk array and k-array, or None if there is no low-rank part.
+        """
+        return None
+
+    def operator(self,K,M):
+        """
+        params:
+            K,M: global stiffness and mass matrices.
+        return:
+            LinearOperator of C.
+        """
+        alpha,beta=self.coefficients
+        lr=self.lowrank(M)
+        def matvec(x):
+            x=np.asarray(x).reshape(-1)
+            y=np.zeros(x.shape[0])
+            if alpha!=0:
+                y+=alpha*M.dot(x)
+            if beta!=0:
+                y+=beta*K.dot(x)
+            if lr is not None:
+                U,d=lr
+                y+=U.dot(d*U.T.dot(x))
+            return y
+        return sl.LinearOperator(K.shape,matvec=matvec,rmatvec=matvec,dtype=float)
+
+class RayleighDamping(Damping):
+    def __init__(self,alpha,beta):
+        """
+        params:
+            alpha: float, mass proportional coefficient.
+            beta: float, stiffness proportional coefficient.
+        """
+        self.__alpha=alpha
+        self.__beta=beta
+
+    @classmethod
+    def from_ratios(cls,xi1,omega1,xi2=None,omega2=None):
+        """
+        Rayleigh damping with given damping ratios on two circular frequencies.
+
+        params:
+            xi1,omega1: damping ratio on the first frequency.
+            xi2,omega2: damping ratio on the second frequency, xi2 is xi1 if
+                not given, only mass proportional damping is used if omega2
+                is not given.
+        """
+        if xi2 is None:
+            xi2=xi1
+        if omega2 is None:
+            return cls(2*xi1*omega1,0.)
+        A=np.array([[1/omega1,omega1],
+                    [1/omega2,omega2]])/2
+        alpha,beta=np.linalg.solve(A,[xi1,xi2])
+        return cls(alpha,beta)
+
+    @property
+    def coefficients(self):
+        return self.__alpha,self.__beta
+
+class ModalDamping(Damping):
+    def __init__(self,xi,omega,modes):
+        """
+        params:
+            xi: float or k-array, damping ratio of modes.
+            omega: k-array, circular frequencies of modes.
+            modes: nxk array of mode shapes.
+        """
+        self.__omega=np.asarray(omega,dtype=float).reshape(-1)
+        self.__xi=np.broadcast_to(np.asarray(xi,dtype=float),self.__omega.shape)
+        self.__modes=np.asarray(modes,dtype=float)
+
+    def lowrank(self,M):
+        """
+        C=M.Phi.diag(2*xi*omega).Phi^T.M with mass normalized Phi.
+        """
+        Phi=self.__modes
+        m=np.einsum('ik,ik->k',Phi,M.dot(Phi))
+        U=M.dot(Phi/np.sqrt(m))
+        return U,2*self.__xi*self.__omega
+
+def matrix_arrays(A):
+    """
+    Arrays which hold a dense or sparse matrix.
+
+    return:
+        dict of array name and array.
+    """
+    if A is None:
+        return {}
+    if hasattr(A,'arrays'):
+        return A.arrays
+    if hasattr(A,'indptr'):
+        return {'data':A.data,'indices':A.indices,'indptr':A.indptr}
+    if hasattr(A,'row'):
+        return {'data':A.data,'row':A.row,'col':A.col}
+    if isinstance(A,np.ndarray):
+        return {'data':A}
+    return {}
@@ -5,12 +5,11 @@ Created on Wed Jun 22 22:17:28 2016
 @author: HZJ
 """
 import uuid
+from functools import lru_cache
 
 import numpy as np
-import scipy as sp
 import scipy.sparse as spr
 import scipy.interpolate as interp
-import quadpy
 
 from csys import Cartisian
 
@@ -77,7 +76,7 @@ class Element(object):
     def re(self,force):
         if len(force)!=self._dof:
             raise ValueError('element nodal force must be a 12 array')
-        self.__re=np.array(force).reshape((self._dof,1))
+        self._re=np.array(force,dtype=float).reshape((self._dof,1))
 
     @property
     def mass(self):
@@ -101,11 +100,6 @@ class Line(Element):
             pt2[2] += 1
         self._local_csys = Cartisian(o, pt1, pt2)
 
-        T=np.zeros((12,12))
-        V=self._local_csys.transform_matrix
-        T[:3,:3] =T[3:6,3:6]=T[6:9,6:9]=T[9:,9:]= V
-        self._T=spr.csr_matrix(T)
-
         self._length=((node_i.x - node_j.x)**2 + (node_i.y - node_j.y)**2 + (node_i.z - node_j.z)**2)**0.5
         self._mass=rho*A*self.length
 
@@ -113,6 +107,13 @@ class Line(Element):
     def length(self):
         return self._length
 
+    @property
+    def transform_matrix(self):
+        T=np.zeros((12,12))
+        V=self._local_csys.transform_matrix
+        T[:3,:3] =T[3:6,3:6]=T[6:9,6:9]=T[9:,9:]= V
+        return spr.csr_matrix(T)
+
 class Tri(Element):
     def __init__(self,node_i,node_j,node_k,t,E,mu,rho,dof,name=None,tol=1e-6):
         super(Tri,self).__init__(2,dof,name)
@@ -125,9 +126,8 @@ class Tri(Element):
         pt2 = [ node_i.x, node_i.y, node_i.z ]
         self._local_csys = Cartisian(o, pt1, pt2) 
 
-        self._area=0.5*np.linalg.det(np.array([[1,1,1],
-                                    [node_j.x-node_i.x,node_j.y-node_i.y,node_j.z-node_i.z],
-                                    [node_k.x-node_i.x,node_k.y-node_i.y,node_k.z-node_i.z]]))
+        self._area=0.5*np.linalg.norm(np.cross([node_j.x-node_i.x,node_j.y-node_i.y,node_j.z-node_i.z],
+                                               [node_k.x-node_i.x,node_k.y-node_i.y,node_k.z-node_i.z]))
         self._t=t
         self._E=E
         self._mu=mu
@@ -150,6 +150,14 @@ class Tri(Element):
     def area(self):
         return self._area
 
+    @property
+    def transform_matrix(self):
+        T=np.zeros((18,18))
+        V=self._local_csys.transform_matrix
+        for i in range(6):
+            T[i*3:i*3+3,i*3:i*3+3]=V
+        return spr.csr_matrix(T)
+
 class Quad(Element):
     def __init__(self,node_i,node_j,node_k,node_l,t,E,mu,rho,dof,name=None,tol=1e-6):
         super(Quad,self).__init__(2,dof,name)
@@ -158,8 +166,8 @@ class Quad(Element):
         o=[(node_i.x+node_j.x+node_k.x+node_l.x)/4,
             (node_i.y+node_j.y+node_k.y+node_l.y)/4,
             (node_i.z+node_j.z+node_k.z+node_l.z)/4]
-        pt1 = [ node_i.x+node_j.x, node_i.y+node_j.y, node_i.z+node_j.z ]
-        pt2 = [ node_j.x+node_k.x, node_j.y+node_k.y, node_j.z+node_k.z ]
+        pt1 = [ (node_i.x+node_j.x)/2, (node_i.y+node_j.y)/2, (node_i.z+node_j.z)/2 ]
+        pt2 = [ (node_j.x+node_k.x)/2, (node_j.y+node_k.y)/2, (node_j.z+node_k.z)/2 ]
         self._local_csys = Cartisian(o, pt1, pt2) 
 
         #area is considered as the average of trangles generated by splitting the quand with diagonals
@@ -202,6 +210,14 @@ class Quad(Element):
     def area(self):
         return self._area
 
+    @property
+    def transform_matrix(self):
+        T=np.zeros((24,24))
+        V=self._local_csys.transform_matrix
+        for i in range(8):
+            T[i*3:i*3+3,i*3:i*3+3]=V
+        return spr.csr_matrix(T)
+
 class Link(Line):
     def __init__(self,node_i, node_j, E, A, rho, name=None, mass='conc', tol=1e-6):
         """
@@ -249,6 +265,254 @@ class Link(Line):
         return N
 
                 
+def beam_stiffness(E, mu, A, I2, I3, J, l):
+    """
+    Local stiffness matrix of a 3D Euler-Bernoulli beam.
+    
+    params:
+        E: elastic modulus
+        mu: Possion ratio
+        A: section area
+        I2: inertia about 2-2
+        I3: inertia about 3-3
+        J: torsianl constant
+        l: length of beam
+    return:
+        12x12 csr matrix.
+    """
+    G=E/2/(1+mu)
+
+    #Initialize local matrices
+    #form the stiffness matrix:
+    K_data=(
+    (E*A / l,(0, 0)),
+    (-E*A / l,(0, 6)),
+    (-E*A / l,(6, 0)),
+    
+    (12 * E*I3 / l / l / l,(1, 1)),
+    (6 * E*I3 / l / l,(1, 5)),
+    (6 * E*I3 / l / l,(5, 1)),
+    (-12 * E*I3 / l / l / l,(1, 7)),
+    (-12 * E*I3 / l / l / l,(7, 1)),
+    (6 * E*I3 / l / l,(1, 11)),
+    (6 * E*I3 / l / l,(11, 1)),
+
+    (12 * E*I2 / l / l / l,(2, 2)),
+    (-6 * E*I2 / l / l,(2, 4)),
+    (-6 * E*I2 / l / l,(4, 2)),
+    (-12 * E*I2 / l / l / l,(2, 8)),
+    (-12 * E*I2 / l / l / l,(8, 2)),
+    (-6 * E*I2 / l / l,(2, 10)),
+    (-6 * E*I2 / l / l,(10, 2)),
+
+    (G*J / l,(3, 3)),
+    (-G*J / l,(3, 9)),
+    (-G*J / l,(9, 3)),
+
+    (4 * E*I2 / l,(4, 4)),
+    (6 * E*I2 / l / l,(4, 8)),
+    (6 * E*I2 / l / l,(8, 4)),
+    (2 * E*I2 / l,(4, 10)),
+    (2 * E*I2 / l,(10, 4)),
+
+    (4 * E*I3 / l,(5, 5)),
+    (-6 * E*I3 / l / l,(5, 7)),
+    (-6 * E*I3 / l / l,(7, 5)),
+    (2 * E*I3 / l,(5, 11)),
+    (2 * E*I3 / l,(11, 5)),
+
+    (E*A / l,(6, 6)),
+
+    (12 * E*I3 / l / l / l,(7, 7)),
+    (-6 * E*I3 / l / l,(7, 11)),
+    (-6 * E*I3 / l / l,(11, 7)),
+
+    (12 * E*I2 / l / l / l,(8, 8)),
+    (6 * E*I2 / l / l,(8, 10)),
+    (6 * E*I2 / l / l,(10, 8)),
+
+    (G*J / l,(9, 9)),
+
+    (4 * E*I2 / l,(10, 10)),
+
+    (4 * E*I3 / l,(11, 11)),
+    )
+    data=[k[0] for k in K_data]
+    row=[k[1][0] for k in K_data]
+    col=[k[1][1] for k in K_data]
+    return spr.csr_matrix((data,(row,col)),shape=(12, 12))
+
+def beam_mass(A, J, rho, l, mass='conc'):
+    """
+    Local mass matrix of a 3D beam.
+    
+    params:
+        A: section area
+        J: torsianl constant
+        rho: mass density
+        l: length of beam
+        mass: 'coor' as coordinate matrix or 'conc' for concentrated matrix
+    return:
+        12x12 sparse matrix.
+    """
+    #form mass matrix
+    if mass=='coor':#Coordinated mass matrix
+        _Me=np.zeros((12,12))
+        _Me[0, 0]=140
+        _Me[0, 6]=_Me[6, 0]=70
+
+        _Me[1, 1]=156
+        _Me[1, 5]=_Me[5, 1]=22 * l
+        _Me[1, 7]=_Me[7, 1]=54
+        _Me[1, 11]=_Me[11, 1]=-13 * l
+
+        _Me[2, 2]=156
+        _Me[2, 4]=_Me[4, 2]=-22 * l
+        _Me[2, 8]=_Me[8, 2]=54
+        _Me[2, 10]=_Me[10, 2]=13 * l
+
+        _Me[3, 3]=140 * J / A
+        _Me[3, 9]=_Me[9, 3]=70 * J / A
+
+        _Me[4, 4]=4 * l *l
+        _Me[4, 8]=_Me[8, 4]=-13 * l
+        _Me[4, 10]=_Me[10, 4]=-3 * l*l
+
+        _Me[5, 5]=4 * l*l
+        _Me[5, 7]=_Me[7, 5]=13 * l
+        _Me[5, 11]=_Me[11, 5]=-3 * l*l
+
+        _Me[6, 6]=140
+
+        _Me[7, 7]=156
+        _Me[7, 11]=_Me[11, 7]=-22 * l
+
+        _Me[8, 8]=156
+        _Me[8, 10]=_Me[10, 8]=22 * l
+
+        _Me[9, 9]=140 * J / A
+
+        _Me[10, 10]=4 * l*l
+
+        _Me[11, 11]=4 * l*l
+
+        _Me*= (rho*A*l / 420)
+        return spr.csc_matrix(_Me)
+    
+    elif mass=='conc':#Concentrated mass matrix
+        return spr.eye(12).tocsr()*rho*A*l/2
+
+def condense_batch(Ke,Me,re,released):
+    """
+    Perform static condensation on a group of beams with the same releases,
+    the Schur complements of the whole group are computed at once.
+    
+    params:
+        Ke,Me: nx12x12 arrays of local stiffness and mass matrices.
+        re: nx12 array of local nodal force vectors, or None.
+        released: 12 booleans, released DOFs shared by the group.
+    return:
+        condensated Ke_, Me_ and re_, rows and columns of released DOFs are zeros.
+    """
+    released=np.asarray(released,dtype=bool).reshape(12)
+    b=np.nonzero(released)[0] #released
+    a=np.nonzero(~released)[0] #retained
+    Kab=Ke[:,a[:,None],b]
+    Kbb=Ke[:,b[:,None],b]
+    Kba=Ke[:,b[:,None],a]
+    try:
+        X=np.linalg.solve(Kbb,Kba)
+    except np.linalg.LinAlgError:
+        #mechanism inside the element, e.g. torsion released at both ends
+        X=np.matmul(np.linalg.pinv(Kbb),Kba)
+    Xt=X.transpose(0,2,1)
+    
+    Ke_=np.zeros_like(Ke)
+    Ke_[:,a[:,None],a]=Ke[:,a[:,None],a]-np.matmul(Kab,X)
+    
+    #mass is condensated with the same transformation [I,-X]
+    Mab=Me[:,a[:,None],b]
+    Me_=np.zeros_like(Me)
+    Me_[:,a[:,None],a]=Me[:,a[:,None],a]-np.matmul(Mab,X)-np.matmul(Xt,Mab.transpose(0,2,1))\
+                        +np.matmul(np.matmul(Xt,Me[:,b[:,None],b]),X)
+    
+    if re is None:
+        return Ke_,Me_,None
+    re_=np.zeros_like(re)
+    re_[:,a]=re[:,a]-np.matmul(Xt,re[:,b,None])[:,:,0]
+    return Ke_,Me_,re_
+
+def condense(Ke,Me,re,releases):
+    """
+    Perform static condensation on local matrices of a beam.
+    
+    params:
+        Ke,Me: 12x12 local stiffness and mass matrices.
+        re: 12x1 local nodal force vector.
+        releases: 2x6 booleans of i-end and j-end releases.
+    return:
+        condensated Ke_, Me_ and re_.
+    """
+    releases=np.asarray(releases,dtype=bool).reshape(12)
+    if not releases.any():
+        return Ke.copy(),Me.copy(),re.copy()
+    Ke_,Me_,re_=condense_batch(Ke.toarray()[None],Me.toarray()[None],
+                               np.asarray(re,dtype=float).reshape((1,12)),releases)
+    return spr.csr_matrix(Ke_[0]),spr.csr_matrix(Me_[0]),re_.reshape((12,1))
+
+BEAM_CACHE_SIZE=4096
+
+def _signature(*values):
+    """
+    round floats to 12 significant digits, so that members with the same 
+    properties but slightly different round-off share one signature.
+    """
+    return tuple(float('%.12g'%v) for v in values)
+
+@lru_cache(maxsize=BEAM_CACHE_SIZE)
+def _beam_matrices(E, mu, A, I2, I3, J, rho, l, mass, releases):
+    Ke=beam_stiffness(E, mu, A, I2, I3, J, l)
+    Me=beam_mass(A, J, rho, l, mass)
+    if any(releases):
+        Ke,Me,re=condense(Ke,Me,np.zeros((12,1)),np.array(releases).reshape((2,6)))
+    #matrices are shared between members, protect them from being modified.
+    for m in (Ke,Me):
+        m.data.flags.writeable=False
+    return Ke,Me
+
+def beam_matrices(E, mu, A, I2, I3, J, rho, l, mass='conc', releases=None):
+    """
+    Local stiffness and mass matrices of a beam, shared by all the members 
+    with the same signature of (section, material, length, releases) through
+    a bounded LRU cache. The returned matrices are read-only.
+    
+    params:
+        E, mu, A, I2, I3, J, rho, l: properties of beam.
+        mass: 'coor' as coordinate matrix or 'conc' for concentrated matrix
+        releases: 12 booleans of end releases, or None.
+    return:
+        condensated 12x12 Ke and Me.
+    """
+    releases=(False,)*12 if releases is None else tuple(bool(r) for r in np.ravel(releases))
+    return _beam_matrices(*_signature(E, mu, A, I2, I3, J, rho, l),mass,releases)
+
+def beam_cache_info():
+    """
+    return:
+        dict of hits, misses, size, maxsize and hit_rate of the beam matrix cache.
+    """
+    info=_beam_matrices.cache_info()
+    total=info.hits+info.misses
+    return {'hits':info.hits,
+            'misses':info.misses,
+            'size':info.currsize,
+            'maxsize':info.maxsize,
+            'hit_rate':info.hits/total if total>0 else 0.}
+
+def beam_cache_clear():
+    _beam_matrices.cache_clear()
+
+
 class Beam(Line):
     def __init__(self,node_i, node_j, E, mu, A, I2, I3, J, rho, name=None, mass='conc', tol=1e-6):
         """
@@ -265,138 +529,53 @@ class Beam(Line):
             tol: tolerance
         """
         super(Beam,self).__init__(node_i,node_j,A,rho,12,name,mass)
-        self._releases=[[False,False,False,False,False,False],
-                         [False,False,False,False,False,False]]
-        
-        l=self.length
-        G=E/2/(1+mu)
-
-        #Initialize local matrices
-        #form the stiffness matrix:
-        K_data=(
-        (E*A / l,(0, 0)),
-        (-E*A / l,(0, 6)),
-        (-E*A / l,(6, 0)),
+        self._releases=np.zeros((2,6),dtype=bool)
         
-        (12 * E*I3 / l / l / l,(1, 1)),
-        (6 * E*I3 / l / l,(1, 5)),
-        (6 * E*I3 / l / l,(5, 1)),
-        (-12 * E*I3 / l / l / l,(1, 7)),
-        (-12 * E*I3 / l / l / l,(7, 1)),
-        (6 * E*I3 / l / l,(1, 11)),
-        (6 * E*I3 / l / l,(11, 1)),
-
-        (12 * E*I2 / l / l / l,(2, 2)),
-        (-6 * E*I2 / l / l,(2, 4)),
-        (-6 * E*I2 / l / l,(4, 2)),
-        (-12 * E*I2 / l / l / l,(2, 8)),
-        (-12 * E*I2 / l / l / l,(8, 2)),
-        (-6 * E*I2 / l / l,(2, 10)),
-        (-6 * E*I2 / l / l,(10, 2)),
-
-        (G*J / l,(3, 3)),
-        (-G*J / l,(3, 9)),
-        (-G*J / l,(9, 3)),
-
-        (4 * E*I2 / l,(4, 4)),
-        (6 * E*I2 / l / l,(4, 8)),
-        (6 * E*I2 / l / l,(8, 4)),
-        (2 * E*I2 / l,(4, 10)),
-        (2 * E*I2 / l,(10, 4)),
-
-        (4 * E*I3 / l,(5, 5)),
-        (-6 * E*I3 / l / l,(5, 7)),
-        (-6 * E*I3 / l / l,(7, 5)),
-        (2 * E*I3 / l,(5, 11)),
-        (2 * E*I3 / l,(11, 5)),
-
-        (E*A / l,(6, 6)),
-
-        (12 * E*I3 / l / l / l,(7, 7)),
-        (-6 * E*I3 / l / l,(7, 11)),
-        (-6 * E*I3 / l / l,(11, 7)),
-
-        (12 * E*I2 / l / l / l,(8, 8)),
-        (6 * E*I2 / l / l,(8, 10)),
-        (6 * E*I2 / l / l,(10, 8)),
-
-        (G*J / l,(9, 9)),
-
-        (4 * E*I2 / l,(10, 10)),
-
-        (4 * E*I3 / l,(11, 11)),
-        )
-        data=[k[0] for k in K_data]
-        row=[k[1][0] for k in K_data]
-        col=[k[1][1] for k in K_data]
-        self._Ke = spr.csr_matrix((data,(row,col)),shape=(12, 12))
-
-        #form mass matrix
-        if mass=='coor':#Coordinated mass matrix
-            _Me=np.zeros((12,12))
-            _Me[0, 0]=140
-            _Me[0, 6]=70
-    
-            _Me[1, 1]=156
-            _Me[1, 5]=_Me[5, 1]=22 * l
-            _Me[1, 7]=_Me[7, 1]=54
-            _Me[1, 11]=_Me[11, 1]=-13 * l
-    
-            _Me[2, 2]=156
-            _Me[2, 4]=_Me[4, 2]=-22 * l
-            _Me[2, 8]=_Me[8, 2]=54
-            _Me[2, 10]=_Me[10, 2]=13 * l
-    
-            _Me[3, 3]=140 * J / A
-            _Me[3, 9]=_Me[9, 3]=70 * J / A
-    
-            _Me[4, 4]=4 * l *l
-            _Me[4, 8]=_Me[8, 4]=-13 * l
-            _Me[4, 10]=_Me[10, 4]=-3 * l*l
-    
-            _Me[5, 5]=4 * l*l
-            _Me[5, 7]=_Me[7, 5]=13 * l
-            _Me[5, 11]=_Me[11, 5]=-3 * l*l
-    
-            _Me[6, 6]=140
-    
-            _Me[7, 7]=156
-            _Me[7, 11]=_Me[11, 7]=-22 * l
-    
-            _Me[8, 8]=156
-            _Me[8, 10]=_Me[10, 8]=22 * l
-    
-            _Me[9, 9]=140 * J / A
-    
-            _Me[10, 10]=4 * l*l
-    
-            _Me[11, 11]=4 * l*l
-    
-            _Me*= (rho*A*l / 420)
-            self._Me=spr.csc_matrix(_Me)
-        
-        elif mass=='conc':#Concentrated mass matrix
-            self._Me=spr.eye(12).tocsr()*rho*A*l/2
+        #local matrices are formed lazily and shared through the signature cache
+        self._E=E
+        self._mu=mu
+        self._A=A
+        self._I2=I2
+        self._I3=I3
+        self._J=J
+        self._rho=rho
+        self._mass_type=mass
 
         #force vector
         self._re =np.zeros((12,1))
-        
-        #condensated matrices and vector
-        self._Ke_=self._Ke.copy()
-        self._Me_=self._Me.copy()
-        self._re_=self._re.copy()
-                
+
+    def _matrices(self,releases=None):
+        return beam_matrices(self._E, self._mu, self._A, self._I2, self._I3, self._J, 
+                             self._rho, self.length, self._mass_type, releases)
+
+    def local_matrices(self):
+        """
+        return:
+            condensated local stiffness and mass matrices.
+        """
+        return self._matrices(self.releases)
+
+    @property
+    def Ke(self):
+        return self._matrices()[0]
+
+    @property
+    def Me(self):
+        return self._matrices()[1]
+
     @property
     def Ke_(self):
-        return self._Ke_
+        return self._matrices(self._releases)[0]
     
     @property
     def Me_(self):
-        return self._Me_
+        return self._matrices(self._releases)[1]
     
     @property    
     def re_(self):
-        return self._re_
+        if not self._releases.any() or not self._re.any():
+            return self._re
+        return condense(self.Ke,self.Me,self._re,self._releases)[2]
     
     @property
     def releases(self):
@@ -406,7 +585,7 @@ class Beam(Line):
     def releases(self,rls):
         if len(rls)!=12:
             raise ValueError('rls must be a 12 boolean array')
-        self._releases=np.array(rls).reshape((2,6))
+        self._releases=np.array(rls,dtype=bool).reshape((2,6))
         
     def _N(self,s):
         """
@@ -426,31 +605,10 @@ class Beam(Line):
     def static_condensation(self):
         """
         Perform static condensation.
+        The condensated matrices are formed lazily by Ke_, Me_ and re_ and 
+        shared through the signature cache, nothing has to be done here.
         """
-        releaseI=self._releases[0]
-        releaseJ=self._releases[1]
-        kij=self._Ke
-        mij=self._Me
-        rij=self._re
-        kij_bar = self._Ke_
-        mij_bar = self._Me_
-        rij_bar = self._re_
-        for n in range(0,6):
-            if releaseI[n] == True:
-                for i in range(12):
-                    for j in range(12):
-                        kij_bar[i, j] = kij[i, j] - kij[i, n]* kij[n, j] / kij[n, n]
-                        mij_bar[i, j] = mij[i, j] - mij[i, n]* mij[n, j] / mij[n, n]
-                    rij_bar[i] = rij[i] - rij[n] * kij[n, i] / kij[n, n]
-            if releaseJ[n] == True:
-                for i in range(12):
-                    for j in range(12):
-                        kij_bar[i, j] = kij[i, j] - kij[i, n + 6]* kij[n + 6, j] / kij[n + 6, n + 6]
-                        mij_bar[i, j] = mij[i, j] - mij[i, n + 6]* mij[n + 6, j] / mij[n + 6, n + 6]
-                    rij_bar[i] = rij[i] - rij[n + 6] * kij[n + 6, i] / kij[n + 6, n + 6]
-        self._Ke_=kij_bar
-        self._Me_=mij_bar
-        self._re_=rij_bar
+        pass
 #        ##pythonic code, not finished
 #        Ke=self._Ke.copy()
 #        Me=self._Me.copy()
@@ -516,6 +674,56 @@ class Beam(Line):
            fe=self._Ke_*ue+self._re_
            return fe
 
+#in-plane DOFs of a 3-node membrane in the 18 DOFs of its nodes
+MEMBRANE3_DOFS=np.array([0,1,6,7,12,13])
+
+def membrane3_B(x2D):
+    """
+    Evaluate strain matrices of a batch of 3-node membranes, which are 
+    constant over the element.
+    
+    params:
+        x2D: nx3x2 array of corner coordinates on local csys.
+    returns:
+        B: nx3x6 array of strain matrices.
+        area: n array of areas.
+    """
+    x2D=np.asarray(x2D,dtype=float).reshape((-1,3,2))
+    x=x2D[:,:,0]
+    y=x2D[:,:,1]
+    j=[1,2,0]
+    m=[2,0,1]
+    a=x[:,j]*y[:,m]-x[:,m]*y[:,j]
+    b=y[:,j]-y[:,m]
+    c=x[:,m]-x[:,j]
+    A2=a.sum(axis=1) #twice the signed area
+    B=np.zeros((x2D.shape[0],3,6))
+    B[:,0,0::2]=b
+    B[:,1,1::2]=c
+    B[:,2,0::2]=c
+    B[:,2,1::2]=b
+    return B/A2[:,None,None],np.abs(A2)/2
+
+def membrane3_stiffness(x2D,D,t):
+    """
+    Stiffness matrices of a batch of 3-node membranes.
+    
+    params:
+        x2D: nx3x2 array of corner coordinates on local csys.
+        D: 3x3 or nx3x3 array of elastic matrices.
+        t: float or n array of thickness.
+    returns:
+        nx18x18 array of local stiffness matrices.
+    """
+    B,area=membrane3_B(x2D)
+    n=B.shape[0]
+    D=np.broadcast_to(np.asarray(D,dtype=float),(n,3,3))
+    t=np.broadcast_to(np.asarray(t,dtype=float),(n,))
+    K6=np.einsum('nki,nkl,nlj,n->nij',B,D,B,area*t)
+    Ke=np.zeros((n,18,18))
+    Ke[:,MEMBRANE3_DOFS[:,None],MEMBRANE3_DOFS]=K6
+    return Ke
+
 class Membrane3(Tri):
     def __init__(self,node_i, node_j, node_k, t, E, mu, rho, name=None):
         """
@@ -527,47 +735,27 @@ class Membrane3(Tri):
             rho: float, mass density
         """
         super(Membrane3,self).__init__(node_i,node_j,node_k,t,E,mu,rho,6,name)
+        self._rho=rho
 
         x0=np.array([(node.x,node.y,node.z) for node in self._nodes])
         V=self._local_csys.transform_matrix
         o=self._local_csys.origin
         self._x0=(x0-np.array(o)).dot(V.T)[:,:2]
         
-        D=self._D
-
-        #calculate strain matrix
-        abc0=self._abc(1,2)
-        abc1=self._abc(2,0)
-        abc2=self._abc(0,1)
-        B0= np.array([[abc0[1],      0],
-                      [      0,abc0[2]],
-                      [abc0[2],abc0[1]]])
-        B1= np.array([[abc1[1],     0],
-                      [      0,abc1[2]],
-                      [abc1[2],abc1[1]]])
-        B2= np.array([[abc2[1],      0],
-                      [      0,abc2[2]],
-                      [abc2[2],abc2[1]]])
-        self._B=np.hstack([B0,B1,B2])/2/self.area
-
-        _Ke_=np.dot(np.dot(self._B(0).T,D),self._B(0))*self.area*self._t
-
-        row=[a for a in range(0*2,0*2+2)]+\
-            [a for a in range(1*2,1*2+2)]+\
-            [a for a in range(2*2,2*2+2)]
-        col=[a for a in range(0*6,0*6+2)]+\
-            [a for a in range(1*6,1*6+2)]+\
-            [a for a in range(2*6,2*6+2)]
-        elm_node_count=3
-        elm_dof=2
-        data=[1]*(elm_node_count*elm_dof)
-        G=sp.sparse.csr_matrix((data,(row,col)),shape=(elm_node_count*elm_dof,elm_node_count*6))
-        self._Ke=G.transpose()*_Ke_*G
-
-        #Concentrated mass matrix, may be wrong
-        self._Me=np.eye(18)*rho*self.area*t/3
+        #strain matrix
+        self._B=membrane3_B(self._x0)[0][0]
         
         self._re =np.zeros((18,1))
+
+    @property
+    def Ke(self):
+        return spr.csr_matrix(membrane3_stiffness(self._x0,self._D,self._t)[0])
+
+    @property
+    def Me(self):
+        #Concentrated mass matrix, may be wrong
+        data=np.ones(6)*self._rho*self.area*self._t/3
+        return spr.csr_matrix((data,(MEMBRANE3_DOFS,MEMBRANE3_DOFS)),shape=(18,18))
                 
     def _abc(self,j,m):
         """
@@ -585,10 +773,11 @@ class Membrane3(Tri):
         return: 3x1 array represent x,y
         """
         x,y=x[0],x[1]
-        L=np.array((3,1))
-        L[0]=self._abc(1,2).dot(np.array([1,x,y]))/2/self._area
-        L[1]=self._abc(2,0).dot(np.array([1,x,y]))/2/self._area
-        L[2]=self._abc(0,1).dot(np.array([1,x,y]))/2/self._area
+        A2=self._abc(1,2)[0]+self._abc(2,0)[0]+self._abc(0,1)[0]
+        L=np.zeros(3)
+        L[0]=self._abc(1,2).dot(np.array([1,x,y]))/A2
+        L[1]=self._abc(2,0).dot(np.array([1,x,y]))/A2
+        L[2]=self._abc(0,1).dot(np.array([1,x,y]))/A2
         return L.reshape(3,1)
     
     def _x(self,L):
@@ -598,11 +787,93 @@ class Membrane3(Tri):
         """
         return np.dot(np.array(L).reshape(1,3),self._x0).reshape(2,1)
 
+    def _S(self):
+        """
+        stress matrix
+        """
+        return np.dot(self._D,self._B)
+
+    
+#2x2 Gauss points and weights on natural csys
+GAUSS_2x2=np.array([[-1,-1],[1,-1],[1,1],[-1,1]])/np.sqrt(3)
+GAUSS_2x2_WEIGHTS=np.ones(4)
+
+#natural coordinates of the corners of a 4-node quadrilateral, counter-clockwise
+QUAD4_CORNERS=np.array([[-1,-1],[1,-1],[1,1],[-1,1]])
+
+#extrapolate values on 2x2 Gauss points to the corners, which is the bilinear
+#interpolation through the Gauss points evaluated at the corners.
+QUAD4_EXTRAPOLATION=(1+np.sqrt(3)*QUAD4_CORNERS[:,None,0]*QUAD4_CORNERS[None,:,0])*\
+                    (1+np.sqrt(3)*QUAD4_CORNERS[:,None,1]*QUAD4_CORNERS[None,:,1])/4
+
+def quad4_dN(s,r):
+    """
+    derivatives of Lagrange's interpolate functions of a 4-node quadrilateral.
+    
+    params:
+        s,r: arrays of natural positions of evaluate points.
+    returns:
+        gx2x4 array of dN/ds and dN/dr.
+    """
+    s=np.atleast_1d(s)[:,None]
+    r=np.atleast_1d(r)[:,None]
+    si=QUAD4_CORNERS[:,0]
+    ri=QUAD4_CORNERS[:,1]
+    return np.stack([si*(1+r*ri)/4,ri*(1+s*si)/4],axis=1)
+
+def membrane4_B(x2D,points=GAUSS_2x2):
+    """
+    Evaluate strain matrices of a batch of 4-node membranes.
+    
+    params:
+        x2D: nx4x2 array of corner coordinates on local csys.
+        points: gx2 array of natural positions of evaluate points.
+    returns:
+        B: nxgx3x8 array of strain matrices.
+        detJ: nxg array of determinants of Jacobi matrices.
+    """
+    x2D=np.asarray(x2D,dtype=float).reshape((-1,4,2))
+    dN=quad4_dN(points[:,0],points[:,1]) #gx2x4
+    J=np.einsum('gik,nkj->ngij',dN,x2D) #nxgx2x2
+    detJ=J[...,0,0]*J[...,1,1]-J[...,0,1]*J[...,1,0]
+    dNdx=np.matmul(np.linalg.inv(J),dN[None]) #nxgx2x4
+    B=np.zeros(dNdx.shape[:2]+(3,8))
+    B[...,0,0::2]=dNdx[...,0,:]
+    B[...,1,1::2]=dNdx[...,1,:]
+    B[...,2,0::2]=dNdx[...,1,:]
+    B[...,2,1::2]=dNdx[...,0,:]
+    return B,detJ
+
+#in-plane DOFs of a 4-node membrane in the 24 DOFs of its nodes
+MEMBRANE4_DOFS=np.array([0,1,6,7,12,13,18,19])
+
+def membrane4_stiffness(x2D,D,t):
+    """
+    Integrate stiffness matrices of a batch of 4-node membranes on 2x2 Gauss
+    points at once.
     
+    params:
+        x2D: nx4x2 array of corner coordinates on local csys.
+        D: 3x3 or nx3x3 array of elastic matrices.
+        t: float or n array of thickness.
+    returns:
+        nx24x24 array of local stiffness matrices.
+    """
+    B,detJ=membrane4_B(x2D)
+    n=B.shape[0]
+    D=np.broadcast_to(np.asarray(D,dtype=float),(n,3,3))
+    t=np.broadcast_to(np.asarray(t,dtype=float),(n,))
+    w=detJ*GAUSS_2x2_WEIGHTS*t[:,None] #nxg
+    DB=np.matmul(D[:,None],B) #nxgx3x8
+    K8=np.einsum('ngki,ngkj,ng->nij',B,DB,w)
+    Ke=np.zeros((n,24,24))
+    Ke[:,MEMBRANE4_DOFS[:,None],MEMBRANE4_DOFS]=K8
+    return Ke
+
 class Membrane4(Quad):
     def __init__(self,node_i, node_j, node_k, node_l, t, E, mu, rho, name=None):
         """
-        node_i,node_j,node_k: corners of triangle.
+        node_i,node_j,node_k,node_l: corners of quadrilateral, counter-clockwise.
         t: thickness
         E: elastic modulus
         mu: Poisson ratio
@@ -614,27 +885,19 @@ class Membrane4(Quad):
         self._mu=mu
         self._rho=rho
 
-        elm_node_count=4
-        node_dof=2
-        
-        Ke = quadpy.quadrilateral.integrate(
-            lambda s: self._BtDB(s[0],s[1])*np.linalg.det(self._J(s[0],s[1])),
-            quadpy.quadrilateral.rectangle_points([-1.0, 1.0], [-1.0, 1.0]),
-            quadpy.quadrilateral.Stroud('C2 7-2')
-            )
-        Ke=sp.sparse.csr_matrix(Ke)
-        row=[]
-        col=[]
-        for i in range(elm_node_count):
-            row+=[a for a in range(i*node_dof,i*node_dof+node_dof)]
-            col+=[a for a in range(i*6,i*6+node_dof)]
-        data=[1]*(elm_node_count*node_dof)
-        G=sp.sparse.csr_matrix((data,(row,col)),shape=(elm_node_count*node_dof,elm_node_count*6))
-        self._Ke=G.transpose()*Ke*G
+        #local matrices are formed on demand, batches of membranes should
+        #use membrane4_stiffness directly.
+        self._re =np.zeros((24,1))
+
+    @property
+    def Ke(self):
+        return spr.csr_matrix(membrane4_stiffness(self._x2D,self._D,self._t)[0])
+
+    @property
+    def Me(self):
         #Concentrated mass matrix, may be wrong
-        self._Me=G.transpose()*np.eye(node_dof*elm_node_count)*G*rho*self._area*t/4
-        
-        self._re =np.zeros((elm_node_count*6,1))
+        data=np.ones(8)*self._rho*self._area*self._t/4
+        return spr.csr_matrix((data,(MEMBRANE4_DOFS,MEMBRANE4_DOFS)),shape=(24,24))
         
     @property
     def area(self):
@@ -644,88 +907,50 @@ class Membrane4(Quad):
         """
         Lagrange's interpolate function
         params:
-            s,r:natural position of evalue point.2-array.
+            s,r:natural position of evalue point.
         returns:
             2x(2x4) shape function matrix.
         """
-        la1=(1-s)/2
-        la2=(1+s)/2
-        lb1=(1-r)/2
-        lb2=(1+r)/2
-        N1=la1*lb1
-        N2=la1*lb2
-        N3=la2*lb1
-        N4=la2*lb2
-
-        N=np.hstack(N1*np.eye(2),N2*np.eye(2),N3*np.eye(2),N4*np.eye(2))
-        return N
+        N=(1+s*QUAD4_CORNERS[:,0])*(1+r*QUAD4_CORNERS[:,1])/4
+        return np.hstack([N[0]*np.eye(2),N[1]*np.eye(2),N[2]*np.eye(2),N[3]*np.eye(2)])
 
     def _J(self,s,r):
         """
         Jacobi matrix of Lagrange's interpolate function
-        Lagrange's interpolate function
         params:
-            s,r:natural position of evalue point.2-array.
+            s,r:natural position of evalue point.g-array.
         returns:
-            2x2 Jacobi matrix.
-        """
-        J=np.zeros((2,2,s.shape[0]))
-        #coordinates on local catesian system
-        x2D=self._x2D
-        x1,y1=x2D[0,0],x2D[0,1]
-        x2,y2=x2D[1,0],x2D[1,1]
-        x3,y3=x2D[2,0],x2D[2,1]
-        x4,y4=x2D[3,0],x2D[3,1]
-        J[0,0]=-x1*(-s/2 + 1/2)/2 + x2*(-s/2 + 1/2)/2 - x3*(s/2 + 1/2)/2 + x4*(s/2 + 1/2)/2
-        J[1,0]=-x1*(-r/2 + 1/2)/2 - x2*(r/2 + 1/2)/2 + x3*(-r/2 + 1/2)/2 + x4*(r/2 + 1/2)/2
-        J[0,1]=-y1*(-s/2 + 1/2)/2 + y2*(-s/2 + 1/2)/2 - y3*(s/2 + 1/2)/2 + y4*(s/2 + 1/2)/2
-        J[1,1]=-y1*(-r/2 + 1/2)/2 - y2*(r/2 + 1/2)/2 + y3*(-r/2 + 1/2)/2 + y4*(r/2 + 1/2)/2
-        return J.transpose(2,0,1)
+            gx2x2 Jacobi matrix.
+        """
+        return np.einsum('gik,kj->gij',quad4_dN(s,r),self._x2D)
     
     def _B(self,s,r):
         """
         strain matrix, which is derivative of intepolate function
         params:
-            s,r:natural position of evalue point.2-array.
+            s,r:natural position of evalue point.g-array.
         returns:
-            3x(2x4) Jacobi matrix.
+            gx3x(2x4) strain matrix.
         """
-        
-        B=np.zeros((3,8,s.shape[0])) #vectorized
-        B[0,0]=B[2,1]=s/4 - 1/4
-        B[1,1]=B[2,0]=r/4 - 1/4
-        B[0,2]=B[2,3]=-s/4 + 1/4
-        B[1,3]=B[2,2]=-r/4 - 1/4
-        B[0,4]=B[2,5]=-s/4 - 1/4
-        B[1,5]=B[2,4]=-r/4 + 1/4
-        B[0,6]=B[2,7]=s/4 + 1/4
-        B[1,7]=B[2,6]=r/4 + 1/4
-        return B
+        points=np.column_stack([np.atleast_1d(s),np.atleast_1d(r)])
+        return membrane4_B(self._x2D,points)[0][0]
     
     def _BtDB(self,s,r):
         """
         dot product of B^T, D, B
         params:
-            s,r:natural position of evalue point.2-array.
+            s,r:natural position of evalue point.g-array.
         returns:
-            3x3 matrix.
-        """
-        print(self._B(s,r).transpose(2,0,1).shape)
-        print(
-            np.matmul(
-                np.dot(self._B(s,r).T,self._D),
-                self._B(s,r).transpose(2,0,1)).shape
-            )
-        print(self._D.shape)
-       
-        
-        return np.matmul(np.dot(self._B(s,r).T,self._D),self._B(s,r).transpose(2,0,1)).transpose(1,2,0)
+            gx8x8 matrix.
+        """
+        B=self._B(s,r)
+        return np.matmul(np.matmul(B.transpose(0,2,1),self._D),B)
     
     def _S(self,s,r):
         """
         stress matrix
         """
-        return np.dot(self._D,self._B(s,r))
+        return np.matmul(self._D,self._B(s,r))
 
 class Plate4(Quad):
     def __init__(self,node_i, node_j, node_k, node_l,t, E, mu, rho, name=None):
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:40:12 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse.linalg as sl
+
+class ElementOperator(sl.LinearOperator):
+    """
+    Global matrix applied element by element.
+    The global matrix is never formed, only the stacked element matrices and
+    their DOFs are kept, so the memory is proportional to the number of
+    elements. A product gathers the element vectors, multiplies them with the
+    element matrices in batch and scatter-adds the results.
+    """
+    def __init__(self,groups,n_nodes,penalty=None):
+        """
+        params:
+            groups: list of dofs,Ae. dofs is nxm array of global DOFs of
+                elements, Ae is nxmxm array of element matrices on global csys.
+            n_nodes: number of nodes.
+            penalty: array of size 6*n_nodes added to the diagonal, or None.
+        """
+        self.groups=[(dofs,Ae) for dofs,Ae in groups if dofs.shape[0]>0]
+        self.n_nodes=n_nodes
+        self.penalty=penalty
+        n=n_nodes*6
+        super(ElementOperator,self).__init__(float,(n,n))
+
+    def _matmat(self,X):
+        X=np.asarray(X,dtype=float)
+        n,k=X.shape
+        Y=np.zeros((n,k))
+        for dofs,Ae in self.groups:
+            Ye=np.matmul(Ae,X[dofs])
+            idx=(dofs[:,:,None]*k+np.arange(k)).ravel()
+            Y+=np.bincount(idx,weights=Ye.ravel(),minlength=n*k).reshape((n,k))
+        if self.penalty is not None:
+            Y+=self.penalty[:,None]*X
+        return Y
+
+    def _matvec(self,x):
+        return self._matmat(np.asarray(x).reshape((-1,1))).reshape(np.shape(x))
+
+    def _rmatvec(self,x):
+        return self._matvec(x)
+
+    def _adjoint(self):
+        return self
+
+    def diagonal(self):
+        """
+        return:
+            diagonal of the global matrix.
+        """
+        n=self.shape[0]
+        d=np.zeros(n)
+        for dofs,Ae in self.groups:
+            d+=np.bincount(dofs.ravel(),weights=np.einsum('nii->ni',Ae).ravel(),minlength=n)
+        if self.penalty is not None:
+            d+=self.penalty
+        return d
+
+    def diagonal_blocks(self):
+        """
+        return:
+            nx6x6 array, diagonal blocks of the nodes.
+        """
+        D=np.zeros((self.n_nodes,6,6))
+        for dofs,Ae in self.groups:
+            n,m=dofs.shape[0],dofs.shape[1]//6
+            conn=dofs[:,::6]//6
+            blocks=Ae.reshape((n,m,6,m,6))
+            for i in range(m):
+                np.add.at(D,conn[:,i],blocks[:,i,:,i,:])
+        if self.penalty is not None:
+            k=np.arange(6)
+            D[:,k,k]+=self.penalty.reshape((-1,6))
+        return D
+
+    def penalized(self,dofs,alpha):
+        """
+        Enlarge diagonal entries of given DOFs, the element matrices are
+        shared with the result.
+
+        params:
+            dofs: array of DOFs.
+            alpha: factor of the diagonal entries.
+        return:
+            ElementOperator.
+        """
+        penalty=np.zeros(self.shape[0]) if self.penalty is None else self.penalty.copy()
+        penalty[dofs]+=(alpha-1)*self.diagonal()[dofs]
+        return ElementOperator(self.groups,self.n_nodes,penalty)
+
+    @property
+    def arrays(self):
+        """
+        dict of arrays which hold the operator.
+        """
+        arrays={}
+        for i,(dofs,Ae) in enumerate(self.groups):
+            arrays['dofs%d'%i]=dofs
+            arrays['data%d'%i]=Ae
+        if self.penalty is not None:
+            arrays['penalty']=self.penalty
+        return arrays
@@ -22,6 +22,7 @@ class Node(object):
         pt1=[x+1,y,z]
         pt2=[x,y+1,z]
         self.__local_csys=Cartisian(o,pt1,pt2)
+        self.__T=None
         
         self.__disp=np.array([None,None,None,None,None,None]).reshape((6,1))
         self.__load=np.zeros((6,1))
@@ -55,13 +56,20 @@ class Node(object):
     
     @property
     def transform_matrix(self):
-        V=self.__local_csys.transform_matrix
-        V_=np.zeros((6,6))
-        V_[:3,:3]=V_[3:,3:]=V
-        return V_
+        """
+        6x6 transform matrix, kept until the csys is changed.
+        """
+        if self.__T is None:
+            V=self.__local_csys.transform_matrix
+            V_=np.zeros((6,6))
+            V_[:3,:3]=V_[3:,3:]=V
+            V_.flags.writeable=False
+            self.__T=V_
+        return self.__T
 
     def initialize_csys(self):
         self.__local_csys.align_with_global();
+        self.__T=None
 
     @property
     def fn(self):
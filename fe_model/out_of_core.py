@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 19:02:47 2026
+
+@author: HZJ
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse as spr
+
+class Scratch(object):
+    """
+    Scratch directory of memory-mapped arrays for out-of-core analysis.
+    Triplets, arrays of global matrices and solution vectors are kept in
+    files, only the pages being used are held in memory.
+    """
+    def __init__(self,path=None,limit=None,chunk=2**20):
+        """
+        params:
+            path: str, scratch directory, a temporary one is made if None,
+                it is removed by close.
+            limit: int, max bytes of the files, None for no limit.
+            chunk: int, number of entries processed at once.
+        """
+        self.__owned=path is None
+        if path is None:
+            path=tempfile.mkdtemp(prefix='fe_scratch_')
+        elif not os.path.exists(path):
+            os.makedirs(path)
+        self.path=path
+        self.limit=limit
+        self.chunk=chunk
+        self.__arrays={}
+        self.__count=0
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.__arrays.values())
+
+    def array(self,name,shape,dtype=float):
+        """
+        params:
+            name: str, name of the array, an existing array of the name is
+                released.
+            shape: tuple of int.
+            dtype: data type.
+        return:
+            memory-mapped array, initialized with zeros.
+        """
+        self.release(name)
+        shape=tuple(np.atleast_1d(shape).astype(int))
+        nbytes=int(np.prod(shape))*np.dtype(dtype).itemsize
+        if self.limit is not None and self.nbytes+nbytes>self.limit:
+            raise Exception('Scratch limit of %d bytes is exceeded.'%self.limit)
+        if nbytes==0:
+            a=np.zeros(shape,dtype=dtype)
+        else:
+            a=np.memmap(os.path.join(self.path,name+'.dat'),dtype=dtype,mode='w+',shape=shape)
+        self.__arrays[name]=a
+        return a
+
+    def copy(self,name,a):
+        """
+        Copy an array to a memory-mapped one in chunks.
+        """
+        a=np.asarray(a)
+        m=self.array(name,a.shape,a.dtype)
+        if a.ndim==0:
+            m[...]=a
+            return m
+        for i in range(0,a.shape[0],self.chunk):
+            m[i:i+self.chunk]=a[i:i+self.chunk]
+        return m
+
+    def spill(self,arrays):
+        """
+        Move arrays to files with generated names.
+
+        params:
+            arrays: tuple of arrays.
+        return:
+            tuple of memory-mapped arrays.
+        """
+        self.__count+=1
+        return tuple(self.copy('spill%d_%d'%(self.__count,i),a) for i,a in enumerate(arrays))
+
+    def release(self,name):
+        """
+        Forget an array and delete its file. Views still referring to it
+        stay valid until they are dropped.
+        """
+        a=self.__arrays.pop(name,None)
+        if a is None:
+            return
+        f=os.path.join(self.path,name+'.dat')
+        if isinstance(a,np.memmap) and os.path.exists(f):
+            os.remove(f)
+
+    def release_spilled(self):
+        for name in [k for k in self.__arrays.keys() if k.startswith('spill')]:
+            self.release(name)
+
+    def clear(self):
+        for name in list(self.__arrays.keys()):
+            self.release(name)
+
+    def close(self):
+        """
+        Release all the arrays and remove the directory if the scratch made
+        it. Matrices built on the arrays must not be used after.
+        """
+        self.clear()
+        if self.__owned:
+            shutil.rmtree(self.path,ignore_errors=True)
+            self.__owned=False
+
+    def __del__(self):
+        #__init__ may have failed before the attributes were set
+        if hasattr(self,'_Scratch__arrays'):
+            self.close()
+
+    def csr(self,name,ijv,n):
+        """
+        Build a csr matrix on memory-mapped arrays from triplets in chunks,
+        entries are placed row by row without sorting the whole triplets.
+        Duplicated entries are kept, they sum up in products.
+
+        params:
+            name: str, prefix of the arrays.
+            ijv: list of data,row,col arrays.
+            n: order of the matrix.
+        return:
+            csr matrix.
+        """
+        nnz=sum(data.shape[0] for data,row,col in ijv)
+        idx_dtype=np.int32 if max(nnz,n)<2**31 else np.int64
+        counts=np.zeros(n,dtype=np.int64)
+        for data,row,col in ijv:
+            for i in range(0,row.shape[0],self.chunk):
+                counts+=np.bincount(row[i:i+self.chunk],minlength=n)
+        indptr=self.array(name+'_indptr',n+1,idx_dtype)
+        indptr[1:]=np.cumsum(counts)
+        data_=self.array(name+'_data',nnz,float)
+        indices=self.array(name+'_indices',nnz,idx_dtype)
+        #next free position of each row
+        fill=np.array(indptr[:-1],dtype=np.int64)
+        for data,row,col in ijv:
+            for i in range(0,row.shape[0],self.chunk):
+                r=np.asarray(row[i:i+self.chunk])
+                order=np.argsort(r,kind='stable')
+                r=r[order]
+                #rank of entries in their row
+                start=np.concatenate([[0],np.nonzero(np.diff(r))[0]+1]) if r.shape[0]>0 else np.zeros(0,dtype=int)
+                rank=np.arange(r.shape[0])-np.repeat(start,np.diff(np.concatenate([start,[r.shape[0]]])))
+                pos=fill[r]+rank
+                data_[pos]=np.asarray(data[i:i+self.chunk])[order]
+                indices[pos]=np.asarray(col[i:i+self.chunk])[order]
+                fill+=np.bincount(r,minlength=n)
+        return spr.csr_matrix((data_,indices,indptr),shape=(n,n),copy=False)
+
+    def bsr(self,name,ijv,n_nodes):
+        """
+        Build a 6x6 blocked matrix on memory-mapped arrays from blocks in
+        chunks. Blocks on the same position are summed, only the positions
+        of the blocks are sorted in memory.
+
+        params:
+            name: str, prefix of the arrays.
+            ijv: list of blocks,row,col arrays, row and col are node hids.
+            n_nodes: number of nodes.
+        return:
+            bsr matrix.
+        """
+        keys=[np.asarray(row,dtype=np.int64)*n_nodes+np.asarray(col) for blocks,row,col in ijv]
+        keys=np.concatenate(keys) if keys!=[] else np.zeros(0,dtype=np.int64)
+        keys,inverse=np.unique(keys,return_inverse=True)
+        idx_dtype=np.int32 if max(keys.shape[0],n_nodes)<2**31 else np.int64
+        indptr=self.array(name+'_indptr',n_nodes+1,idx_dtype)
+        indptr[1:]=np.cumsum(np.bincount(keys//n_nodes,minlength=n_nodes))
+        indices=self.array(name+'_indices',keys.shape[0],idx_dtype)
+        for i in range(0,keys.shape[0],self.chunk):
+            indices[i:i+self.chunk]=keys[i:i+self.chunk]%n_nodes
+        data=self.array(name+'_data',(keys.shape[0],6,6),float)
+        k=0
+        for blocks,row,col in ijv:
+            for i in range(0,row.shape[0],self.chunk):
+                b=np.asarray(blocks[i:i+self.chunk])
+                np.add.at(data,inverse[k+i:k+i+b.shape[0]],b)
+            k+=row.shape[0]
+        return spr.bsr_matrix((data,indices,indptr),shape=(n_nodes*6,n_nodes*6))
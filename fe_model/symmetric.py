@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:05:31 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse as spr
+import scipy.sparse.linalg as sl
+
+#storage formats of global matrices
+FORMATS=('full','triu','bsr','ebe')
+
+def sym_matvec(U,x):
+    """
+    Product of a symmetric matrix stored as its upper triangle and a vector.
+
+    params:
+        U: sparse upper triangle with diagonal.
+        x: n-array or nxk array.
+    return:
+        A.x with A=U+U^T-diag(U).
+    """
+    x=np.asarray(x)
+    d=U.diagonal()
+    y=U.dot(x)+U.T.dot(x)
+    return y-(d*x.T).T
+
+def sym_operator(U):
+    """
+    LinearOperator of a symmetric matrix stored as its upper triangle.
+    """
+    return sl.LinearOperator(U.shape,matvec=lambda x:sym_matvec(U,x),
+                             rmatvec=lambda x:sym_matvec(U,x),
+                             matmat=lambda X:sym_matvec(U,X),dtype=U.dtype)
+
+def sym_full(U):
+    """
+    Expand an upper triangle to the full symmetric matrix, for direct solvers
+    which need the whole matrix. The result is a temporary, it should not be
+    kept.
+    """
+    U=spr.csr_matrix(U)
+    return (U+spr.triu(U,k=1,format='csr').T).tocsr()
+
+def as_operator(A,fmt):
+    """
+    params:
+        A: sparse matrix.
+        fmt: 'full', 'triu', 'bsr' or 'ebe', storage format of A.
+    return:
+        A itself if it is stored fully, otherwise a LinearOperator.
+    """
+    if fmt=='triu':
+        return sym_operator(A)
+    return A
+
+def as_full(A,fmt):
+    """
+    params:
+        A: sparse matrix.
+        fmt: 'full', 'triu', 'bsr' or 'ebe', storage format of A.
+    return:
+        full sparse matrix in csr.
+    """
+    if fmt=='triu':
+        return sym_full(A)
+    if fmt=='bsr':
+        return A.tocsr()
+    if fmt=='ebe':
+        raise Exception('Matrix-free operator cannot be expanded, use an iterative solver.')
+    return A
+
+def matvec(A,x,fmt):
+    """
+    params:
+        A: sparse matrix.
+        x: n-array or nxk array.
+        fmt: 'full', 'triu', 'bsr' or 'ebe', storage format of A.
+    return:
+        A.x
+    """
+    if fmt=='triu':
+        return sym_matvec(A,x)
+    return A.dot(x)
+
+def diagonal_blocks(A,fmt):
+    """
+    6x6 diagonal blocks of the nodes, as used by block-Jacobi 
+    preconditioning. They are read from the block data directly for bsr.
+
+    params:
+        A: sparse matrix.
+        fmt: 'full', 'triu', 'bsr' or 'ebe', storage format of A.
+    return:
+        nx6x6 array.
+    """
+    if fmt=='ebe':
+        return A.diagonal_blocks()
+    if fmt!='bsr':
+        A=spr.bsr_matrix(A,blocksize=(6,6))
+    n=A.indptr.shape[0]-1
+    rows=np.repeat(np.arange(n),np.diff(A.indptr))
+    on_diag=np.nonzero(A.indices==rows)[0]
+    D=np.zeros((n,6,6))
+    D[rows[on_diag]]=A.data[on_diag]
+    if fmt=='triu':
+        D=D+np.triu(D,k=1).transpose(0,2,1)
+    return D
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:40 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse as spr
+
+from csys import Cartisian
+from .element import beam_matrices,condense
+
+class NodeTable(object):
+    """
+    Structure-of-arrays storage of nodes.
+    Coordinates, nodal csys, loads and displacements are kept in contiguous
+    arrays, node objects are handed out as light-weight views on demand.
+    The table behaves like the dict of nodes used in object storage mode.
+    """
+    def __init__(self,capacity=64):
+        self._n=0
+        self._xyz=np.zeros((capacity,3))
+        self._V=np.zeros((capacity,3,3))
+        self._load=np.zeros((capacity,6))
+        self._disp=np.full((capacity,6),np.nan)
+
+    def _reserve(self,n):
+        """
+        make sure the arrays can hold n nodes.
+        """
+        cap=self._xyz.shape[0]
+        if n<=cap:
+            return
+        cap=max(n,cap*2)
+        m=self._n
+        xyz=np.zeros((cap,3))
+        V=np.zeros((cap,3,3))
+        load=np.zeros((cap,6))
+        disp=np.full((cap,6),np.nan)
+        xyz[:m]=self._xyz[:m]
+        V[:m]=self._V[:m]
+        load[:m]=self._load[:m]
+        disp[:m]=self._disp[:m]
+        self._xyz,self._V,self._load,self._disp=xyz,V,load,disp
+
+    def append(self,x,y,z):
+        """
+        params:
+            x,y,z: float, coordinate of node.
+        return:
+            hid of the new node.
+        """
+        return int(self.extend([[x,y,z]])[0])
+
+    def extend(self,xyz):
+        """
+        params:
+            xyz: nx3 array-like, coordinates of nodes.
+        return:
+            array of hids of the new nodes.
+        """
+        xyz=np.asarray(xyz,dtype=float).reshape((-1,3))
+        m=self._n
+        n=m+xyz.shape[0]
+        self._reserve(n)
+        self._xyz[m:n]=xyz
+        self._V[m:n]=np.eye(3)
+        self._n=n
+        return np.arange(m,n)
+
+    def find(self,x,y,z,tol=1e-6):
+        """
+        return:
+            list of hids of nodes at the location.
+        """
+        d=np.abs(self.xyz-np.array([x,y,z])).sum(axis=1)
+        return [int(i) for i in np.nonzero(d<tol)[0]]
+
+    @property
+    def xyz(self):
+        return self._xyz[:self._n]
+
+    @property
+    def V(self):
+        return self._V[:self._n]
+
+    @property
+    def load(self):
+        return self._load[:self._n]
+
+    @property
+    def disp(self):
+        return self._disp[:self._n]
+
+    @property
+    def restraint(self):
+        """
+        nx6 boolean array, True where the displacement is specified.
+        """
+        return ~np.isnan(self.disp)
+
+    @property
+    def nbytes(self):
+        return self._xyz.nbytes+self._V.nbytes+self._load.nbytes+self._disp.nbytes
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self,hid):
+        return isinstance(hid,(int,np.integer)) and 0<=hid<self._n
+
+    def __getitem__(self,hid):
+        if hid not in self:
+            raise KeyError(hid)
+        return NodeView(self,int(hid))
+
+    def __iter__(self):
+        return iter(range(self._n))
+
+    def keys(self):
+        return range(self._n)
+
+    def values(self):
+        return (NodeView(self,i) for i in range(self._n))
+
+    def items(self):
+        return ((i,NodeView(self,i)) for i in range(self._n))
+
+class NodeView(object):
+    """
+    Proxy of a row in NodeTable, offers the same interface as Node.
+    """
+    __slots__=('_table','_hid')
+    def __init__(self,table,hid):
+        self._table=table
+        self._hid=hid
+
+    def __eq__(self,other):
+        return isinstance(other,NodeView) and other._table is self._table and other._hid==self._hid
+
+    def __ne__(self,other):
+        return not self==other
+
+    def __hash__(self):
+        return hash((id(self._table),self._hid))
+
+    @property
+    def name(self):
+        return self._hid
+
+    @property
+    def hid(self):
+        return self._hid
+    @hid.setter
+    def hid(self,hid):
+        if hid!=self._hid:
+            raise ValueError('hid of a node view is fixed by the table')
+
+    @property
+    def x(self):
+        return self._table._xyz[self._hid,0]
+
+    @property
+    def y(self):
+        return self._table._xyz[self._hid,1]
+
+    @property
+    def z(self):
+        return self._table._xyz[self._hid,2]
+
+    @property
+    def local_csys(self):
+        o=self._table._xyz[self._hid]
+        V=self._table._V[self._hid]
+        return Cartisian(o,o+V[0],o+V[1])
+
+    @property
+    def transform_matrix(self):
+        V_=np.zeros((6,6))
+        V_[:3,:3]=V_[3:,3:]=self._table._V[self._hid]
+        return V_
+
+    def initialize_csys(self):
+        self._table._V[self._hid]=np.eye(3)
+
+    @property
+    def fn(self):
+        return self._table._load[self._hid].reshape((6,1))
+    @fn.setter
+    def fn(self,load):
+        assert(len(load)==6)
+        self._table._load[self._hid]=np.array(load,dtype=float).reshape(6)
+
+    @property
+    def dn(self):
+        disp=self._table._disp[self._hid]
+        return np.array([None if np.isnan(d) else d for d in disp],dtype=object).reshape((6,1))
+    @dn.setter
+    def dn(self,disp):
+        assert(len(disp)==6)
+        disp=np.array(disp,dtype=object).reshape(6)
+        self._table._disp[self._hid]=[np.nan if d is None else d for d in disp]
+
+class BeamTable(object):
+    """
+    Structure-of-arrays storage of beams.
+    Connectivity, section properties, releases, element loads and local csys
+    are kept in contiguous arrays, beam objects are handed out as light-weight views on
+    demand, local matrices are formed only when they are asked for.
+    """
+    def __init__(self,nodes,mass='conc',capacity=64,tol=1e-6):
+        """
+        params:
+            nodes: NodeTable, nodes the beams connect.
+            mass: 'coor' as coordinate matrix or 'conc' for concentrated matrix
+        """
+        self._nodes=nodes
+        self._mass=mass
+        self._tol=tol
+        self._n=0
+        self._conn=np.zeros((capacity,2),dtype=int)
+        self._prop=np.zeros((capacity,7)) #E,mu,A,I2,I3,J,rho
+        self._releases=np.zeros((capacity,12),dtype=bool)
+        self._re=np.zeros((capacity,12))
+        self._V=np.zeros((capacity,3,3))
+        self._length=np.zeros(capacity)
+        self._active=np.zeros(capacity,dtype=bool)
+
+    def _reserve(self,n):
+        """
+        make sure the arrays can hold n beams.
+        """
+        cap=self._conn.shape[0]
+        if n<=cap:
+            return
+        cap=max(n,cap*2)
+        m=self._n
+        conn=np.zeros((cap,2),dtype=int)
+        prop=np.zeros((cap,7))
+        releases=np.zeros((cap,12),dtype=bool)
+        re=np.zeros((cap,12))
+        V=np.zeros((cap,3,3))
+        length=np.zeros(cap)
+        active=np.zeros(cap,dtype=bool)
+        conn[:m]=self._conn[:m]
+        prop[:m]=self._prop[:m]
+        releases[:m]=self._releases[:m]
+        re[:m]=self._re[:m]
+        V[:m]=self._V[:m]
+        length[:m]=self._length[:m]
+        active[:m]=self._active[:m]
+        self._conn,self._prop,self._releases,self._re=conn,prop,releases,re
+        self._V,self._length,self._active=V,length,active
+
+    def append(self,node0,node1,E, mu, A, I2, I3, J, rho):
+        """
+        params:
+            node0,node1: hid of nodes.
+        return:
+            hid of the new beam.
+        """
+        return int(self.extend([[node0,node1]],[[E, mu, A, I2, I3, J, rho]])[0])
+
+    def _geometry(self,conn):
+        """
+        params:
+            conn: nx2 array of hids of end nodes.
+        return:
+            V: nx3x3 array of local csys, same rule as Line.
+            l: n array of lengths.
+        """
+        xyz=self._nodes.xyz
+        pi=xyz[conn[:,0]]
+        pj=xyz[conn[:,1]]
+        d=pj-pi
+        l=np.linalg.norm(d,axis=1)
+        x=d/l[:,None]
+        ref=np.zeros_like(d)
+        vert=(np.abs(d[:,0])<self._tol)&(np.abs(d[:,1])<self._tol)
+        ref[vert,0]=1
+        ref[~vert,2]=1
+        z=np.cross(x,ref)
+        z/=np.linalg.norm(z,axis=1)[:,None]
+        y=np.cross(z,x)
+        return np.stack([x,y,z],axis=1),l
+
+    def extend(self,conn,prop):
+        """
+        params:
+            conn: nx2 array-like, hids of end nodes.
+            prop: nx7 array-like, E, mu, A, I2, I3, J, rho of beams.
+        return:
+            array of hids of the new beams.
+        """
+        conn=np.asarray(conn,dtype=int).reshape((-1,2))
+        prop=np.asarray(prop,dtype=float).reshape((-1,7))
+        V,l=self._geometry(conn)
+        m=self._n
+        n=m+conn.shape[0]
+        self._reserve(n)
+        self._conn[m:n]=conn
+        self._prop[m:n]=prop
+        self._releases[m:n]=False
+        self._re[m:n]=0
+        self._V[m:n]=V
+        self._length[m:n]=l
+        self._active[m:n]=True
+        self._n=n
+        return np.arange(m,n)
+
+    def update(self,hids,conn,prop):
+        """
+        Reconnect beams and set their properties, local csys and lengths are
+        formed again. Removed beams are brought back.
+        
+        params:
+            hids: array of hids of beams.
+            conn: nx2 array-like, hids of end nodes.
+            prop: nx7 array-like, E, mu, A, I2, I3, J, rho of beams.
+        """
+        hids=np.asarray(hids,dtype=int).reshape(-1)
+        conn=np.asarray(conn,dtype=int).reshape((-1,2))
+        V,l=self._geometry(conn)
+        self._conn[hids]=conn
+        self._prop[hids]=np.asarray(prop,dtype=float).reshape((-1,7))
+        self._V[hids]=V
+        self._length[hids]=l
+        self._active[hids]=True
+
+    def remove(self,hids):
+        """
+        Deactivate beams. The rows are kept so that hids of the other beams
+        stay the same, removed beams contribute nothing to the model.
+        """
+        self._active[np.asarray(hids,dtype=int)]=False
+
+    @property
+    def conn(self):
+        return self._conn[:self._n]
+
+    @property
+    def prop(self):
+        return self._prop[:self._n]
+
+    @property
+    def releases(self):
+        return self._releases[:self._n]
+
+    @property
+    def re(self):
+        """
+        nx12 array of local element nodal forces.
+        """
+        return self._re[:self._n]
+
+    @property
+    def V(self):
+        return self._V[:self._n]
+
+    @property
+    def length(self):
+        return self._length[:self._n]
+
+    @property
+    def active(self):
+        return self._active[:self._n]
+
+    @property
+    def nbytes(self):
+        return self._conn.nbytes+self._prop.nbytes+self._releases.nbytes+self._re.nbytes+\
+            self._V.nbytes+self._length.nbytes+self._active.nbytes
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self,hid):
+        return isinstance(hid,(int,np.integer)) and 0<=hid<self._n
+
+    def __getitem__(self,hid):
+        if hid not in self:
+            raise KeyError(hid)
+        return BeamView(self,int(hid))
+
+    def __iter__(self):
+        return iter(range(self._n))
+
+    def keys(self):
+        return range(self._n)
+
+    def values(self):
+        return (BeamView(self,i) for i in range(self._n))
+
+    def items(self):
+        return ((i,BeamView(self,i)) for i in range(self._n))
+
+class BeamView(object):
+    """
+    Proxy of a row in BeamTable, offers the same interface as Beam.
+    """
+    __slots__=('_table','_hid')
+    def __init__(self,table,hid):
+        self._table=table
+        self._hid=hid
+
+    def __eq__(self,other):
+        return isinstance(other,BeamView) and other._table is self._table and other._hid==self._hid
+
+    def __ne__(self,other):
+        return not self==other
+
+    def __hash__(self):
+        return hash((id(self._table),self._hid))
+
+    @property
+    def name(self):
+        return self._hid
+
+    @property
+    def hid(self):
+        return self._hid
+    @hid.setter
+    def hid(self,hid):
+        if hid!=self._hid:
+            raise ValueError('hid of a beam view is fixed by the table')
+
+    @property
+    def nodes(self):
+        i,j=self._table._conn[self._hid]
+        return [NodeView(self._table._nodes,int(i)),NodeView(self._table._nodes,int(j))]
+
+    @property
+    def node_count(self):
+        return 2
+
+    @property
+    def length(self):
+        return self._table._length[self._hid]
+
+    @property
+    def mass(self):
+        if not self._table._active[self._hid]:
+            return 0.
+        E,mu,A,I2,I3,J,rho=self._table._prop[self._hid]
+        return rho*A*self.length
+
+    @property
+    def _local_csys(self):
+        o=self._table._nodes.xyz[self._table._conn[self._hid,0]]
+        V=self._table._V[self._hid]
+        return Cartisian(o,o+V[0],o+V[1])
+
+    @property
+    def transform_matrix(self):
+        T=np.zeros((12,12))
+        T[:3,:3]=T[3:6,3:6]=T[6:9,6:9]=T[9:,9:]=self._table._V[self._hid]
+        return spr.csr_matrix(T)
+
+    @property
+    def releases(self):
+        return self._table._releases[self._hid].reshape((2,6))
+    @releases.setter
+    def releases(self,rls):
+        if len(rls)!=12:
+            raise ValueError('rls must be a 12 boolean array')
+        self._table._releases[self._hid]=np.array(rls,dtype=bool).reshape(12)
+
+    def _matrices(self,releases=None):
+        E,mu,A,I2,I3,J,rho=self._table._prop[self._hid]
+        return beam_matrices(E, mu, A, I2, I3, J, rho, self.length, self._table._mass, releases)
+
+    def local_matrices(self):
+        """
+        return:
+            condensated local stiffness and mass matrices.
+        """
+        return self._matrices(self.releases)
+
+    @property
+    def Ke(self):
+        return self._matrices()[0]
+
+    @property
+    def Me(self):
+        return self._matrices()[1]
+
+    @property
+    def re(self):
+        return self._table._re[self._hid].reshape((12,1))
+    @re.setter
+    def re(self,force):
+        if len(force)!=12:
+            raise ValueError('element nodal force must be a 12 array')
+        self._table._re[self._hid]=np.array(force,dtype=float).reshape(12)
+
+    def static_condensation(self):
+        """
+        Condensated matrices of a view are formed on demand, nothing to do.
+        """
+        pass
+
+    @property
+    def Ke_(self):
+        return self._matrices(self.releases)[0]
+
+    @property
+    def Me_(self):
+        return self._matrices(self.releases)[1]
+
+    @property
+    def re_(self):
+        if not self._table._releases[self._hid].any() or not self._table._re[self._hid].any():
+            return self.re
+        return condense(self.Ke,self.Me,self.re,self.releases)[2]
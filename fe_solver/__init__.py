@@ -5,4 +5,4 @@ Created on Fri Dec 30 10:36:12 2016
 @author: HZJ
 """
 
-__all__=['static','dynamic']
\ No newline at end of file
+__all__=['static','dynamic','preconditioner','substructure','reduction','reanalysis']
\ No newline at end of file
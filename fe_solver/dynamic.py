@@ -13,6 +13,8 @@ from scipy import sparse as sp
 import scipy.sparse.linalg as sl
 
 from fe_model import Model
+from fe_model.symmetric import as_operator,as_full
+from fe_solver.preconditioner import preconditioner
 import logger      
 
 def solve_modal(model,k:int):
@@ -23,11 +25,19 @@ def solve_modal(model,k:int):
         model: FEModel.
         k: number of modes to extract.
     """
-    K_,M_=model.K_,model.M_
     if k>model.DOF:
         logger.info('Warning: the modal number to extract is larger than the system DOFs, only %d modes are available'%model.DOF)
         k=model.DOF
-    omega2s,modes = sl.eigsh(K_,k,M_,sigma=0,which='LM')
+    if model.matrix_format=='ebe':
+        #shift-invert with K_^-1 applied by preconditioned CG
+        K_,M_=model.K_,model.M_
+        P=preconditioner(K_,'ebe','block_jacobi')
+        OPinv=sl.LinearOperator(K_.shape,matvec=lambda x:sl.cg(K_,x,M=P,rtol=1e-12,maxiter=10*K_.shape[0])[0],dtype=float)
+        omega2s,modes = sl.eigsh(K_,k,M_,sigma=0,which='LM',OPinv=OPinv)
+    else:
+        #shift-invert needs the whole matrices
+        K_,M_=as_full(model.K_,model.matrix_format),as_full(model.M_,model.matrix_format)
+        omega2s,modes = sl.eigsh(K_,k,M_,sigma=0,which='LM')
     delta = modes/np.sum(modes,axis=0)
     model.is_solved=True
     model.mode_=delta
@@ -195,75 +205,111 @@ def response_spectrum(model:Model,spec,mdd,n=60,comb='CQC'):
         print(srss)
     
     
+def _effective_solver(model,c0,c1):
+    """
+    Factorize the effective stiffness K+c0*M+c1*C of an implicit integrator.
+    Rayleigh damping is folded into the coefficients of K and M, a low-rank
+    damping part is added with Woodbury identity, so C is never formed.
+    
+    params:
+        model: FEModel, assembled with boundary.
+        c0,c1: coefficients of M and C.
+    return:
+        function which solves the effective system.
+    """
+    K_,M_=model.K_,model.M_
+    fmt=model.matrix_format
+    damping=model.damping
+    alpha,beta=damping.coefficients if damping is not None else (0.,0.)
+    lu=sl.splu(as_full((1+c1*beta)*K_+(c0+c1*alpha)*M_,fmt).tocsc())
+    lr=damping.lowrank(as_operator(M_,fmt)) if damping is not None else None
+    if lr is None or c1==0:
+        return lu.solve
+    U,d=lr
+    AU=lu.solve(U)
+    #(A+U.D.U^T)^-1=A^-1-A^-1.U.(I+D.U^T.A^-1.U)^-1.D.U^T.A^-1, D is not
+    #inverted, so zero damping ratios are allowed
+    D=c1*d
+    S=np.eye(D.shape[0])+D[:,None]*U.T.dot(AU)
+    def solve(b):
+        x=lu.solve(b)
+        return x-AU.dot(np.linalg.solve(S,D*U.T.dot(x)))
+    return solve
+
+def _damping_force(model,x):
+    """
+    C.x of the restrained model, zero if no damping is set.
+    """
+    C_=model.C_
+    if C_ is None:
+        return np.zeros_like(x)
+    return C_.matvec(x)
+
 def Newmark_beta(model:Model,T,F,u0,v0,a0,beta=0.25,gamma=0.5):
     """
     beta,gamma: parameters.\n
     u0,v0,a0: initial state.\n
     T: time list with uniform interval.\n
     F: list of time-dependent force vectors.
+    return: dict of t and arrays of u,v,a, row i for T[i].
     """
     dt=T[1]-T[0]
-    b1=1/(beta*dt*dt)
-    b2=-1/(beta*dt)
-    b3=1/2/beta-1
-    b4=gamma*dt*b1
-    b5=1+gamma*dt*b2
-    b6=dt*(1+gamma*b3-gamma)
-    K_=self.K+b4*self.C+b1*self.M 
-    u=[u0]
-    v=[v0]
-    a=[a0]
-    tt=[0]
-    for (t,ft) in zip(T,F):
-        ft_=ft+np.dot(self.M,b1*u[-1]-b2*v[-1]-b3*a[-1])+np.dot(self.C,b4*u[-1]-b5*v[-1]-b6*a[-1])
-        ut=np.linalg.solve(K_,ft_)
-        vt=b4*(ut-u[-1])+b5*v[-1]+b6*a[-1]
-        at=b1*(ut-u[-1])+b2*v[-1]+b3*a[-1]
+    b0=1/(beta*dt**2)
+    b1=gamma/(beta*dt)
+    b2=1/(beta*dt)
+    b3=1/(2*beta)-1
+    b4=gamma/beta-1
+    b5=dt/2*(gamma/beta-2)
+    b6=dt*(1-gamma)
+    b7=gamma*dt
+    solve=_effective_solver(model,b0,b1)
+    M_=as_operator(model.M_,model.matrix_format)
+    u=[np.asarray(u0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    v=[np.asarray(v0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    a=[np.asarray(a0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    for ft in F[1:]:
+        ft_=np.asarray(ft,dtype=float).reshape(-1)+M_.dot(b0*u[-1]+b2*v[-1]+b3*a[-1])\
+            +_damping_force(model,b1*u[-1]+b4*v[-1]+b5*a[-1])
+        ut=solve(ft_)
+        at=b0*(ut-u[-1])-b2*v[-1]-b3*a[-1]
+        vt=v[-1]+b6*a[-1]+b7*at
         u.append(ut)
         v.append(vt)
         a.append(at)
-        tt.append(t)
-    df=pd.DataFrame({'t':tt,'u':u,'v':v,'a':a})
-    return df
+    return {'t':np.asarray(T[:len(u)]),'u':np.array(u),'v':np.array(v),'a':np.array(a)}
     
-def Wilson_theta(model:Model,T,F,u0=0,v0=0,a0=0,beta=0.25,gamma=0.5,theta=1.4):
+def Wilson_theta(model:Model,T,F,u0=0,v0=0,a0=0,theta=1.4):
     """
-    beta,gamma,theta: parameters.\n
+    theta: parameter.\n
     u0,v0,a0: initial state.\n
     T: time list with uniform interval.\n
     F: list of time-dependent force vectors.
+    return: dict of t and arrays of u,v,a, row i for T[i].
     """
     dt=T[1]-T[0]
-    dt_=theta*dt
-    b1=1/(beta*dt_**2)
-    b2=-1/(beta*dt_)
-    b3=(1/2-beta)/beta
-    b4=gamma*dt_*b1
-    b5=1+gamma*dt_*b2
-    b6=dt_*(1+gamma*b3-gamma)
-    K_=self.K+b4*self.C+b1*self.M 
-    u=[u0]
-    v=[v0]
-    a=[a0]
-    tt=[0]
-
-    R_=[F[0]]
+    b0=6/(theta*dt)**2
+    b1=3/(theta*dt)
+    b2=2*b1
+    b3=theta*dt/2
+    b4=b0/theta
+    b5=-b2/theta
+    b6=1-3/theta
+    b7=dt/2
+    b8=dt**2/6
+    solve=_effective_solver(model,b0,b1)
+    M_=as_operator(model.M_,model.matrix_format)
+    u=[np.asarray(u0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    v=[np.asarray(v0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    a=[np.asarray(a0,dtype=float).reshape(-1)*np.ones(M_.shape[0])]
+    F=[np.asarray(ft,dtype=float).reshape(-1) for ft in F]
     for i in range(len(F)-1):
-        R_.append(F[i]+theta*(F[i+1]-F[i]))
-        
-    for (t,ft) in zip(T,R_):
-        ft_=ft+np.dot(self.M,b1*u[-1]-b2*v[-1]-b3*a[-1])+np.dot(self.C,b4*u[-1]-b5*v[-1]-b6*a[-1])
-        ut_=np.linalg.solve(K_,ft_)
-        vt_=b4*(ut_-u[-1])+b5*v[-1]+b6*a[-1]
-        at_=b1*(ut_-u[-1])+b2*v[-1]+b3*a[-1]          
-        
-        at=a[-1]+1/theta*(at_-a[-1])
-        vt=v[-1]+((1-gamma)*a[-1]+gamma*at)*dt
-        ut=u[-1]+v[-1]*dt+(1/2-beta)*a[-1]*dt**2+beta*at*dt**2
-
+        ft_=F[i]+theta*(F[i+1]-F[i])+M_.dot(b0*u[-1]+b2*v[-1]+2*a[-1])\
+            +_damping_force(model,b1*u[-1]+2*v[-1]+b3*a[-1])
+        ut_=solve(ft_)
+        at=b4*(ut_-u[-1])+b5*v[-1]+b6*a[-1]
+        vt=v[-1]+b7*(at+a[-1])
+        ut=u[-1]+dt*v[-1]+b8*(at+2*a[-1])
         u.append(ut)
         v.append(vt)
         a.append(at)
-        tt.append(t)
-    df=pd.DataFrame({'t':tt,'u':u,'v':v,'a':a})
-    return df
\ No newline at end of file
+    return {'t':np.asarray(T[:len(u)]),'u':np.array(u),'v':np.array(v),'a':np.array(a)}
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:58:26 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse as spr
+import scipy.sparse.linalg as sl
+
+from fe_model.symmetric import as_full,diagonal_blocks
+
+try:
+    import pyamg
+except ImportError:
+    pyamg=None
+
+def jacobi(A,fmt='full'):
+    """
+    Jacobi preconditioner.
+
+    params:
+        A: sparse matrix or operator offering diagonal().
+        fmt: storage format of A.
+    return:
+        LinearOperator of diag(A)^-1, zero diagonals are taken as 1.
+    """
+    d=np.array(A.diagonal(),dtype=float)
+    d[d==0]=1
+    def matvec(x):
+        x=np.asarray(x)
+        return (x.T/d).T
+    return sl.LinearOperator(A.shape,matvec=matvec,rmatvec=matvec,matmat=matvec,dtype=float)
+
+def block_jacobi(A,fmt='full'):
+    """
+    Block-Jacobi preconditioner with the 6x6 diagonal blocks of nodes.
+
+    params:
+        A: global matrix or operator.
+        fmt: storage format of A.
+    return:
+        LinearOperator of the inverse of the block diagonal. DOFs with zero
+        diagonals are decoupled with unit diagonals, the pseudo inverse is
+        taken for blocks which are still singular.
+    """
+    D=diagonal_blocks(A,fmt)
+    k=np.arange(6)
+    zero=D[:,k,k]==0
+    D=D*~zero[:,:,None]*~zero[:,None,:]
+    D[:,k,k]+=zero
+    Dinv=np.linalg.pinv(D,hermitian=True)
+    def matvec(x):
+        x=np.asarray(x)
+        y=np.matmul(Dinv,x.reshape((Dinv.shape[0],6,-1)))
+        return y.reshape(x.shape)
+    return sl.LinearOperator(A.shape,matvec=matvec,rmatvec=matvec,matmat=matvec,dtype=float)
+
+def incomplete_cholesky(A,fmt='full',drop_tol=1e-5,fill_factor=10):
+    """
+    Incomplete Cholesky preconditioner. Scipy offers no incomplete Cholesky,
+    the threshold incomplete LU of the symmetric matrix is taken with
+    diagonal pivots and the same permutation of rows and columns, so that
+    U=D.L^T, and L.D.L^T is used as the symmetric approximation of A.
+    Nonpositive pivots are taken by their absolute values, or 1 if zero,
+    to keep the preconditioner positive definite.
+
+    params:
+        A: global matrix.
+        fmt: storage format of A, matrix-free operators are not supported.
+        drop_tol,fill_factor: see scipy.sparse.linalg.spilu.
+    return:
+        LinearOperator of the approximate inverse of A.
+    """
+    ilu=sl.spilu(spr.csc_matrix(as_full(A,fmt)),drop_tol=drop_tol,fill_factor=fill_factor,
+                 permc_spec='MMD_AT_PLUS_A',diag_pivot_thresh=0.,options={'SymmetricMode':True})
+    perm=ilu.perm_c
+    if (ilu.perm_r!=perm).any():
+        raise Exception('Rows are pivoted in the incomplete factorization, the matrix is not symmetric.')
+    L=spr.csr_matrix(ilu.L)
+    Lt=spr.csr_matrix(ilu.L.T)
+    d=np.abs(ilu.U.diagonal())
+    d[d==0]=1
+    def matvec(x):
+        x=np.asarray(x,dtype=float)
+        y=np.empty((x.shape[0],1))
+        y[perm]=x.reshape((-1,1))
+        y=sl.spsolve_triangular(L,y,lower=True,unit_diagonal=True)
+        y=sl.spsolve_triangular(Lt,y/d[:,None],lower=False,unit_diagonal=True)
+        return y[perm].reshape(x.shape)
+    return sl.LinearOperator(A.shape,matvec=matvec,rmatvec=matvec,dtype=float)
+
+def rigid_body_modes(xyz):
+    """
+    Rigid body modes of a set of nodes with 6 DOFs.
+
+    params:
+        xyz: nx3 array-like, coordinates of nodes.
+    return:
+        6nx6 array, translations along and rotations about the global axes
+        through the centroid of the nodes.
+    """
+    x=np.asarray(xyz,dtype=float).reshape((-1,3))
+    x=x-x.mean(axis=0)
+    B=np.zeros((x.shape[0],6,6))
+    k=np.arange(6)
+    B[:,k,k]=1
+    #translations of the rotations w, u=w×x
+    B[:,1,3],B[:,2,3]=-x[:,2],x[:,1]
+    B[:,0,4],B[:,2,4]=x[:,2],-x[:,0]
+    B[:,0,5],B[:,1,5]=-x[:,1],x[:,0]
+    return B.reshape((-1,6))
+
+def amg(A,fmt='full',xyz=None):
+    """
+    Smoothed aggregation algebraic multigrid preconditioner, nodes are
+    aggregated with their 6 DOFs together. pyamg is needed.
+
+    params:
+        A: global matrix.
+        fmt: storage format of A, matrix-free operators are not supported.
+        xyz: nx3 array-like, coordinates of nodes. The rigid body modes of
+            the nodes are taken as the near null space, the constant
+            vectors of pyamg are taken if None.
+    return:
+        LinearOperator of one V-cycle.
+    """
+    if pyamg is None:
+        raise Exception('pyamg is needed for algebraic multigrid preconditioner.')
+    A=spr.bsr_matrix(as_full(A,fmt),blocksize=(6,6))
+    B=None if xyz is None else rigid_body_modes(xyz)
+    ml=pyamg.smoothed_aggregation_solver(A,B=B,symmetry='symmetric')
+    return ml.aspreconditioner(cycle='V')
+
+PRECONDITIONERS={
+    'jacobi':jacobi,
+    'block_jacobi':block_jacobi,
+    'ic':incomplete_cholesky,
+    'amg':amg
+    }
+
+def preconditioner(A,fmt='full',kind='block_jacobi',xyz=None):
+    """
+    params:
+        A: global matrix or operator.
+        fmt: storage format of A.
+        kind: None, 'jacobi', 'block_jacobi', 'ic' or 'amg'.
+        xyz: nx3 array-like, coordinates of nodes, only used by 'amg'.
+    return:
+        LinearOperator, or None if kind is None.
+    """
+    if kind is None:
+        return None
+    if kind not in PRECONDITIONERS.keys():
+        raise Exception('Unknown preconditioner %s'%kind)
+    if kind=='amg':
+        return amg(A,fmt,xyz)
+    return PRECONDITIONERS[kind](A,fmt)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 22:48:17 2026
+
+@author: HZJ
+"""
+import time
+
+import numpy as np
+import scipy.sparse as spr
+import scipy.sparse.linalg as sl
+
+from fe_model.symmetric import as_full,matvec
+import logger
+
+class Reanalysis(object):
+    """
+    Static re-analysis after local stiffness changes. K_ of a base design is
+    factorized once. The change of K_ since then is the sum of the changes
+    of a few element matrices, it is written as a low-rank update
+    dK=U.L.U^T on the DOFs it touches. The changed system is solved with the
+    base factor by the Sherman-Morrison-Woodbury identity, or by conjugate
+    gradients preconditioned with the base factor. Past max_rank the changed
+    matrix is factorized again and becomes the new base.
+    """
+    def __init__(self,model,max_rank=100,tol=1e-12):
+        """
+        params:
+            model: FEModel, assembled with boundary conditions.
+            max_rank: max rank of the update, the matrix is factorized again
+                past it.
+            tol: entries and eigenvalues of the change smaller than tol
+                relative to the matrix are taken as round-off.
+        """
+        self.model=model
+        self.max_rank=max_rank
+        self.tol=tol
+        self.rank=0
+        self.refactorizations=0
+        self._factorize()
+
+    def _factorize(self):
+        """
+        Factorize current K_ as the base.
+        """
+        t0=time.perf_counter()
+        self.K0=spr.csc_matrix(as_full(self.model.K_,self.model.matrix_format),copy=True)
+        self.lu=sl.splu(self.K0)
+        self.base_time=time.perf_counter()-t0
+        self.__set_update(np.zeros(0,dtype=int),np.zeros((0,0)),np.zeros(0))
+
+    def __set_update(self,dofs,Q,lam):
+        """
+        params:
+            dofs: array of DOFs touched by the change.
+            Q: mxk array, eigenvectors of the change on the DOFs.
+            lam: k array, eigenvalues of the change.
+        """
+        self.dofs=dofs
+        self.Q=Q
+        self.rank=lam.shape[0]
+        n=self.K0.shape[0]
+        if self.rank==0:
+            self.Z=np.zeros((n,0))
+            self.S=np.zeros((0,0))
+            return
+        U=np.zeros((n,self.rank))
+        U[dofs]=Q
+        #Z=K0^-1.U, S=L^-1+U^T.Z is the capacitance matrix
+        self.Z=self.lu.solve(U)
+        self.S=np.diag(1/lam)+Q.T.dot(self.Z[dofs])
+
+    def update(self):
+        """
+        Form the low-rank update from the change of K_ since the base, or
+        factorize K_ again if the rank is too high.
+
+        return:
+            rank of the update, 0 after a refactorization.
+        """
+        K=spr.csr_matrix(as_full(self.model.K_,self.model.matrix_format))
+        if K.shape!=self.K0.shape:
+            logger.info('The model is changed in size, factorize again.')
+            self._refactorize()
+            return 0
+        dK=(K-self.K0).tocoo()
+        d=np.sqrt(np.abs(self.K0.diagonal()))
+        nz=np.abs(dK.data)>self.tol*d[dK.row]*d[dK.col]
+        dofs=np.unique(np.concatenate([dK.row[nz],dK.col[nz]]))
+        if dofs.shape[0]>4*self.max_rank:
+            logger.info('%d DOFs are changed, factorize again.'%dofs.shape[0])
+            self._refactorize()
+            return 0
+        A=K[dofs][:,dofs].toarray()-self.K0[dofs][:,dofs].toarray()
+        lam,Q=np.linalg.eigh((A+A.T)/2)
+        keep=np.abs(lam)>self.tol*max(np.abs(lam).max() if lam.shape[0]>0 else 0,1e-300)
+        if keep.sum()>self.max_rank:
+            logger.info('Rank of the update %d is over %d, factorize again.'%(keep.sum(),self.max_rank))
+            self._refactorize()
+            return 0
+        self.__set_update(dofs,Q[:,keep],lam[keep])
+        return self.rank
+
+    def _refactorize(self):
+        self._factorize()
+        self.refactorizations+=1
+
+    def woodbury_solve(self,b):
+        """
+        (K0+U.L.U^T)^-1.b=y-Z.S^-1.U^T.y with y=K0^-1.b
+        """
+        y=self.lu.solve(b)
+        if self.rank==0:
+            return y
+        return y-self.Z.dot(np.linalg.solve(self.S,self.Q.T.dot(y[self.dofs])))
+
+    def solve(self,f,method='woodbury',tol=1e-10,max_refine=10):
+        """
+        params:
+            f: load vector.
+            method: 'woodbury' to solve by the identity, the result is
+                refined against K_ until the residual meets tol, or 'pcg' to
+                iterate with the base factor as preconditioner.
+            tol: relative tolerance of residual.
+            max_refine: max number of refinement steps of 'woodbury'.
+        return:
+            displacements,number of refinement steps or iterations.
+        """
+        f=np.asarray(f,dtype=float).reshape(-1)
+        K_=self.model.K_
+        fmt=self.model.matrix_format
+        norm=max(np.linalg.norm(f),1e-300)
+        if method=='woodbury':
+            d=self.woodbury_solve(f)
+            steps=0
+            while steps<max_refine:
+                r=f-matvec(K_,d,fmt)
+                if np.linalg.norm(r)<=tol*norm:
+                    break
+                d+=self.woodbury_solve(r)
+                steps+=1
+            return d,steps
+        if method=='pcg':
+            K=as_full(K_,fmt)
+            P=sl.LinearOperator(K.shape,matvec=self.lu.solve,rmatvec=self.lu.solve,dtype=float)
+            iterations=[0]
+            def count(xk):
+                iterations[0]+=1
+            d,info=sl.cg(K,f,M=P,rtol=tol,maxiter=max(10*self.rank,100),callback=count)
+            if info>0:
+                logger.info('Warning: the solver did not converge in %d iterations'%info)
+            elif info<0:
+                logger.info('Warning: the solver broke down with info %d'%info)
+            return d,iterations[0]
+        raise Exception('Unknown method %s'%method)
+
+def solve_reanalysis(model,reanalysis=None,method='woodbury',tol=1e-10,check=False):
+    """
+    Solve static linear problem by re-analysis of a base design, see
+    Reanalysis. The rank of the update, the relative residual and the
+    speedup over factorizing K_ again are kept in model.solve_info. The
+    speedup is estimated by the time the base factorization took, unless
+    check is True. If the residual misses tol, K_ is factorized again as
+    the new base and solved directly, an exception is raised if the
+    residual is still over tol.
+
+    params:
+        model: FEModel.
+        reanalysis: Reanalysis of the base design, one is made of current
+            K_ if None.
+        method: 'woodbury' or 'pcg', see Reanalysis.solve.
+        tol: relative tolerance of residual.
+        check: if True, K_ is factorized and solved as well, to measure the
+            error and the speedup.
+    return:
+        Reanalysis, to be updated for the next design.
+    """
+    logger.info('solving problem with %d DOFs by re-analysis...'%model.DOF)
+    t0=time.perf_counter()
+    if reanalysis is None:
+        reanalysis=Reanalysis(model)
+    refactorizations=reanalysis.refactorizations
+    rank=reanalysis.update()
+    t1=time.perf_counter()
+    f_=model.f_.toarray().reshape(-1)
+    d,steps=reanalysis.solve(f_,method,tol)
+    fmt=model.matrix_format
+    norm=max(np.linalg.norm(f_),1e-300)
+    residual=np.linalg.norm(f_-matvec(model.K_,d,fmt))/norm
+    if not residual<=tol:
+        logger.info('Warning: residual %.2e of re-analysis is over %.2e, factorize again.'%(residual,tol))
+        reanalysis._refactorize()
+        rank=0
+        d=reanalysis.lu.solve(f_)
+        residual=np.linalg.norm(f_-matvec(model.K_,d,fmt))/norm
+    t2=time.perf_counter()
+    info={'method':'reanalysis-'+method,'precond':None,'iterations':steps,
+          'setup_time':t1-t0,'solve_time':t2-t1,'converged':residual<=tol,
+          'residual':residual,'rank':rank,
+          'refactorized':reanalysis.refactorizations>refactorizations,
+          'speedup':reanalysis.base_time/max(t2-t0,1e-300),'error':None}
+    if check:
+        t=time.perf_counter()
+        d0=sl.splu(spr.csc_matrix(as_full(model.K_,fmt))).solve(f_)
+        info['speedup']=(time.perf_counter()-t)/max(t2-t0,1e-300)
+        info['error']=np.linalg.norm(d-d0)/max(np.linalg.norm(d0),1e-300)
+    model.solve_info=info
+    if not residual<=tol:
+        raise Exception('The solution is not converged, residual %.2e, the structure may be unstable.'%residual)
+    logger.info('re-analysis by %s: rank %d, %d steps, setup %.3fs, solve %.3fs, residual %.2e, speedup %.1fx'%(
+            method,rank,steps,t1-t0,t2-t1,residual,info['speedup']))
+    model.is_solved=True
+    model.d_=d.reshape((model.node_count*6,1))
+    model.r_=matvec(model.K,model.d_,fmt)
+    return reanalysis
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:06:50 2026
+
+@author: HZJ
+"""
+import numpy as np
+import scipy.sparse as spr
+import scipy.sparse.linalg as sl
+
+from fe_model.damping import Damping
+from fe_model.symmetric import as_full
+import logger
+
+class _ReducedDamping(Damping):
+    """
+    Damping model projected to the master DOFs.
+    """
+    def __init__(self,damping,reduction):
+        self.__damping=damping
+        self.__reduction=reduction
+
+    @property
+    def coefficients(self):
+        return self.__damping.coefficients
+
+    def lowrank(self,M):
+        lr=self.__damping.lowrank(self.__reduction.full_M_)
+        if lr is None:
+            return None
+        U,d=lr
+        return self.__reduction.reduce(U),d
+
+class GuyanReduction(object):
+    """
+    Static (Guyan) or dynamic condensation of slave DOFs onto master DOFs.
+    The reduced system offers K_, M_, C_, DOF and matrix_format as a model
+    does, so solve_modal and the time-history integrators can run on it 
+    directly, with loads reduced by reduce() and results expanded to the 
+    full field by expand() only where they are needed.
+    """
+    def __init__(self,model,masters=None,omega=0.,tol=0.):
+        """
+        params:
+            model: FEModel, assembled with boundary conditions.
+            masters: array of master DOFs, if None, unrestrained DOFs with
+                mass larger than tol are picked.
+            omega: float, circular frequency of dynamic condensation, 0 for
+                Guyan reduction.
+            tol: float, threshold of the mass of master DOFs.
+        """
+        fmt=model.matrix_format
+        if fmt=='ebe':
+            raise Exception('Condensation needs assembled matrices, assemble the model in another format than ebe.')
+        K_=spr.csr_matrix(as_full(model.K_,fmt))
+        M_=spr.csr_matrix(as_full(model.M_,fmt))
+        n=K_.shape[0]
+        if masters is None:
+            free=np.ones(n,dtype=bool)
+            free[model.restrained_dofs()]=False
+            masters=np.nonzero((as_full(model.M,fmt).diagonal()>tol)&free)[0]
+        masters=np.unique(np.asarray(masters,dtype=int))
+        slaves=np.setdiff1d(np.arange(n),masters)
+        self.masters=masters
+        self.slaves=slaves
+        self.full_K_=K_
+        self.full_M_=M_
+        self.__model=model
+        #the factorization of slave DOFs is kept for reduction and recovery
+        A=(K_-omega**2*M_) if omega!=0 else K_
+        A_s=A[slaves]
+        self.__lu=sl.splu(spr.csc_matrix(A_s[:,slaves]))
+        self.__A_sm=A_s[:,masters].tocsr()
+        self.K_=self.__project(K_)
+        self.M_=self.__project(M_)
+        self.matrix_format='full'
+        self.is_solved=False
+        logger.info('Condensed %d DOFs to %d master DOFs'%(n,masters.shape[0]))
+
+    def __project(self,A,block=256):
+        """
+        T^T.A.T with T=[I;X] on masters and slaves, X=-A_ss^-1.A_sm. It is
+        formed by blocks of columns of T, X is never kept as a whole.
+        """
+        m=self.masters.shape[0]
+        Ar=np.zeros((m,m))
+        for j in range(0,m,block):
+            k=min(block,m-j)
+            E=np.zeros((m,k))
+            E[np.arange(j,j+k),np.arange(k)]=1
+            Ar[:,j:j+k]=self.reduce(A.dot(self.expand(E)))
+        return spr.csr_matrix((Ar+Ar.T)/2)
+
+    @property
+    def DOF(self):
+        return self.masters.shape[0]
+
+    @property
+    def node_count(self):
+        return self.__model.node_count
+
+    @property
+    def damping(self):
+        damping=self.__model.damping
+        return None if damping is None else _ReducedDamping(damping,self)
+
+    @property
+    def C_(self):
+        damping=self.damping
+        if damping is None:
+            return None
+        return damping.operator(self.K_,self.M_)
+
+    def reduce(self,F):
+        """
+        Reduce full vectors to the master DOFs, T^T.F.
+        
+        params:
+            F: array of size n, or nxk array.
+        return:
+            array of size m, or mxk array.
+        """
+        F=np.asarray(F,dtype=float)
+        F_s=F[self.slaves]
+        return F[self.masters]-self.__A_sm.T.dot(self.__lu.solve(F_s))
+
+    def expand(self,U,dofs=None):
+        """
+        Recover full vectors from master DOFs, T.U.
+        
+        params:
+            U: array of size m, or mxk array.
+            dofs: array of DOFs to return, None for all.
+        return:
+            array of size n, or nxk array, or the rows of dofs.
+        """
+        U=np.asarray(U,dtype=float)
+        full=np.zeros((self.masters.shape[0]+self.slaves.shape[0],)+U.shape[1:])
+        full[self.masters]=U
+        full[self.slaves]=-self.__lu.solve(self.__A_sm.dot(U))
+        return full if dofs is None else full[dofs]
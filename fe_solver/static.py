@@ -4,25 +4,116 @@ Created on Mon Dec 26 11:01:58 2016
 
 @author: HZJ
 """
+import time
 import numpy as np
 from scipy import linalg
 from scipy import sparse as spr
 import scipy.sparse.linalg as sl
 
 from fe_model import Model
+from fe_model.symmetric import as_operator,as_full,matvec
+from fe_solver.preconditioner import preconditioner
 import logger
 
-def solve_linear(model):
+def _direct(K_,f_,mixed,tol,max_refine=10):
+    """
+    Solve with sparse LU factorization. In mixed precision, the diagonally 
+    scaled matrix is factorized in float32 and the solution is brought back
+    to double precision by iterative refinement against the float64 matrix.
+    
+    params:
+        K_: full sparse matrix.
+        f_: load vector.
+        mixed: bool, if True, factorize in float32.
+        tol: relative tolerance of residual to stop refinement.
+        max_refine: max number of refinement steps.
+    return:
+        delta,number of refinement steps,bytes of the factors.
+    """
+    K_=spr.csc_matrix(K_)
+    if not mixed:
+        lu=sl.splu(K_)
+        return lu.solve(f_),0,lu.L.data.nbytes+lu.U.data.nbytes
+    d=np.abs(K_.diagonal())
+    d[d==0]=1
+    s=1/np.sqrt(d)
+    S=spr.diags(s)
+    lu=sl.splu(spr.csc_matrix(S.dot(K_).dot(S),dtype=np.float32))
+    solve=lambda r:s*lu.solve((s*r).astype(np.float32)).astype(float)
+    delta=solve(f_)
+    norm=np.linalg.norm(f_)
+    steps=0
+    while steps<max_refine:
+        r=f_-K_.dot(delta)
+        if np.linalg.norm(r)<=tol*norm:
+            break
+        delta+=solve(r)
+        steps+=1
+    return delta,steps,lu.L.data.nbytes+lu.U.data.nbytes
+
+def solve_linear(model,method='cg',precond='block_jacobi',tol=1e-10):
+    """
+    Solve static linear problem with a preconditioned iterative solver or a
+    direct solver. Iterations, setup time, solve time and the relative 
+    residual are kept in model.solve_info.
+    
+    params:
+        model: FEModel.
+        method: 'cg' or 'lgmres' for iterative solvers, 'direct' for LU 
+            factorization, 'mixed' for float32 LU factorization with 
+            iterative refinement, which halves the memory of the factors.
+        precond: None, 'jacobi', 'block_jacobi', 'ic' or 'amg', see 
+            fe_solver.preconditioner. Only used by iterative solvers.
+        tol: relative tolerance of residual. An iterative solve which does
+            not meet it is done again by LU factorization, an exception is
+            raised if the residual is still over tol.
+    """
     logger.info('solving problem with %d DOFs...'%model.DOF)
-    K_,f_=model.K_,model.f_
-#    M_x = lambda x: sl.spsolve(P, x)
-#    M = sl.LinearOperator((n, n), M_x)
-    #print(sl.spsolve(K_,f_))
-    delta,info=sl.lgmres(K_,f_.toarray())
+    fmt=model.matrix_format
+    K_,f_=as_operator(model.K_,fmt),model.f_.toarray().reshape(-1)
+    t0=time.perf_counter()
+    iterations=[0]
+    def count(xk):
+        iterations[0]+=1
+    factor_bytes=None
+    if method in ('direct','mixed'):
+        precond=None
+        t1=t0
+        delta,iterations[0],factor_bytes=_direct(as_full(model.K_,fmt),f_,method=='mixed',tol)
+        info=0
+    elif method in ('cg','lgmres'):
+        P=preconditioner(model.K_,fmt,precond,model.node_coordinates())
+        t1=time.perf_counter()
+        solver=sl.cg if method=='cg' else sl.lgmres
+        delta,info=solver(K_,f_,M=P,rtol=tol,maxiter=10*model.node_count*6,callback=count)
+    else:
+        raise Exception('Unknown method %s'%method)
+    if info>0:
+        logger.info('Warning: the solver did not converge in %d iterations'%info)
+    elif info<0:
+        logger.info('Warning: the solver broke down with info %d'%info)
+    norm=max(np.linalg.norm(f_),1e-300)
+    residual=np.linalg.norm(f_-K_.dot(delta))/norm
+    fallback=False
+    if not residual<=tol and method in ('cg','lgmres'):
+        if fmt=='ebe':
+            raise Exception('%s did not converge, residual %.2e, the matrix-free model cannot be factorized.'%(method,residual))
+        logger.info('Warning: residual %.2e of %s is over %.2e, solve by LU factorization.'%(residual,method,tol))
+        delta,_,factor_bytes=_direct(as_full(model.K_,fmt),f_,False,tol)
+        residual=np.linalg.norm(f_-K_.dot(delta))/norm
+        fallback=True
+    t2=time.perf_counter()
+    model.solve_info={'method':method,'precond':precond,'iterations':iterations[0],
+                      'setup_time':t1-t0,'solve_time':t2-t1,'converged':residual<=tol,
+                      'residual':residual,'factor_bytes':factor_bytes,'fallback':fallback}
+    logger.info('%s with %s preconditioner: %d iterations, setup %.3fs, solve %.3fs, residual %.2e'%(
+            method,precond,iterations[0],t1-t0,t2-t1,residual))
+    if not residual<=tol:
+        raise Exception('The solution is not converged, residual %.2e, the structure may be unstable.'%residual)
     model.is_solved=True
     logger.info('Done!')
     model.d_=delta.reshape((model.node_count*6,1))
-    model.r_=model.K*model.d_
+    model.r_=matvec(model.K,model.d_,fmt)
     
 def solve_2nd(model):
     pass
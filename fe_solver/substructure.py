@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 20:11:35 2026
+
+@author: HZJ
+"""
+import time
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as spr
+import scipy.sparse.linalg as sl
+
+from fe_model.symmetric import as_full,matvec
+import logger
+
+SUPERELEMENT_CACHE_SIZE=256
+
+#condensed superelements, keyed by the hash of their interior matrices, the
+#least recently used ones are dropped past SUPERELEMENT_CACHE_SIZE
+_superelements=OrderedDict()
+_info={'hits':0,'misses':0}
+
+def superelement_cache_info():
+    """
+    return:
+        dict of hits, misses, size and max size of the superelement cache.
+    """
+    return {'hits':_info['hits'],'misses':_info['misses'],'size':len(_superelements),
+            'maxsize':SUPERELEMENT_CACHE_SIZE}
+
+def _cache_get(key):
+    res=_superelements.get(key)
+    if res is not None:
+        _superelements.move_to_end(key)
+    return res
+
+def _cache_put(key,res):
+    _superelements[key]=res
+    _superelements.move_to_end(key)
+    while len(_superelements)>SUPERELEMENT_CACHE_SIZE:
+        _superelements.popitem(last=False)
+
+def clear_superelement_cache():
+    _superelements.clear()
+    _info['hits']=_info['misses']=0
+
+def _key(K_II,K_IB):
+    """
+    Hash of the matrices, entries are rounded to 12 digits of the largest 
+    one, so that substructures differing by round-off of coordinates share
+    one key.
+    """
+    h=hashlib.sha1()
+    scale=max(np.abs(K_II.data).max() if K_II.nnz>0 else 0,1e-300)
+    for A in (K_II,K_IB):
+        h.update(np.array(A.shape).tobytes())
+        h.update(A.indptr.tobytes())
+        h.update(A.indices.tobytes())
+        h.update((np.round(A.data/scale*1e12)+0.).tobytes())
+    return h.hexdigest()
+
+class Factor(object):
+    """
+    LU factors of K_II as plain arrays, so that they can be sent back from
+    worker processes and used again for recovery.
+    """
+    def __init__(self,lu):
+        self.L=lu.L.tocsr()
+        self.U=lu.U.tocsr()
+        self.perm_r=lu.perm_r
+        self.perm_c=lu.perm_c
+
+    def solve(self,b):
+        """
+        Pr.K_II.Pc=L.U, so K_II^-1.b=Pc.U^-1.L^-1.Pr.b
+        """
+        y=np.empty_like(b,dtype=float)
+        y[self.perm_r]=b
+        y=sl.spsolve_triangular(self.L,y,lower=True,unit_diagonal=True)
+        y=sl.spsolve_triangular(self.U,y,lower=False)
+        return y[self.perm_c]
+
+def _condense(args):
+    """
+    Schur complement of a substructure, run in worker processes.
+
+    params:
+        args: K_II,K_IB in csr.
+    return:
+        X,S,factor: X=K_II^-1.K_IB, S=-K_BI.X, contribution to the interface
+            matrix, and the Factor of K_II.
+    """
+    K_II,K_IB=args
+    lu=sl.splu(spr.csc_matrix(K_II))
+    X=lu.solve(K_IB.toarray())
+    S=-K_IB.T.dot(X)
+    return X,S,Factor(lu)
+
+class Substructure(object):
+    def __init__(self,interior,boundary,key):
+        """
+        params:
+            interior: array of global interior DOFs.
+            boundary: array of global DOFs on the interface the interior
+                couples with.
+            key: str, key of the superelement.
+        """
+        self.interior=interior
+        self.boundary=boundary
+        self.key=key
+
+class Substructuring(object):
+    """
+    Static solve by substructuring. Interior DOFs of substructures are
+    condensed onto the interface by Schur complements in parallel, identical
+    substructures share one condensed superelement, and only the interface
+    system is solved globally. Interior displacements are recovered on
+    demand.
+    """
+    def __init__(self,model,interiors):
+        """
+        params:
+            model: FEModel, assembled with boundary conditions.
+            interiors: list of arrays of node hids, interior nodes of
+                substructures. Nodes not in any of them form the interface.
+        """
+        self.model=model
+        self.K_=spr.csr_matrix(as_full(model.K_,model.matrix_format))
+        n=self.K_.shape[0]
+        label=np.full(n,-1)
+        self.substructures=[]
+        for s,nodes in enumerate(interiors):
+            dofs=(np.asarray(nodes,dtype=int)[:,None]*6+np.arange(6)).reshape(-1)
+            if (label[dofs]>=0).any():
+                raise Exception('Substructure %d overlaps with others.'%s)
+            label[dofs]=s
+        self.interface=np.nonzero(label<0)[0]
+        #interiors of different substructures must not be coupled
+        K=self.K_.tocoo()
+        li,lj=label[K.row],label[K.col]
+        if ((li>=0)&(lj>=0)&(li!=lj)&(K.data!=0)).any():
+            raise Exception('Interiors of substructures are coupled, the partition is invalid.')
+        for s in range(len(interiors)):
+            interior=np.nonzero(label==s)[0]
+            K_IB=self.K_[interior][:,self.interface]
+            boundary=self.interface[np.unique(K_IB.indices)]
+            K_IB=self.K_[interior][:,boundary]
+            K_II=self.K_[interior][:,interior]
+            K_II.sort_indices()
+            K_IB.sort_indices()
+            self.substructures.append(Substructure(interior,boundary,_key(K_II,K_IB)))
+        #superelements in use, they stay valid when the cache drops them
+        self.__superelements={}
+        self.__d_B=None
+
+    def _blocks(self,sub):
+        K_I=self.K_[sub.interior]
+        return K_I[:,sub.interior],K_I[:,sub.boundary]
+
+    def condense(self,workers=None):
+        """
+        Condense substructures which are not in the cache yet.
+
+        params:
+            workers: number of worker processes, None for the default of
+                the process pool, 1 to condense in this process.
+        """
+        todo={}
+        for sub in self.substructures:
+            if sub.key in self.__superelements or sub.key in todo:
+                _info['hits']+=1
+                continue
+            res=_cache_get(sub.key)
+            if res is not None:
+                _info['hits']+=1
+                self.__superelements[sub.key]=res
+                continue
+            _info['misses']+=1
+            todo[sub.key]=self._blocks(sub)
+        if todo=={}:
+            return
+        keys=list(todo.keys())
+        if workers==1 or len(keys)==1:
+            results=map(_condense,[todo[k] for k in keys])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results=list(pool.map(_condense,[todo[k] for k in keys]))
+        for k,res in zip(keys,results):
+            self.__superelements[k]=res
+            _cache_put(k,res)
+
+    def solve(self,f):
+        """
+        Solve the interface system.
+
+        params:
+            f: global load vector.
+        return:
+            displacements of the interface DOFs.
+        """
+        f=np.asarray(f,dtype=float).reshape(-1)
+        n=self.K_.shape[0]
+        pos=np.full(n,-1)
+        pos[self.interface]=np.arange(self.interface.shape[0])
+        S=self.K_[self.interface][:,self.interface].tocoo()
+        data,row,col=[S.data],[S.row],[S.col]
+        f_B=f[self.interface].copy()
+        for sub in self.substructures:
+            X,S_s,factor=self.__superelements[sub.key]
+            b=pos[sub.boundary]
+            m=b.shape[0]
+            data.append(S_s.reshape(-1))
+            row.append(np.repeat(b,m))
+            col.append(np.tile(b,m))
+            f_B[b]-=X.T.dot(f[sub.interior])
+        S=spr.coo_matrix((np.concatenate(data),(np.concatenate(row),np.concatenate(col))),
+                         shape=(self.interface.shape[0],)*2).tocsc()
+        self.__f=f
+        self.__d_B=sl.spsolve(S,f_B)
+        return self.__d_B
+
+    def recover(self,subs=None):
+        """
+        Recover interior displacements.
+
+        params:
+            subs: list of indices of substructures, None for all.
+        return:
+            global displacement vector, NaN on interiors not recovered.
+        """
+        if self.__d_B is None:
+            raise Exception('The interface system has to be solved first.')
+        d=np.full(self.K_.shape[0],np.nan)
+        d[self.interface]=self.__d_B
+        subs=range(len(self.substructures)) if subs is None else subs
+        for s in subs:
+            sub=self.substructures[s]
+            X,S_s,factor=self.__superelements[sub.key]
+            d_B=d[sub.boundary]
+            f_I=self.__f[sub.interior]
+            d_I=-X.dot(d_B)
+            if f_I.any():
+                d_I+=factor.solve(f_I)
+            d[sub.interior]=d_I
+        return d
+
+def solve_substructured(model,interiors,workers=None,tol=1e-10):
+    """
+    Solve static linear problem by substructuring, see Substructuring.
+    The relative residual of the recovered displacements is kept in 
+    model.solve_info.
+
+    params:
+        model: FEModel.
+        interiors: list of arrays of node hids, interior nodes of
+            substructures.
+        workers: number of worker processes.
+        tol: relative tolerance of residual.
+    return:
+        Substructuring, to recover interiors again for other loads.
+    """
+    logger.info('solving problem with %d DOFs by %d substructures...'%(model.DOF,len(interiors)))
+    t0=time.perf_counter()
+    sub=Substructuring(model,interiors)
+    info0=superelement_cache_info()
+    sub.condense(workers)
+    t1=time.perf_counter()
+    f_=model.f_.toarray().reshape(-1)
+    sub.solve(f_)
+    d=sub.recover()
+    t2=time.perf_counter()
+    residual=np.linalg.norm(f_-sub.K_.dot(d))/max(np.linalg.norm(f_),1e-300)
+    if not residual<=tol:
+        logger.info('Warning: residual %.2e of substructuring is over %.2e'%(residual,tol))
+    info=superelement_cache_info()
+    model.solve_info={'method':'substructure','precond':None,'iterations':0,
+                      'setup_time':t1-t0,'solve_time':t2-t1,'converged':residual<=tol,
+                      'residual':residual,'interface_dofs':sub.interface.shape[0],
+                      'superelements':info['misses']-info0['misses'],
+                      'reused':info['hits']-info0['hits']}
+    logger.info('%d substructures, %d condensed, %d reused, %d interface DOFs'%(
+            len(interiors),model.solve_info['superelements'],model.solve_info['reused'],sub.interface.shape[0]))
+    model.is_solved=True
+    model.d_=d.reshape((-1,1))
+    model.r_=matvec(model.K,model.d_,model.matrix_format)
+    return sub
@@ -7,9 +7,11 @@ Created on Thu Mar 29 10:09:59 2018
 
 import uuid
 
-from sqlalchemy.sql import and_
+import numpy as np
 
-from .orm import Config, AreaSection, Point, Area
+from .orm import AreaSection, Point, Area
+from .point import _point_at,_insert_points,_uuids
+from .db import _id_of
 import logger
 
 def add_area(self,pt0_coor,pt1_coor,pt2_coor,pt3_coor,section,name=None):
@@ -31,66 +33,32 @@ def add_area(self,pt0_coor,pt1_coor,pt2_coor,pt3_coor,section,name=None):
         if self.session.query(AreaSection).filter_by(name=section).first() is None:
             raise Exception("Area section doesn't exits!")
         area=Area()
-        scale=self.scale()
-        tol=self.session.query(Config).first().tolerance
+        pt0_coor,pt1_coor,pt2_coor=self.to_si([pt0_coor,pt1_coor,pt2_coor],L=1).tolist()
+        if pt3_coor is not None:
+            pt3_coor=self.to_si(pt3_coor,L=1).tolist()
         
-        pt0=self.session.query(Point).filter(and_(
-                    (Point.x-pt0_coor[0]*scale['L'])<tol,(pt0_coor[0]*scale['L']-Point.x)<tol,
-                     (Point.y-pt0_coor[1]*scale['L'])<tol,(pt0_coor[1]*scale['L']-Point.y)<tol,
-                      (Point.z-pt0_coor[2]*scale['L'])<tol,(pt0_coor[2]*scale['L']-Point.z)<tol)).first()
-        if pt0==None:
-            pt0_name=self._add_point(pt0_coor[0],pt0_coor[1],pt0_coor[2])
-        else:
-            pt0_name=pt0.name
+        pt0_id=_point_at(self,*pt0_coor)
+        if pt0_id is None:
+            pt0_id=_id_of(self,Point,self.add_point(*pt0_coor))
             
-        pt1=self.session.query(Point).filter(and_(
-                    (Point.x-pt1_coor[0]*scale['L'])<tol,(pt1_coor[0]*scale['L']-Point.x)<tol,
-                     (Point.y-pt1_coor[1]*scale['L'])<tol,(pt1_coor[1]*scale['L']-Point.y)<tol,
-                      (Point.z-pt1_coor[2]*scale['L'])<tol,(pt1_coor[2]*scale['L']-Point.z)<tol)).first()
-        if pt1==None:
-            pt1_name=self._add_point(pt1_coor[0],pt1_coor[1],pt1_coor[2])
-        else:
-            pt1_name=pt1.name
+        pt1_id=_point_at(self,*pt1_coor)
+        if pt1_id is None:
+            pt1_id=_id_of(self,Point,self.add_point(*pt1_coor))
             
-        pt2=self.session.query(Point).filter(and_(
-                    (Point.x-pt2_coor[0]*scale['L'])<tol,(pt2_coor[0]*scale['L']-Point.x)<tol,
-                     (Point.y-pt2_coor[1]*scale['L'])<tol,(pt2_coor[1]*scale['L']-Point.y)<tol,
-                      (Point.z-pt2_coor[2]*scale['L'])<tol,(pt2_coor[2]*scale['L']-Point.z)<tol)).first()
-        if pt2==None:
-            pt2_name=self._add_point(pt2_coor[0],pt2_coor[1],pt2_coor[2])
-        else:
-            pt2_name=pt2.name
+        pt2_id=_point_at(self,*pt2_coor)
+        if pt2_id is None:
+            pt2_id=_id_of(self,Point,self.add_point(*pt2_coor))
             
         if pt3_coor is not None: 
-            pt3=self.session.query(Point).filter(and_(
-                    (Point.x-pt2_coor[0]*scale['L'])<tol,(pt2_coor[0]*scale['L']-Point.x)<tol,
-                     (Point.y-pt2_coor[1]*scale['L'])<tol,(pt2_coor[1]*scale['L']-Point.y)<tol,
-                      (Point.z-pt2_coor[2]*scale['L'])<tol,(pt2_coor[2]*scale['L']-Point.z)<tol)).first()
-
-            pt3=self.session.query(Point).filter(and_(
-                        (Point.x-pt3_coor[0]*scale['L'])<tol,(pt3_coor[0]*scale['L']-Point.x)<tol,
-                         (Point.y-pt3_coor[1]*scale['L'])<tol,(pt3_coor[1]*scale['L']-Point.y)<tol,
-                          (Point.z-pt3_coor[2]*scale['L'])<tol,(pt3_coor[2]*scale['L']-Point.z)<tol)).first()
-            if pt3==None:
-                pt3_name=self._add_point(pt0_coor[0],pt0_coor[1],pt0_coor[2])
-            else:
-                pt3_name=pt0.name
+            pt3_id=_point_at(self,*pt3_coor)
+            if pt3_id is None:
+                pt3_id=_id_of(self,Point,self.add_point(*pt3_coor))
         
-        if pt3_coor is not None:
-            name_dict={pt0_name:'0',pt1_name:'1',pt2_name:'2',pt3_name:'3'}
-            sorted_key=sorted(list(name_dict))
-            area.pt0_name=name_dict[sorted_key[0]]
-            area.pt1_name=name_dict[sorted_key[1]]
-            area.pt2_name=name_dict[sorted_key[2]]
-            area.pt3_name=name_dict[sorted_key[3]]
-            area.order=str.join(sorted_key)
-        else:
-            name_dict={pt0_name:'0',pt1_name:'1',pt2_name:'2'}
-            sorted_key=sorted(list(name_dict))
-            area.pt0_name=name_dict[sorted_key[0]]
-            area.pt1_name=name_dict[sorted_key[1]]
-            area.pt2_name=name_dict[sorted_key[2]]
-            area.order=str.join(sorted_key)
+        #corners are kept in the input order, which is the order of meshing
+        area.pt0_id=pt0_id
+        area.pt1_id=pt1_id
+        area.pt2_id=pt2_id
+        area.pt3_id=pt3_id if pt3_coor is not None else None
             
         area.section_name=section
         area.uuid=str(uuid.uuid1())
@@ -105,67 +73,60 @@ def add_area(self,pt0_coor,pt1_coor,pt2_coor,pt3_coor,section,name=None):
         self.session.rollback()
         return False
         
-def add_area_batch(self,pt_coors,section):
+def add_areas(self,coors,conn,section):
     """
-    Add batch of frame objects to model..
-    param:
-        pt_coors: list of float tuples as ((pt0.x,pt0.y,pt0.z),(pt1.x,pt1.y,pt1.z),(pt2.x,pt2.y,pt2.z),(pt3.x,pt3.y,pt3.z) or None)
+    Add areas in batch from arrays. Points are deduplicated in memory, 
+    points and areas are inserted with executemany in one transaction.
+    
+    params:
+        coors: nx3 array of point coordinates.
+        conn: mx4 array of int, indices of the corners of areas in coors, 
+            -1 as the 4th corner of triangles. mx3 for triangles only.
+        section: str, name of area section.
     return:
-        list of str, the new frame's names.
+        status of success, and list of str, the new areas' names if successful.
     """
     try:
-        assert(len(pt_coors[0][0])==len(pt_coors[0][1]))
         if self.session.query(AreaSection).filter_by(name=section).first() is None:
             raise Exception("Area section doesn't exits!")
-        names=[]
-        area_ends=[]
-        scale=self.scale()
-        for pt0,pt1,pt2,pt3 in pt_coors:
-            pt0_name=self._add_point(pt0[0]*scale['L'],pt0[1]*scale['L'],pt0[2]*scale['L'])
-            pt1_name=self._add_point(pt1[0]*scale['L'],pt1[1]*scale['L'],pt1[2]*scale['L'])
-            pt2_name=self._add_point(pt2[0]*scale['L'],pt2[1]*scale['L'],pt2[2]*scale['L'])
-            if pt3 is not None:
-                pt3_name=self._add_point(pt2[0]*scale['L'],pt2[1]*scale['L'],pt2[2]*scale['L'])
-                area_ends.append((pt0_name,pt1_name,pt2_name,pt3_name))
-            else:
-                area_ends.append((pt0_name,pt1_name,pt2_name,None))
-        tol=self.session.query(Config).first().tolerance
-        pts=self.session.query(Point).order_by(Point.x,Point.y,Point.z).all()
-        pt_map=dict([(pt.name,pt.name) for pt in pts])
-        pts_to_rmv=[]
-        for pti,ptj in zip(pts[:-1],pts[1:]):
-            if (ptj.x-pti.x)**2+(ptj.y-pti.y)**2+(ptj.z-pti.z)**2<tol**2:
-                pt_map[ptj.name]=pt_map[pti.name]
-                pts_to_rmv.append(ptj)
-        for (pt0_name,pt1_name,pt2_name,pt3_name) in area_ends:
-            area=Area()
-            if pt3_name is not None:
-                name_dict={pt0_name:'0',pt1_name:'1',pt2_name:'2',pt3_name:'3'}
-                sorted_key=sorted(list(name_dict))
-                area.pt0_name=name_dict[sorted_key[0]]
-                area.pt1_name=name_dict[sorted_key[1]]
-                area.pt2_name=name_dict[sorted_key[2]]
-                area.pt3_name=name_dict[sorted_key[3]]
-                area.order=sorted_key[0]+sorted_key[1]+sorted_key[2]+sorted_key[3]
-            else:
-                name_dict={pt0_name:'0',pt1_name:'1',pt2_name:'2'}
-                sorted_key=sorted(list(name_dict))
-                area.pt0_name=name_dict[sorted_key[0]]
-                area.pt1_name=name_dict[sorted_key[1]]
-                area.pt2_name=name_dict[sorted_key[2]]
-                area.order=sorted_key[0]+sorted_key[1]+sorted_key[2]
-            area.section_name=section
-            area.uuid=str(uuid.uuid1())
-            area.name=area.uuid
-            names.append(area.name)
-        for pt in pts_to_rmv:
-            self.session.delete(pt)
+        coors=self.to_si(coors,L=1).reshape((-1,3))
+        conn=np.asarray(conn,dtype=int)
+        if conn.shape[1]==3:
+            conn=np.hstack([conn,np.full((conn.shape[0],1),-1)])
+        pts=_insert_points(self,coors)
+        corners=pts[conn].astype(object)
+        corners[conn[:,3]<0,3]=None
+        names=_uuids(conn.shape[0])
+        if names!=[]:
+            #corners are kept in the input order, which is the order of meshing
+            self.session.execute(Area.__table__.insert(),
+                [{'name':name,'uuid':name,'section_name':section,
+                  'pt0_id':pt0,'pt1_id':pt1,'pt2_id':pt2,'pt3_id':pt3} 
+                 for name,(pt0,pt1,pt2,pt3) in zip(names,corners.tolist())])
         self.session.commit()
-        return True, names
+        return True,names
     except Exception as e:
         logger.info(str(e))
         self.session.rollback()
         return False
+    
+def add_area_batch(self,pt_coors,section):
+    """
+    Add batch of area objects to model..
+    param:
+        pt_coors: list of float tuples as ((pt0.x,pt0.y,pt0.z),(pt1.x,pt1.y,pt1.z),(pt2.x,pt2.y,pt2.z),(pt3.x,pt3.y,pt3.z) or None)
+    return:
+        status of success, and list of str, the new areas' names if successful.
+    """
+    coors=[]
+    conn=[]
+    for pts in pt_coors:
+        conn.append([-1]*4)
+        for i,pt in enumerate(pts):
+            if pt is not None:
+                conn[-1][i]=len(coors)
+                coors.append(pt)
+    return self.add_areas(np.array(coors,dtype=float),np.array(conn,dtype=int),section)
         
 def get_area_names(self):
     """
@@ -4,15 +4,161 @@ Created on Thu Mar 29 13:38:23 2018
 
 @author: Dell
 """
-import os,shutil
+import os
+import sqlite3
 from datetime import datetime
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine,event
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable,CreateIndex
 import sqlalchemy.orm as o
 
 from .orm import Base,Config
 import logger
 
+#R*Tree index of points, kept in step with the points table by triggers
+SPATIAL_INDEX=[
+    'CREATE VIRTUAL TABLE IF NOT EXISTS point_index USING rtree(id,min_x,max_x,min_y,max_y,min_z,max_z)',
+    '''CREATE TRIGGER IF NOT EXISTS point_index_insert AFTER INSERT ON points BEGIN
+        INSERT INTO point_index VALUES (new.rowid,new.x,new.x,new.y,new.y,new.z,new.z); END''',
+    '''CREATE TRIGGER IF NOT EXISTS point_index_update AFTER UPDATE OF x,y,z ON points BEGIN
+        UPDATE point_index SET min_x=new.x,max_x=new.x,min_y=new.y,max_y=new.y,min_z=new.z,max_z=new.z 
+        WHERE id=new.rowid; END''',
+    '''CREATE TRIGGER IF NOT EXISTS point_index_delete AFTER DELETE ON points BEGIN
+        DELETE FROM point_index WHERE id=old.rowid; END''',
+    ]
+
+def _spatial_index(conn):
+    """
+    Create the spatial index of points if it doesn't exist and rebuild it.
+    
+    params:
+        conn: sqlite3.Connection.
+    """
+    for sql in SPATIAL_INDEX:
+        conn.execute(sql)
+    conn.execute('DELETE FROM point_index')
+    conn.execute('INSERT INTO point_index SELECT rowid,x,x,y,y,z,z FROM points')
+    conn.commit()
+
+#tables whose changes are logged for incremental remeshing, with the column
+#identifying the changed object. Loads are read again for every case, so 
+#they are not logged.
+TRACKED_TABLES={'points':'id','frames':'id','areas':'id',
+                'frame_sections':'name','area_sections':'name','materials':'name',
+                'isotropic_elastics':'material_name','point_restraints':'point_id'}
+
+def _change_log(conn):
+    """
+    Create the change log of the working copy. It is a temporary table 
+    filled by temporary triggers, so it is never written to the file, and 
+    changes rolled back are taken out of it with the transaction.
+    
+    params:
+        conn: sqlite3.Connection.
+    """
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS changes (tbl VARCHAR(32),item)')
+    for table,key in TRACKED_TABLES.items():
+        conn.execute("""CREATE TEMP TRIGGER IF NOT EXISTS {0}_insert_log AFTER INSERT ON main.{0} BEGIN
+            INSERT INTO changes VALUES ('{0}',new.{1}); END""".format(table,key))
+        conn.execute("""CREATE TEMP TRIGGER IF NOT EXISTS {0}_update_log AFTER UPDATE ON main.{0} BEGIN
+            INSERT INTO changes VALUES ('{0}',old.{1}); 
+            INSERT INTO changes SELECT '{0}',new.{1} WHERE new.{1}<>old.{1}; END""".format(table,key))
+        conn.execute("""CREATE TEMP TRIGGER IF NOT EXISTS {0}_delete_log AFTER DELETE ON main.{0} BEGIN
+            INSERT INTO changes VALUES ('{0}',old.{1}); END""".format(table,key))
+    conn.commit()
+
+def _id_of(self,cls,name):
+    """
+    params:
+        cls: Point, Frame or Area.
+        name: str, name of the object.
+    return:
+        int, id of the object, None if it doesn't exist.
+    """
+    res=self.session.query(cls.id).filter(cls.name==name).first()
+    return None if res is None else res[0]
+
+#keys per IN clause, below the variable limit of old sqlite builds
+CHUNK=500
+
+def _chunks(keys):
+    keys=sorted(keys)
+    for i in range(0,len(keys),CHUNK):
+        yield keys[i:i+CHUNK]
+
+def _ids_of(self,cls,names):
+    """
+    params:
+        cls: Point, Frame or Area.
+        names: iterable of str, names of objects.
+    return:
+        dict of name and id of the objects which exist.
+    """
+    ids={}
+    for part in _chunks(names):
+        ids.update(self.session.query(cls.name,cls.id).filter(cls.name.in_(part)).all())
+    return ids
+
+def _reference_source(column,old):
+    """
+    Expression of the old table for a reference by id, which was a 
+    reference by name, e.g. pt0_id from pt0_name.
+    
+    return:
+        str, None if the column is not such a reference.
+    """
+    fks=list(column.foreign_keys)
+    name=column.name[:-3]+'_name'
+    if fks==[] or fks[0].column.name!='id' or not column.name.endswith('_id') or name not in old:
+        return None
+    return '(SELECT id FROM "{0}" WHERE name="{1}_old"."{2}")'.format(fks[0].column.table.name,column.table.name,name)
+
+def _migrate(conn):
+    """
+    Bring a database of an older schema to the current one. Tables missing
+    columns are rebuilt, their rows keep the rowids as the surrogate ids, 
+    and references by name are turned to references by id. Tables are 
+    rebuilt in order of dependency, so the referred ids exist. Missing 
+    tables and indexes are created.
+    
+    params:
+        conn: sqlite3.Connection.
+    """
+    dialect=sqlite.dialect()
+    existing=[r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    #references to a renamed table are left alone
+    conn.execute('PRAGMA legacy_alter_table=ON')
+    for table in Base.metadata.sorted_tables:
+        columns=[c.name for c in table.columns]
+        if table.name in existing:
+            old=[r[1] for r in conn.execute('PRAGMA table_info("%s")'%table.name)]
+            if not set(columns)<=set(old):
+                logger.info('migrating table %s'%table.name)
+                conn.execute('ALTER TABLE "{0}" RENAME TO "{0}_old"'.format(table.name))
+                conn.execute(str(CreateTable(table).compile(dialect=dialect)))
+                dst=[c for c in columns if c in old]
+                src=['"%s"'%c for c in dst]
+                if 'id' in columns and 'id' not in old:
+                    dst.append('id')
+                    src.append('rowid')
+                for c in table.columns:
+                    ref=_reference_source(c,old)
+                    if c.name not in old and ref is not None:
+                        dst.append(c.name)
+                        src.append(ref)
+                conn.execute('INSERT INTO "{0}" ({1}) SELECT {2} FROM "{0}_old" ORDER BY rowid'.format(
+                        table.name,','.join('"%s"'%c for c in dst),','.join(src)))
+                conn.execute('DROP TABLE "%s_old"'%table.name)
+        else:
+            conn.execute(str(CreateTable(table).compile(dialect=dialect)))
+        for index in table.indexes:
+            sql=str(CreateIndex(index).compile(dialect=dialect))
+            conn.execute(sql.replace('CREATE INDEX','CREATE INDEX IF NOT EXISTS',1))
+    conn.execute('PRAGMA legacy_alter_table=OFF')
+    conn.commit()
+
 def create(self,database):
     """
     params:
@@ -22,8 +168,14 @@ def create(self,database):
     #initialize
     engine=create_engine('sqlite:///'+database)
     Base.metadata.create_all(engine)
+    conn=engine.raw_connection()
+    try:
+        _spatial_index(conn)
+    finally:
+        conn.close()
     Session=o.sessionmaker(bind=engine)
     self.session=Session()
+    self.clear_config_cache()
     
     #configurations
     config=Config()
@@ -46,28 +198,78 @@ def create(self,database):
     self.session.commit()
     self.session.close()
     
+#pages copied per step of the backup API
+BACKUP_PAGES=4096
+
+def _tune(conn,storage=False):
+    """
+    Apply pragmas to a sqlite3 connection.
+    
+    params:
+        conn: sqlite3.Connection.
+        storage: bool, True for the file on disk, False for the working copy.
+    """
+    if storage:
+        #a .mdo file stays a single file, no -wal or -shm next to it
+        conn.execute('PRAGMA journal_mode=DELETE')
+    else:
+        conn.execute('PRAGMA cache_size=-65536')
+        conn.execute('PRAGMA temp_store=MEMORY')
+    
 def open(self,database):
     """
+    The database is loaded to an in-memory working copy through the sqlite3
+    backup API, the file is only touched again by save.
+    
     params:
         database: str. Database to be opered. The path should be included
     """
     assert(database[-4:]=='.mdo')
     if not os.path.exists(database):
-        self._create(database)
-    operate_db=database[:-4]+'.op'
-    shutil.copy(database,operate_db)
-#        engine=create_engine('sqlite:///:memory:')
-    engine=create_engine('sqlite:///'+operate_db) #should be run in memory in the future
+        self.create(database)
+    memory=sqlite3.connect(':memory:',check_same_thread=False)
+    storage=sqlite3.connect(database)
+    try:
+        storage.backup(memory,pages=BACKUP_PAGES)
+    finally:
+        storage.close()
+    _tune(memory)
+    _migrate(memory)
+    _spatial_index(memory)
+    _change_log(memory)
+    engine=create_engine('sqlite://',creator=lambda:memory,poolclass=StaticPool)
     Session=o.sessionmaker(bind=engine)
     self.session=Session()
-    self.__operate_db=operate_db
+    #a rollback may revert the configuration
+    self.clear_config_cache()
+    event.listen(self.session,'after_rollback',lambda session:self.clear_config_cache())
+    self.__memory_db=memory
     self.__storage_db=database
     
 def save(self):
+    """
+    Write the working copy back to the file through the sqlite3 backup API,
+    pages are copied step by step.
+    """
     self.session.commit()
-    shutil.copy(self.__operate_db,self.__storage_db)
+    storage=sqlite3.connect(self.__storage_db)
+    try:
+        _tune(storage,storage=True)
+        self.__memory_db.backup(storage,pages=BACKUP_PAGES)
+    finally:
+        storage.close()
     
 def close(self):
     self.session.close()
-    if os.path.exists(self.__operate_db):
-        os.remove(self.__operate_db)
\ No newline at end of file
+    self.__memory_db.close()
+    
+def snapshot_path(self):
+    """
+    return:
+        str, path of the snapshot of the FE model next to the database, None
+        if the model is not opened from a file.
+    """
+    database=getattr(self,'__storage_db',None)
+    if database is None:
+        return None
+    return database[:-4]+'.fe.npz'
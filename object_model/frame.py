@@ -7,9 +7,11 @@ Created on Thu Mar 29 10:09:44 2018
 
 import uuid
 
-from sqlalchemy.sql import and_
+import numpy as np
 
-from .orm import Config,Point,Frame,FrameSection,FrameLoadDistributed,FrameLoadConcentrated,FrameLoadTemperature,FrameLoadStrain
+from .orm import Point,Frame,FrameSection,FrameLoadDistributed,FrameLoadConcentrated,FrameLoadTemperature,FrameLoadStrain
+from .point import _point_at,_insert_points,_uuids
+from .db import _id_of
 import logger
 
 def add_frame(self,pt0_coor,pt1_coor,section,name=None):
@@ -29,35 +31,26 @@ def add_frame(self,pt0_coor,pt1_coor,section,name=None):
     if self.session.query(FrameSection).filter_by(name=section).first() is None:
             raise Exception("Frame section doesn't exits!")
     frm=Frame()
-    scale=self.scale()
-    tol=self.session.query(Config).first().tolerance
-    pt0=self.session.query(Point).filter(and_(
-                (Point.x-pt0_coor[0]*scale['L'])<tol,(pt0_coor[0]*scale['L']-Point.x)<tol,
-                 (Point.y-pt0_coor[1]*scale['L'])<tol,(pt0_coor[1]*scale['L']-Point.y)<tol,
-                  (Point.z-pt0_coor[2]*scale['L'])<tol,(pt0_coor[2]*scale['L']-Point.z)<tol)).first()
-    if pt0==None:
-        pt0_name=self.add_point(pt0_coor[0]*scale['L'],pt0_coor[1]*scale['L'],pt0_coor[2]*scale['L'])
-    else:
-        pt0_name=pt0.name
+    pt0_coor=self.to_si(pt0_coor,L=1).tolist()
+    pt1_coor=self.to_si(pt1_coor,L=1).tolist()
+    pt0_id=_point_at(self,*pt0_coor)
+    if pt0_id is None:
+        pt0_id=_id_of(self,Point,self.add_point(*pt0_coor))
         
-    pt1=self.session.query(Point).filter(and_(
-                (Point.x-pt1_coor[0])<tol,(pt1_coor[0]-Point.x)<tol,
-                 (Point.y-pt1_coor[1])<tol,(pt1_coor[1]-Point.y)<tol,
-                  (Point.z-pt1_coor[2])<tol,(pt1_coor[2]-Point.z)<tol)).first()
-    if pt1==None:
-        pt1_name=self.add_point(pt1_coor[0],pt1_coor[1],pt1_coor[2])
-    else:
-        pt1_name=pt1.name
+    pt1_id=_point_at(self,*pt1_coor)
+    if pt1_id is None:
+        pt1_id=_id_of(self,Point,self.add_point(*pt1_coor))
     
-    if pt0_name<pt1_name:
+    #ends of frames are kept in order of ids
+    if pt0_id<pt1_id:
         order='01'
-        frm.pt0_name=pt0_name
-        frm.pt1_name=pt1_name
+        frm.pt0_id=pt0_id
+        frm.pt1_id=pt1_id
         frm.order=order
-    elif pt0_name>pt1_name:
+    elif pt0_id>pt1_id:
         order='10'
-        frm.pt0_name=pt1_name
-        frm.pt1_name=pt0_name
+        frm.pt0_id=pt1_id
+        frm.pt1_id=pt0_id
         frm.order=order
     else:
         raise Exception('Two points should not be the same!')
@@ -71,58 +64,51 @@ def add_frame(self,pt0_coor,pt1_coor,section,name=None):
     self.session.add(frm)
     return frm.name
     
-def add_frame_batch(self,pt_coors,section):
+def add_frames(self,coors,conn,section):
     """
-    Add batch of frame objects to model..
-    param:
-        pt_coors: list of float tuples as ((pt0.x,pt0.y,pt0.z),(pt1.x,pt1.y,pt1.z))
+    Add frames in batch from arrays. Points are deduplicated in memory, 
+    points and frames are inserted with executemany in one transaction.
+    
+    params:
+        coors: nx3 array of point coordinates.
+        conn: mx2 array of int, indices of the end points of frames in coors.
+        section: str, name of frame section.
     return:
-        status of success, and list of str, the new frame's names if successful.
+        status of success, and list of str, the new frames' names if successful.
+        Frames whose ends are coincident are skipped.
     """
     try:
-        assert(len(pt_coors[0][0])==len(pt_coors[0][1]))
         if self.session.query(FrameSection).filter_by(name=section).first() is None:
             raise Exception("Frame section doesn't exits!")
-        names=[]
-        frm_ends=[]
-        scale=self.scale()
-        for pt0,pt1 in pt_coors:
-            pt0_name=self.add_point(pt0[0]*scale['L'],pt0[1]*scale['L'],pt0[2]*scale['L'])
-            pt1_name=self.add_point(pt1[0]*scale['L'],pt1[1]*scale['L'],pt1[2]*scale['L'])
-            frm_ends.append((pt0_name,pt1_name))
-        tol=self.session.query(Config).first().tolerance
-        pts=self.session.query(Point).order_by(Point.x,Point.y,Point.z).all()
-        pt_map=dict([(pt.name,pt.name) for pt in pts])
-        pts_to_rmv=[]
-        for pti,ptj in zip(pts[:-1],pts[1:]):
-            if (ptj.x-pti.x)**2+(ptj.y-pti.y)**2+(ptj.z-pti.z)**2<tol**2:
-                pt_map[ptj.name]=pt_map[pti.name]
-                pts_to_rmv.append(ptj)
-        for (pt0_name,pt1_name) in frm_ends:
-            frm=Frame()
-            if pt_map[pt0_name]<pt_map[pt1_name]:
-                frm.pt0_name=pt_map[pt0_name]
-                frm.pt1_name=pt_map[pt1_name]
-                frm.order='01'
-            elif pt_map[pt0_name]>pt_map[pt1_name]:
-                frm.pt0_name=pt_map[pt1_name]
-                frm.pt1_name=pt_map[pt0_name]
-                frm.order='10'
-            else:
-                continue
-            frm.section_name=section
-            frm.uuid=str(uuid.uuid1())
-            frm.name=frm.uuid
-            names.append(frm.name)
-            self.session.add(frm)
-        for pt in pts_to_rmv:
-            self.session.delete(pt)
+        coors=self.to_si(coors,L=1).reshape((-1,3))
+        conn=np.asarray(conn,dtype=int).reshape((-1,2))
+        ends=_insert_points(self,coors)[conn]
+        ends=ends[ends[:,0]!=ends[:,1]]
+        #ends of frames are kept in order of ids
+        order=np.where(ends[:,0]<ends[:,1],'01','10')
+        ends.sort(axis=1)
+        names=_uuids(ends.shape[0])
+        if names!=[]:
+            self.session.execute(Frame.__table__.insert(),
+                [{'name':name,'uuid':name,'section_name':section,'pt0_id':pt0,'pt1_id':pt1,'order':o} 
+                 for name,(pt0,pt1),o in zip(names,ends.tolist(),order.tolist())])
         self.session.commit()
         return True,names
     except Exception as e:
         logger.info(str(e))
         self.session.rollback()
         return False
+    
+def add_frame_batch(self,pt_coors,section):
+    """
+    Add batch of frame objects to model..
+    param:
+        pt_coors: list of float tuples as ((pt0.x,pt0.y,pt0.z),(pt1.x,pt1.y,pt1.z))
+    return:
+        status of success, and list of str, the new frame's names if successful.
+    """
+    coors=np.asarray(pt_coors,dtype=float).reshape((-1,3))
+    return self.add_frames(coors,np.arange(coors.shape[0]).reshape((-1,2)),section)
 
 def set_frame_section(self,frame,section):
     """
@@ -161,11 +147,11 @@ def set_frame_load_distributed(self,frame,loadcase,load):
         frm=self.session.query(Frame).filter_by(name=frame).first()
         if frm is None:
             raise Exception("Frame doesn't exists.")
-        ld=self.session.query(FrameLoadDistributed).filter_by(frame_name=frame,loadcase_name=loadcase).first()
+        ld=self.session.query(FrameLoadDistributed).filter_by(frame_id=frm.id,loadcase_name=loadcase).first()
         if ld is None:
             ld=FrameLoadDistributed()
         scale=self.scale()
-        ld.frame_name=frame
+        ld.frame_id=frm.id
         ld.loadcase_name=loadcase
         ld.p01=load[0]*scale['F']
         ld.p02=load[1]*scale['F']
@@ -200,11 +186,11 @@ def set_frame_load_concentrated(self,frame,loadcase,load,loc):
         frm=self.session.query(Frame).filter_by(name=frame).first()
         if frm is None:
             raise Exception("Frame doesn't exists.")
-        ld=self.session.query(FrameLoadConcentrated).filter_by(frame_name=frame,loadcase_name=loadcase).first()
+        ld=self.session.query(FrameLoadConcentrated).filter_by(frame_id=frm.id,loadcase_name=loadcase).first()
         if ld is None:
             ld=FrameLoadConcentrated()
         scale=self.scale()
-        ld.frame_name=frame
+        ld.frame_id=frm.id
         ld.loadcase_name=loadcase
         ld.p1=load[0]*scale['F']
         ld.p2=load[1]*scale['F']
@@ -234,10 +220,10 @@ def set_frame_load_strain(self,frame,loadcase,strain):
         frm=self.session.query(Frame).filter_by(name=frame).first()
         if frm is None:
             raise Exception("Frame doesn't exists.")
-        ld=self.session.query(FrameLoadStrain).filter_by(frame_name=frame,loadcase_name=loadcase).first()
+        ld=self.session.query(FrameLoadStrain).filter_by(frame_id=frm.id,loadcase_name=loadcase).first()
         if ld is None:
             ld=FrameLoadStrain()
-        ld.frame_name=frame
+        ld.frame_id=frm.id
         ld.loadcase_name=loadcase
         ld.strain=strain
         self.session.add(ld)
@@ -260,10 +246,10 @@ def set_frame_load_temperature(self,frame,loadcase,temperature):
         frm=self.session.query(Frame).filter_by(name=frame).first()
         if frm is None:
             raise Exception("Frame doesn't exists.")
-        ld=self.session.query(FrameLoadTemperature).filter_by(frame_name=frame,loadcase_name=loadcase).first()
+        ld=self.session.query(FrameLoadTemperature).filter_by(frame_id=frm.id,loadcase_name=loadcase).first()
         if ld is None:
             ld=FrameLoadTemperature()
-        ld.frame_name=frame
+        ld.frame_id=frm.id
         ld.loadcase_name=loadcase
         ld.T=temperature
         self.session.add(ld)
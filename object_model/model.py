@@ -8,15 +8,20 @@ Created on Mon Mar 12 19:52:26 2018
 
 from types import MethodType
 
+import numpy as np
+
 from .orm import Config,LoadCase,Point,Frame,Area,\
+Material,IsotropicElastic,FrameSection,AreaSection,\
 PointLoad,PointRestraint,\
 FrameLoadDistributed,FrameLoadConcentrated,FrameLoadTemperature,FrameLoadStrain,\
 AreaLoadToFrame,\
-ResultModalPeriod,ResultPointDisplacement,ResultPointReaction,ResultFrameForce,ResultModalDisplacement
+ResultModalPeriod,ResultPointDisplacement,ResultPointReaction,ResultFrameForce,ResultModalDisplacement,\
+ResultAreaStress
 
 from fe_model import Model as FEModel
 
 from fe_solver.static import solve_linear
+from fe_solver.reanalysis import Reanalysis,solve_reanalysis
 from fe_solver.dynamic import solve_modal
 from model_io import dxf
 from . import db
@@ -31,20 +36,47 @@ from . import frame
 from . import area
 from . import curve
 from . import result
+from . import snapshot
+from . import remesh
 
 import logger
 
+#scale factors of units to SI
+UNIT_SCALES={
+    'N_m_C':{'F':1,'L':1,'T':1},
+    'N_mm_C':{'F':1,'L':1e-3,'T':1},
+    'kN_m_C':{'F':1e3,'L':1,'T':1},
+    'kN_mm_C':{'F':1e3,'L':1e-3,'T':1},
+    }
+
 class Model():
     def __init__(self):
         self.locked=False
         self.session=None
-        self.fe_model=FEModel()
+        self.fe_model=FEModel(storage='array')
+        #arrays the FE model is meshed from
+        self.mesh_arrays=None
+        #factorized base design of re-analysis
+        self.reanalysis=None
+        #unit scale and tolerance, cleared when the configuration changes
+        self.__config=None
         
         #database
         self.open=MethodType(db.open,self)
         self.create=MethodType(db.create,self)
         self.save=MethodType(db.save,self)
         self.close=MethodType(db.close,self)
+        self.snapshot_path=MethodType(db.snapshot_path,self)
+        
+        #snapshot
+        self.content_hash=MethodType(snapshot.content_hash,self)
+        self.save_snapshot=MethodType(snapshot.save_snapshot,self)
+        self.load_snapshot=MethodType(snapshot.load_snapshot,self)
+        
+        #incremental remesh
+        self.get_changes=MethodType(remesh.get_changes,self)
+        self.clear_changes=MethodType(remesh.clear_changes,self)
+        self.remesh=MethodType(remesh.remesh,self)
         
         #project configuration
         self.get_project_name=MethodType(project.get_project_name,self)
@@ -80,6 +112,7 @@ class Model():
         self.set_point_restraint=MethodType(point.set_point_restraint,self)
         self.set_point_restraint_batch=MethodType(point.set_point_restraint_batch,self)
         self.delete_point=MethodType(point.delete_point,self)
+        self.merge_points=MethodType(point.merge_points,self)
         
         #frame section
         self.add_frame_section=MethodType(frame_section.add_frame_section,self)
@@ -138,6 +171,7 @@ class Model():
         #frame
         self.add_frame=MethodType(frame.add_frame,self)
         self.add_frame_batch=MethodType(frame.add_frame_batch,self)
+        self.add_frames=MethodType(frame.add_frames,self)
         self.get_frame_end_coors=MethodType(frame.get_frame_end_coors,self)
         self.get_frame_end_names=MethodType(frame.get_frame_end_names,self)
         self.get_frame_names=MethodType(frame.get_frame_names,self)
@@ -157,6 +191,7 @@ class Model():
         #area
         self.add_area=MethodType(area.add_area,self)
         self.add_area_batch=MethodType(area.add_area_batch,self)
+        self.add_areas=MethodType(area.add_areas,self)
         self.delete_area=MethodType(area.delete_area,self)
         
         #result
@@ -169,7 +204,7 @@ class Model():
         self.get_result_point_displacement=MethodType(result.get_result_point_displacement,self)
         self.get_result_point_reaction=MethodType(result.get_result_point_reaction,self)
         self.get_result_frame_force=MethodType(result.get_result_frame_force,self)
-        self.get_result_area_stress=None
+        self.get_result_area_stress=MethodType(result.get_result_area_stress,self)
         self.get_result_period=MethodType(result.get_result_period,self)
         self.combine_result_point_displacement=None
         self.combine_result_frame_force=None
@@ -192,87 +227,151 @@ class Model():
         self.import_s2k=None
         self.export_s2k=None
 
+    def _config(self):
+        """
+        returns the cached unit, scale and tolerance of current model.
+        """
+        if self.__config is None:
+            config=self.session.query(Config).first()
+            self.__config={'unit':config.unit,
+                           'scale':UNIT_SCALES.get(config.unit,{}),
+                           'tol':config.tolerance}
+        return self.__config
+    
+    def clear_config_cache(self):
+        """
+        Forget the cached configuration, called when unit or tolerance is 
+        set, or the session is rolled back or changed.
+        """
+        self.__config=None
+
     def scale(self):
         """
         returns the scale factor of current model.
         """
-        config=self.session.query(Config).first()
-        scale={}
-        if config.unit=='N_m_C':
-            scale['F']=1
-            scale['L']=1
-            scale['T']=1
-        elif config.unit=='N_mm_C':
-            scale['F']=1
-            scale['L']=1e-3
-            scale['T']=1
-        elif config.unit=='kN_m_C':
-            scale['F']=1e3
-            scale['L']=1
-            scale['T']=1
-        elif config.unit=='kN_mm_C':
-            scale['F']=1e3
-            scale['L']=1e-3
-            scale['T']=1        
-        return scale
+        return dict(self._config()['scale'])
+    
+    def tolerance(self):
+        """
+        returns the tolerance of current model in SI unit.
+        """
+        return self._config()['tol']
+    
+    def unit_factor(self,F=0,L=0,T=0):
+        """
+        params:
+            F,L,T: exponents of force, length and temperature, scalars or 
+            arrays broadcasted on the last axis of values.
+        returns:
+            factor from current unit to SI.
+        """
+        scale=self._config()['scale']
+        return np.power(float(scale['F']),F)*np.power(float(scale['L']),L)*np.power(float(scale['T']),T)
+    
+    def to_si(self,values,F=0,L=0,T=0):
+        """
+        Convert values in current unit to SI at once.
+        
+        params:
+            values: array-like.
+            F,L,T: exponents of force, length and temperature, see unit_factor.
+        returns:
+            array.
+        """
+        return np.asarray(values,dtype=float)*self.unit_factor(F,L,T)
+    
+    def from_si(self,values,F=0,L=0,T=0):
+        """
+        Convert values in SI to current unit at once.
+        
+        params:
+            values: array-like.
+            F,L,T: exponents of force, length and temperature, see unit_factor.
+        returns:
+            array.
+        """
+        return np.asarray(values,dtype=float)/self.unit_factor(F,L,T)
 
-    def mesh(self):
-        femodel=self.fe_model
-        points=self.session.query(Point).all()
-        frames=self.session.query(Frame).all()
-        areas=self.session.query(Area).all()
-        pn_map={} #item-item map, one point to one node
-        fb_map={} #item-list map, one frame can be meshed to many beams
-        am_map={} #item-list map, one area can be meshed to many membranes
-        ap_map={} #item-list map, one area can be meshed to many plates
-        as_map={} #item-list map, one area can be meshed to many shells
+    def _mesh_arrays(self):
+        """
+        Read points, frames with their section and material properties, 
+        areas and restraints by a few joined queries into arrays. Objects 
+        are kept by their ids, nodes are referred to by their positions in 
+        the point arrays.
         
-        for pt in points:
-            res=femodel.add_node(pt.x,pt.y,pt.z)
-            pn_map[pt.name]=res
+        return:
+            dict of arrays.
+        """
+        query=self.session.query
+        arrays={}
+        rows=query(Point.id,Point.x,Point.y,Point.z).order_by(Point.id).all()
+        pt_ids=np.array([r[0] for r in rows],dtype=int)
+        arrays['point_ids']=pt_ids
+        arrays['xyz']=np.array([r[1:] for r in rows],dtype=float).reshape((-1,3))
+        def nodes(ids,n):
+            return np.searchsorted(pt_ids,np.asarray(ids,dtype=int)).reshape((-1,n))
             
-        for frm in frames:
-            node0=pn_map[frm.pt0_name]
-            node1=pn_map[frm.pt1_name]
-            E=frm.section.material.isotropic_elastic.E
-            mu=frm.section.material.isotropic_elastic.mu
-            A=frm.section.A
-            J=frm.section.J
-            I2=frm.section.I2
-            I3=frm.section.I3
-            rho=frm.section.material.rho
+        rows=query(Frame.id,Frame.order,Frame.pt0_id,Frame.pt1_id,
+                   IsotropicElastic.E,IsotropicElastic.mu,FrameSection.A,FrameSection.I2,FrameSection.I3,FrameSection.J,Material.rho
+                   ).join(FrameSection,Frame.section_name==FrameSection.name
+                   ).join(Material,FrameSection.material_name==Material.name
+                   ).join(IsotropicElastic,IsotropicElastic.material_name==Material.name
+                   ).order_by(Frame.id).all()
+        if len(rows)!=query(Frame).count():
+            raise Exception('Frames without section or elastic material cannot be meshed.')
+        conn=nodes([r[2:4] for r in rows],2)
+        swap=np.array([r[1]=='10' for r in rows],dtype=bool)
+        conn[swap]=conn[swap][:,::-1]
+        arrays['frame_ids']=np.array([r[0] for r in rows],dtype=int)
+        arrays['beam_conn']=conn
+        arrays['beam_prop']=np.array([r[4:] for r in rows],dtype=float).reshape((-1,7))
             
-            if frm.order=='01':
-                res=femodel.add_beam(node0,node1,E, mu, A, I2, I3, J, rho)
-            elif frm.order=='10':
-                res=femodel.add_beam(node1,node0,E, mu, A, I2, I3, J, rho)
-            fb_map[frm.name]=[res]
-        for _area in areas:
-            nodes={
-            0:pn_map[_area.pt0_name],
-            1:pn_map[_area.pt1_name],
-            2:pn_map[_area.pt2_name],
-            3:pn_map[_area.pt3_name],
-            }
-            t=_area.section.t
-            rho=_area.section.material.rho
-            order=_area.order
-            if len(order)==3:
-                res=femodel.add_membrane3(nodes[eval(order[0])], nodes[eval(order[1])], nodes[eval(order[2])], t, E, mu, rho,)
-                am_map[_area.name]=[res]
-            if len(order)==4:
-                res=femodel.add_membrane4(nodes[eval(order[0])], nodes[eval(order[1])], nodes[eval(order[2])],nodes[eval(order[3])], t, E, mu, rho,)
-                am_map[_area.name]=[res]
+        rows=query(Area.id,Area.pt0_id,Area.pt1_id,Area.pt2_id,Area.pt3_id,
+                   AreaSection.t,IsotropicElastic.E,IsotropicElastic.mu,Material.rho
+                   ).join(AreaSection,Area.section_name==AreaSection.name
+                   ).join(Material,AreaSection.material_name==Material.name
+                   ).join(IsotropicElastic,IsotropicElastic.material_name==Material.name
+                   ).order_by(Area.id).all()
+        if len(rows)!=query(Area).count():
+            raise Exception('Areas without section or elastic material cannot be meshed.')
+        for n in (3,4):
+            part=[r for r in rows if (r[4] is None)==(n==3)]
+            arrays['area%d_ids'%n]=np.array([r[0] for r in part],dtype=int)
+            arrays['membrane%d_conn'%n]=nodes([r[1:1+n] for r in part],n)
+            arrays['membrane%d_prop'%n]=np.array([r[5:] for r in part],dtype=float).reshape((-1,4))
+        
+        rows=query(PointRestraint.point_id,PointRestraint.u1,PointRestraint.u2,PointRestraint.u3,
+                   PointRestraint.r1,PointRestraint.r2,PointRestraint.r3).all()
+        arrays['restraint_nodes']=nodes([r[0] for r in rows],1).reshape(-1)
+        arrays['restraints']=np.array([[bool(res) for res in r[1:]] for r in rows],dtype=bool).reshape((-1,6))
+        return arrays
         
-        restraints=self.session.query(PointRestraint).all()
-        for res in restraints:
-            disp=[0 if res.u1 else None,
-                  0 if res.u2 else None,
-                  0 if res.u3 else None,
-                  0 if res.r1 else None,
-                  0 if res.r2 else None,
-                  0 if res.r3 else None]
-            femodel.set_node_displacement(pn_map[res.point_name],disp)
+    def _build_fe(self,arrays):
+        """
+        Add nodes and elements to the FE model in batch.
+        
+        params:
+            arrays: dict of arrays, see _mesh_arrays.
+        """
+        femodel=self.fe_model
+        ap_map={} #item-list map, one area can be meshed to many plates
+        as_map={} #item-list map, one area can be meshed to many shells
+        hids=femodel.add_nodes(arrays['xyz'])
+        #item-item map, one point id to one node
+        pn_map=dict(zip(arrays['point_ids'].tolist(),hids.tolist()))
+        #item-list map, one frame can be meshed to many beams
+        res=femodel.add_beams(hids[arrays['beam_conn']],arrays['beam_prop'])
+        fb_map=dict((i,[hid]) for i,hid in zip(arrays['frame_ids'].tolist(),res.tolist()))
+        #item-list map, one area can be meshed to many membranes
+        am_map={}
+        for n in (3,4):
+            ids=arrays['area%d_ids'%n].tolist()
+            if ids==[]:
+                continue
+            res=femodel.add_membranes(hids[arrays['membrane%d_conn'%n]],arrays['membrane%d_prop'%n])
+            am_map.update((i,[hid]) for i,hid in zip(ids,res.tolist()))
+        for hid,r in zip(hids[arrays['restraint_nodes']].tolist(),arrays['restraints'].tolist()):
+            femodel.set_node_displacement(hid,[0 if res else None for res in r])
                 
         self.pn_map=pn_map
         self.fb_map=fb_map
@@ -280,6 +379,14 @@ class Model():
         self.ap_map=ap_map
         self.as_map=as_map
 
+    def mesh(self):
+        """
+        Mesh the model to the FE model. The arrays read are kept as 
+        mesh_arrays for the snapshot.
+        """
+        self.mesh_arrays=self._mesh_arrays()
+        self._build_fe(self.mesh_arrays)
+
     def apply_load(self,lc):        
         pn_map=self.pn_map
         fb_map=self.fb_map
@@ -288,6 +395,8 @@ class Model():
         as_map=self.as_map
 
         loadcase=self.session.query(LoadCase).filter_by(name=lc).first()
+        #loads of the last case are taken off
+        self.fe_model.clear_node_forces()
         
         point_loads=self.session.query(PointLoad).filter_by(loadcase_name=lc).all()
         frame_load_distributeds=self.session.query(FrameLoadDistributed).filter_by(loadcase_name=lc).all()
@@ -297,7 +406,7 @@ class Model():
         area_load_to_frames=self.session.query(AreaLoadToFrame).filter_by(loadcase_name=lc).all()
         
         for load in point_loads:
-            self.fe_model.set_node_force(pn_map[load.point_name],
+            self.fe_model.set_node_force(pn_map[load.point_id],
                                          [load.u1 if load.u1!=None else 0,
                                           load.u2 if load.u2!=None else 0,
                                           load.u3 if load.u3!=None else 0,
@@ -327,19 +436,32 @@ class Model():
             self.fe_model.set_node_force(beam.nodes[0].hid,[0,0,f,0,0,0],append=True)
             self.fe_model.set_node_force(beam.nodes[1].hid,[0,0,f,0,0,0],append=True)
             
-    def run(self,lcs):
+    def run(self,lcs,method='cg'):
         """
         Run the model with loadcases
         params:
             lcs: list of str, specify load cases to run.
+            method: solver of static cases, see fe_solver.static.solve_linear,
+                or 'reanalysis' to solve changed designs with the factor of
+                the first one, see fe_solver.reanalysis.
         return:
             None.
         """
+        digest=None
+        #changes since the last run are patched into the FE model if they can
+        if self.fe_model.is_assembled and not self.remesh():
+            self.fe_model=FEModel(storage='array')
         if not self.fe_model.is_assembled:
-            logger.info('Mesh model...')
-            self.mesh()
-            self.fe_model.assemble_KM()
-            self.fe_model.assemble_boundary(mode='KM')
+            #an unchanged model is restored from its snapshot
+            digest=self.content_hash()
+            if self.load_snapshot(digest):
+                digest=None
+            else:
+                logger.info('Mesh model...')
+                self.mesh()
+                self.fe_model.assemble_KM()
+            self.clear_changes()
+        self.fe_model.assemble_boundary(mode='KM')
         try:
             for lc in lcs:
                 loadcase=self.session.query(LoadCase).filter_by(name=lc).first()
@@ -350,32 +472,52 @@ class Model():
                     self.apply_load(lc)
                     self.fe_model.assemble_f()
                     self.fe_model.assemble_boundary(mode='f')
-                    solve_linear(self.fe_model)
-                    #write disp
-                    for pt in self.session.query(Point).all():
-                        hid=self.pn_map[pt.name]
-                        rst=ResultPointDisplacement()
-                        rst.point_name=pt.name
-                        rst.loadcase_name=lc
-                        disp=self.fe_model.resolve_node_disp(hid)
-                        (rst.u1,rst.u2,rst.u3,rst.r1,rst.r2,rst.r3)=tuple(disp)
-                        self.session.add(rst)
-                    #write reaction
-                    for res in self.session.query(PointRestraint).all():
-                        hid=self.pn_map[res.point_name]
-                        rst=ResultPointReaction()
-                        rst.point_name=res.point_name
-                        rst.loadcase_name=lc
-                        reac=self.fe_model.resolve_node_reaction(hid)
-                        (rst.p1,rst.p2,rst.p3,rst.m1,rst.m2,rst.m3)=tuple(reac)
-                        self.session.add(rst)
+                    if method=='reanalysis':
+                        #a model meshed again is a new base design
+                        if self.reanalysis is None or self.reanalysis.model is not self.fe_model:
+                            self.reanalysis=Reanalysis(self.fe_model)
+                        solve_reanalysis(self.fe_model,self.reanalysis)
+                    else:
+                        solve_linear(self.fe_model,method=method)
+                    #write disp and reaction, nodal results are rotated in 
+                    #chunks, all at once if the model is in memory
+                    scratch=self.fe_model.scratch
+                    ids=[i for i, in self.session.query(Point.id)]
+                    chunk=max(len(ids),1) if scratch is None else scratch.chunk
+                    for i in range(0,len(ids),chunk):
+                        part=ids[i:i+chunk]
+                        disps=self.fe_model.resolve_node_disps([self.pn_map[j] for j in part]).tolist()
+                        rsts=[dict(point_id=j,loadcase_name=lc,
+                                   u1=u[0],u2=u[1],u3=u[2],r1=u[3],r2=u[4],r3=u[5]) for j,u in zip(part,disps)]
+                        self.session.bulk_insert_mappings(ResultPointDisplacement,rsts)
+                    ids=[i for i, in self.session.query(PointRestraint.point_id)]
+                    for i in range(0,len(ids),chunk):
+                        part=ids[i:i+chunk]
+                        reacs=self.fe_model.resolve_node_reactions([self.pn_map[j] for j in part]).tolist()
+                        rsts=[dict(point_id=j,loadcase_name=lc,
+                                   p1=r[0],p2=r[1],p3=r[2],m1=r[3],m2=r[4],m3=r[5]) for j,r in zip(part,reacs)]
+                        self.session.bulk_insert_mappings(ResultPointReaction,rsts)
+                    #write area stress, mean stress of the membranes of each 
+                    #area, membranes of a kind are resolved at once
+                    rsts=[]
+                    all_areas=self.session.query(Area).all()
+                    for kind,tri in [('membrane3',True),('membrane4',False)]:
+                        areas=[a for a in all_areas if (a.pt3_id is None)==tri]
+                        if areas==[]:
+                            continue
+                        S=self.fe_model.resolve_membrane_mean_stresses(kind)
+                        for a in areas:
+                            s=S[self.am_map[a.id]].mean(axis=0).tolist()
+                            rsts.append(dict(area_id=a.id,loadcase_name=lc,
+                                             s11=s[0],s22=s[1],s12=s[2],s21=s[2]))
+                    self.session.bulk_insert_mappings(ResultAreaStress,rsts)
                     #write beam force
                     for frm in self.session.query(Frame).all():
-                        hids=self.fb_map[frm.name]
+                        hids=self.fb_map[frm.id]
                         for i in range(len(hids)):
                             hid=hids[i]
                             rst=ResultFrameForce()
-                            rst.frame_name=frm.name
+                            rst.frame_id=frm.id
                             rst.loadcase_name=lc
                             rst.segment=i
                             f=self.fe_model.resolve_beam_force(hid)
@@ -389,7 +531,7 @@ class Model():
                     solve_modal(self.fe_model,k=loadcase.loadcase_modal_setting.modal_num)
                     #write period
                     _order=1
-                    for omega in self.fe_model.omega_:
+                    for omega in np.ravel(self.fe_model.omega_).tolist():
                         rst=ResultModalPeriod()
                         rst.order=_order
                         rst.loadcase_name=lc
@@ -400,21 +542,21 @@ class Model():
                         _order+=1
 
                     #write disp
-                    for pt in self.session.query(Point).all():
-                        for od in range(1,_order):
-                            hid=self.pn_map[pt.name]
-                            rst=ResultModalDisplacement()
-                            rst.point_name=pt.name
-                            rst.loadcase_name=lc
-                            rst.order=od
-                            disp=self.fe_model.resolve_modal_displacement(hid,od)
-                            (rst.u1,rst.u2,rst.u3,rst.r1,rst.r2,rst.r3)=tuple(disp)
-                            self.session.add(rst)
+                    pts=self.session.query(Point).all()
+                    hids=[self.pn_map[pt.id] for pt in pts]
+                    for od in range(1,_order):
+                        disps=self.fe_model.resolve_modal_displacements(od)[hids]
+                        rsts=[dict(point_id=pt.id,loadcase_name=lc,order=od,
+                                   u1=u[0],u2=u[1],u3=u[2],r1=u[3],r2=u[4],r3=u[5])
+                              for pt,u in zip(pts,disps.tolist())]
+                        self.session.bulk_insert_mappings(ResultModalDisplacement,rsts)
                         
                     self.session.commit()
                     logger.info('Finished case %s.'%lc)
                 else:
                     pass
+            if digest is not None:
+                self.save_snapshot(digest)
         except Exception as e:
             logger.info(str(e))
             self.session.rollback()
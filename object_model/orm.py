@@ -8,7 +8,7 @@ Created on Mon Mar 12 16:20:13 2018
 
 import uuid
 from sqlalchemy import create_engine,\
-Column,Integer,Float,String,Boolean,Text,DateTime,ForeignKey
+Column,Integer,Float,String,Boolean,Text,DateTime,ForeignKey,Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship,backref
 
@@ -32,7 +32,7 @@ class Material(Base):
     type=Column('type',String(32))
     
     #other types...
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     #1 to 1
     isotropic_elastic=relationship('IsotropicElastic',
                                    backref=backref('material',uselist=False),uselist=False) #1 to 1
@@ -67,7 +67,7 @@ class FrameSection(Base):
     S3=Column('S3',Float())
     I2=Column('I2',Float())
     I3=Column('I3',Float())
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to many
     frames=relationship('Frame',backref='section')
@@ -85,7 +85,7 @@ class AreaSection(Base):
     material_name=Column('material_name',String(32),ForeignKey('materials.name'))
     type=Column('type',String(8))
     t=Column('t',Float())
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to many
     areas=relationship('Area',backref='section')
@@ -95,7 +95,7 @@ class LoadCase(Base):
     name=Column('name',String(32),primary_key=True)
     case_type=Column('case_type',String(16))
     weight_factor=Column('weight_factor',Float,default=0)
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to 1
     static_linear_setting=relationship('LoadCaseStaticLinearSetting',backref=backref('loadcase',uselist=False),uselist=False)
@@ -172,7 +172,7 @@ class Combination(Base):
     __tablename__='combinations'
     name=Column('name',String(32),primary_key=True)
     combination_type=Column('combination_type',String(16))
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to many
     combination_cases=relationship('CombinationCase',backref='combination')
@@ -185,11 +185,12 @@ class CombinationCase(Base):
     
 class Point(Base):
     __tablename__='points'
-    name=Column('name',String(32),primary_key=True)
+    id=Column('id',Integer,primary_key=True)
+    name=Column('name',String(36),unique=True,nullable=False)
     x=Column('x',Float)
     y=Column('y',Float)
     z=Column('z',Float)
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to 1
     point_restraint=relationship('PointRestraint',backref=backref('point',uselist=False))
@@ -202,7 +203,7 @@ class Point(Base):
     
 class PointRestraint(Base):
     __tablename__='point_restraints'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     u1=Column('u1',Boolean())
     u2=Column('u2',Boolean())
     u3=Column('u3',Boolean())
@@ -212,7 +213,8 @@ class PointRestraint(Base):
 
 class PointLoad(Base):
     __tablename__='pointloads'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    __table_args__=(Index('ix_pointloads_loadcase','loadcase_name','point_id'),)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     u1=Column('p1',Float())
     u2=Column('p2',Float())
@@ -223,7 +225,8 @@ class PointLoad(Base):
     
 class PointDisp(Base):
     __tablename__='point_disps'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    __table_args__=(Index('ix_point_disps_loadcase','loadcase_name','point_id'),)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     u1=Column('u1',Float())
     u2=Column('u2',Float())
@@ -234,7 +237,7 @@ class PointDisp(Base):
 
 class PointMass( Base):
     __tablename__='point_masses'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     u1=Column('u1',Float())
     u2=Column('u2',Float())
     u3=Column('u3',Float())
@@ -244,7 +247,7 @@ class PointMass( Base):
 
 class PointSpring(Base):
     __tablename__='point_springs'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     u1=Column('u1',Float())
     u2=Column('u2',Float())
     u3=Column('u3',Float())
@@ -277,16 +280,18 @@ class Spectrum(Base):
 
 class Frame(Base):
     __tablename__='frames'
-    name=Column('name',String(32),primary_key=True)
+    __table_args__=(Index('ix_frames_ends','pt0_id','pt1_id'),)
+    id=Column('id',Integer,primary_key=True)
+    name=Column('name',String(36),unique=True,nullable=False)
     section_name=Column('section_name',String(32),ForeignKey('frame_sections.name'))
     
-    pt0_name=Column('pt0_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt1_name=Column('pt1_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt0 = relationship("Point", foreign_keys=[pt0_name])
-    pt1 = relationship("Point", foreign_keys=[pt1_name])
+    pt0_id=Column('pt0_id',Integer,ForeignKey('points.id'),nullable=False)
+    pt1_id=Column('pt1_id',Integer,ForeignKey('points.id'),nullable=False)
+    pt0 = relationship("Point", foreign_keys=[pt0_id])
+    pt1 = relationship("Point", foreign_keys=[pt1_id])
     
     order=Column('order',String(2),default='01')
-    uuid=Column('uuid',String(32),nullable=False)
+    uuid=Column('uuid',String(36),nullable=False)
     
     #1 to 1
     frame_axis=relationship('FrameAxis',backref=backref('frame',uselist=False))
@@ -301,14 +306,14 @@ class Frame(Base):
 
 class FrameAxis(Base):
     __tablename__='frame_axis'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     x=Column('x',Float())
     y=Column('y',Float())
     z=Column('z',Float())
     
 class FrameRelease(Base):
     __tablename__='frame_releases'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     u01=Column('u01',Float())
     u02=Column('u02',Float())
     u03=Column('u03',Float())
@@ -324,7 +329,8 @@ class FrameRelease(Base):
 
 class FrameLoadDistributed(Base):
     __tablename__='frame_load_distributeds'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_frame_load_distributeds_loadcase','loadcase_name','frame_id'),)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     p01=Column('p01',Float())
     p02=Column('p02',Float())
@@ -341,7 +347,8 @@ class FrameLoadDistributed(Base):
 
 class FrameLoadConcentrated(Base):
     __tablename__='frame_load_concentrated'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_frame_load_concentrated_loadcase','loadcase_name','frame_id'),)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     loc=Column('loc',Float())
     p1=Column('p1',Float())
@@ -353,31 +360,34 @@ class FrameLoadConcentrated(Base):
 
 class FrameLoadStrain(Base):
     __tablename__='frame_load_strain'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_frame_load_strain_loadcase','loadcase_name','frame_id'),)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     strain=Column('strain',Float())
     
 class FrameLoadTemperature(Base):
     __tablename__='frame_laod_teamperature'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_frame_laod_teamperature_loadcase','loadcase_name','frame_id'),)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     T=Column('T',Float())
 
 class Area(Base):
     __tablename__='areas'
-    name=Column('name',String(32),primary_key=True)
+    id=Column('id',Integer,primary_key=True)
+    name=Column('name',String(36),unique=True,nullable=False)
     section_name=Column('section_name',String(32),ForeignKey('area_sections.name'))
 
-    pt0_name=Column('pt0_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt1_name=Column('pt1_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt2_name=Column('pt2_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt3_name=Column('pt3_name',String(32),ForeignKey('points.name'),nullable=False)
-    pt0 = relationship("Point", foreign_keys=[pt0_name])
-    pt1 = relationship("Point", foreign_keys=[pt1_name])    
-    pt2 = relationship("Point", foreign_keys=[pt2_name])
-    pt3 = relationship("Point", foreign_keys=[pt3_name])  
+    pt0_id=Column('pt0_id',Integer,ForeignKey('points.id'),nullable=False)
+    pt1_id=Column('pt1_id',Integer,ForeignKey('points.id'),nullable=False)
+    pt2_id=Column('pt2_id',Integer,ForeignKey('points.id'),nullable=False)
+    pt3_id=Column('pt3_id',Integer,ForeignKey('points.id'),nullable=True)
+    pt0 = relationship("Point", foreign_keys=[pt0_id])
+    pt1 = relationship("Point", foreign_keys=[pt1_id])    
+    pt2 = relationship("Point", foreign_keys=[pt2_id])
+    pt3 = relationship("Point", foreign_keys=[pt3_id])  
     
-    uuid=Column('uuid',String(32),nullable=False)   
+    uuid=Column('uuid',String(36),nullable=False)   
     
     #1 to 1
     area_axis=relationship('AreaAxis',backref=backref('area',uselist=False))
@@ -388,7 +398,7 @@ class Area(Base):
     
 class AreaAxis(Base):
     __tablename__='area_axis'
-    area_name=Column('area_name',String(32),ForeignKey('areas.name'),primary_key=True)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     x0=Column('x0',Float())
     y0=Column('y0',Float())
     z0=Column('z0',Float())
@@ -398,7 +408,8 @@ class AreaAxis(Base):
     
 class AreaLoadToFrame(Base):
     __tablename__='area_load_to_frame'
-    area_name=Column('area_name',String(32),ForeignKey('areas.name'),primary_key=True)
+    __table_args__=(Index('ix_area_load_to_frame_loadcase','loadcase_name','area_id'),)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     p1=Column('p1',Float())
     p2=Column('p2',Float())
@@ -406,19 +417,22 @@ class AreaLoadToFrame(Base):
     
 class AreaLoadDistributed(Base):
     __tablename__='area_load_distributeds'
-    area_name=Column('area_name',String(32),ForeignKey('areas.name'),primary_key=True)
+    __table_args__=(Index('ix_area_load_distributeds_loadcase','loadcase_name','area_id'),)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     pass
 
 class AreaLoadStrain(Base):
     __tablename__='area_load_strains'
-    area_name=Column('area_name',String(32),ForeignKey('areas.name'),primary_key=True)
+    __table_args__=(Index('ix_area_load_strains_loadcase','loadcase_name','area_id'),)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     pass
 
 class AreaLoadTemperature(Base):
     __tablename__='area_laod_teamperature'
-    area_name=Column('area_name',String(32),ForeignKey('areas.name'),primary_key=True)
+    __table_args__=(Index('ix_area_laod_teamperature_loadcase','loadcase_name','area_id'),)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     T=Column('T',Float())
 
@@ -429,7 +443,8 @@ class RunLoadCase(Base):
 
 class ResultPointDisplacement(Base):
     __tablename__='result_point_displacement'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    __table_args__=(Index('ix_result_point_displacement_loadcase','loadcase_name','point_id'),)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     u1=Column('u1',Float())
     u2=Column('u2',Float())
@@ -441,7 +456,8 @@ class ResultPointDisplacement(Base):
 
 class ResultPointReaction(Base):
     __tablename__='result_point_reactions'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    __table_args__=(Index('ix_result_point_reactions_loadcase','loadcase_name','point_id'),)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     p1=Column('p1',Float())
     p2=Column('p2',Float())
@@ -453,7 +469,8 @@ class ResultPointReaction(Base):
 
 class ResultFrameForce(Base):
     __tablename__='result_frame_forces'
-    frame_name=Column('frame_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_result_frame_forces_loadcase','loadcase_name','frame_id'),)
+    frame_id=Column('frame_id',Integer,ForeignKey('frames.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     segment=Column('segment',Integer(),primary_key=True)
     p01=Column('p01',Float())
@@ -471,7 +488,8 @@ class ResultFrameForce(Base):
 
 class ResultAreaStress(Base):
     __tablename__='result_area_stresses'
-    area_name=Column('area_name',String(32),ForeignKey('frames.name'),primary_key=True)
+    __table_args__=(Index('ix_result_area_stresses_loadcase','loadcase_name','area_id'),)
+    area_id=Column('area_id',Integer,ForeignKey('areas.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     s11=Column('s11',Float())
     s12=Column('s12',Float())
@@ -490,7 +508,8 @@ class ResultModalPeriod(Base):
 
 class ResultModalDisplacement(Base):
     __tablename__='result_modal_displacement'
-    point_name=Column('point_name',String(32),ForeignKey('points.name'),primary_key=True)
+    __table_args__=(Index('ix_result_modal_displacement_loadcase','loadcase_name','point_id'),)
+    point_id=Column('point_id',Integer,ForeignKey('points.id'),primary_key=True)
     loadcase_name=Column('loadcase_name',String(32),ForeignKey('loadcases.name'),primary_key=True)
     order=Column('order',Integer(),primary_key=True)
     u1=Column('u1',Float())
@@ -6,9 +6,13 @@ Created on Thu Mar 29 10:14:07 2018
 """
 import uuid
 
-from sqlalchemy.sql import and_
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy.sql import text
 
-from .orm import Config,Point,Frame,Area,PointLoad,PointRestraint
+from .orm import Base,Point,PointLoad,PointRestraint
+from .db import _ids_of
 import logger
 
 def add_point(self,x,y,z):
@@ -36,6 +40,42 @@ def add_point(self,x,y,z):
         self.session.rollback()
         return False
         
+def _points_near(self,x=None,y=None,z=None,tol=None):
+    """
+    Find points near a location with the spatial index. Candidates are 
+    found in the R*Tree, whose bounds are rounded outwards, and then checked 
+    with the exact coordinates.
+    
+    params:
+        x,y,z: float, coordinates in SI, None for any.
+        tol: float, tolerance in SI, the model tolerance if None.
+    return:
+        list of (id,name) of points.
+    """
+    tol=self.tolerance() if tol is None else tol
+    self.session.flush()
+    conds=[]
+    params={'tol':tol}
+    for axis,v in zip('xyz',(x,y,z)):
+        if v is None:
+            continue
+        conds.append('i.min_{0}<=:{0}+:tol AND i.max_{0}>=:{0}-:tol AND abs(p.{0}-:{0})<:tol'.format(axis))
+        params[axis]=float(v)
+    sql='SELECT p.id,p.name FROM points p JOIN point_index i ON p.id=i.id'
+    if conds!=[]:
+        sql+=' WHERE '+' AND '.join(conds)
+    return [tuple(r) for r in self.session.execute(text(sql),params)]
+
+def _point_at(self,x,y,z):
+    """
+    params:
+        x,y,z: float, coordinates in SI.
+    return:
+        int, id of a point at the location, None if there is not.
+    """
+    pts=_points_near(self,x,y,z)
+    return pts[0][0] if pts!=[] else None
+        
 def set_point_restraint_batch(self,points,restraints):
     """
     params:
@@ -46,10 +86,13 @@ def set_point_restraint_batch(self,points,restraints):
     """
     try:
         assert len(restraints)==6
+        ids=_ids_of(self,Point,points)
+        if len(ids)!=len(set(points)):
+            raise Exception("Point doesn't exists.")
         reses=[]
         for point in points:
             res=PointRestraint()
-            res.point_name=point
+            res.point_id=ids[point]
             res.u1=restraints[0]
             res.u2=restraints[1]
             res.u3=restraints[2]
@@ -77,10 +120,10 @@ def set_point_restraint(self,point,restraints):
         pt=self.session.query(Point).filter_by(name=point).first()
         if pt is None:
             raise Exception("Point doesn't exists.")
-        res=self.session.query(PointRestraint).filter_by(point_name=point).first()
+        res=self.session.query(PointRestraint).filter_by(point_id=pt.id).first()
         if res is None:
             res=PointRestraint()
-            res.point_name=point
+            res.point_id=pt.id
             res.u1=restraints[0]
             res.u2=restraints[1]
             res.u3=restraints[2]
@@ -119,18 +162,12 @@ def set_point_load(self,point,loadcase,load):
         pt=self.session.query(Point).filter_by(name=point).first()
         if pt is None:
             raise Exception("Point doesn't exists.")
-        ld=self.session.query(PointLoad).filter_by(point_name=point,loadcase_name=loadcase).first()
+        ld=self.session.query(PointLoad).filter_by(point_id=pt.id,loadcase_name=loadcase).first()
         if ld is None:
             ld=PointLoad()
-        scale=self.scale()
-        ld.point_name=point
+        ld.point_id=pt.id
         ld.loadcase_name=loadcase
-        ld.p1=load[0]*scale['F']
-        ld.p2=load[1]*scale['F']
-        ld.p3=load[2]*scale['F']
-        ld.m1=load[3]*scale['F']*scale['L']
-        ld.m2=load[4]*scale['F']*scale['L']
-        ld.m3=load[5]*scale['F']*scale['L']
+        ld.u1,ld.u2,ld.u3,ld.r1,ld.r2,ld.r3=self.to_si(load,F=1,L=[0,0,0,1,1,1]).tolist()
         self.session.add(ld)
         return True
     except Exception as e:
@@ -211,17 +248,9 @@ def get_point_name_by_coor(self,x=None,y=None,z=None):
         point list satisfies the coordiniates if successful or None if failed.
     """
     try:
-        tol=self.session.query(Config).first().tolerance
-        pts=self.session.query(Point)
         scale=self.scale()
-        if x is not None:
-            pts=pts.filter(and_((Point.x-x*scale['L'])<tol,(x-Point.x*scale['L'])<tol))
-        if y is not None:
-            pts=pts.filter(and_((Point.y-y*scale['L'])<tol,(y-Point.y*scale['L'])<tol))
-        if z is not None:
-            pts=pts.filter(and_((Point.z-z*scale['L'])<tol,(z-Point.z*scale['L'])<tol))
-        names=[pt.name for pt in pts.all()]
-        return names
+        x,y,z=[None if v is None else v*scale['L'] for v in (x,y,z)]
+        return [name for i,name in _points_near(self,x,y,z)]
     except Exception as e:
         logger.info(str(e))
         self.session.rollback()
@@ -250,6 +279,164 @@ def get_point_coordinate(self,name):
         self.session.rollback()
         return None
 
+#offsets of the neighbouring cells, each pair of cells is visited once
+_NEIGHBOURS=[(i,j,k) for i in (-1,0,1) for j in (-1,0,1) for k in (-1,0,1) if (i,j,k)>=(0,0,0)]
+
+def _cluster(coors,tol):
+    """
+    Cluster points within a tolerance by grid hashing. Points are hashed to 
+    cells of the tolerance size, so only points in the same or neighbouring 
+    cells are compared. Clusters are closed transitively.
+    
+    params:
+        coors: nx3 array of coordinates.
+        tol: float, tolerance.
+    return:
+        n-array, index of the representative of each point, which is the 
+        first point of its cluster.
+    """
+    n=coors.shape[0]
+    if n==0:
+        return np.zeros(0,dtype=int)
+    cell=np.floor(coors/tol).astype(np.int64)
+    #cells are numbered by ranks of their occupied values on each axis, so 
+    #that keys stay small however fine the tolerance is
+    values=[np.unique(cell[:,i]) for i in range(3)]
+    dims=[v.shape[0] for v in values]
+    if float(dims[0])*dims[1]*dims[2]>=2.**62:
+        raise Exception('Too many cells to hash the points.')
+    def keys_of(cells):
+        rank,found=[],np.ones(cells.shape[0],dtype=bool)
+        for i in range(3):
+            pos=np.minimum(np.searchsorted(values[i],cells[:,i]),dims[i]-1)
+            found&=values[i][pos]==cells[:,i]
+            rank.append(pos)
+        return (rank[0]*dims[1]+rank[1])*dims[2]+rank[2],found
+    key=keys_of(cell)[0]
+    order=np.argsort(key,kind='stable')
+    keys,start,count=np.unique(key[order],return_index=True,return_counts=True)
+    occupied=cell[order[start]]
+    I,J=[],[]
+    for offset in _NEIGHBOURS:
+        nb,found=keys_of(occupied+offset)
+        pos=np.minimum(np.searchsorted(keys,nb),keys.shape[0]-1)
+        a=np.nonzero(found&(keys[pos]==nb))[0]
+        b=pos[a]
+        m=count[a]*count[b]
+        c=np.repeat(np.arange(a.shape[0]),m)
+        k=np.arange(m.sum())-np.repeat(np.cumsum(m)-m,m)
+        i=order[start[a][c]+k//count[b][c]]
+        j=order[start[b][c]+k%count[b][c]]
+        if offset==(0,0,0):
+            i,j=i[i<j],j[i<j]
+        close=((coors[i]-coors[j])**2).sum(axis=1)<tol**2
+        I.append(i[close])
+        J.append(j[close])
+    I,J=np.concatenate(I),np.concatenate(J)
+    graph=coo_matrix((np.ones(I.shape[0]),(I,J)),shape=(n,n))
+    n_clusters,label=connected_components(graph,directed=False)
+    rep=np.full(n_clusters,n)
+    np.minimum.at(rep,label,np.arange(n))
+    return rep[label]
+
+def _references(table):
+    """
+    return:
+        list of (table,column) referring to ids of the table.
+    """
+    return [(t.name,fk.parent.name) for t in Base.metadata.sorted_tables for fk in t.foreign_keys
+            if fk.column.table.name==table and fk.column.name=='id']
+
+def _merge_coincident(self,tol):
+    """
+    Merge points within a tolerance. The first added point of a cluster is
+    kept, references to the others are redirected to it with bulk updates. 
+    Where a record of the kept point exists already, such as a restraint or 
+    a load of the same case, it is kept and the ones of the merged points 
+    are dropped. Frames whose ends are merged and areas with any two corners
+    merged are deleted.
+    
+    params:
+        tol: float, tolerance in SI.
+    return:
+        dict, names of merged points to the names of the kept ones.
+    """
+    self.session.flush()
+    rows=self.session.execute(text('SELECT id,name,x,y,z FROM points ORDER BY id')).fetchall()
+    if rows==[]:
+        return {}
+    ids=np.array([r[0] for r in rows],dtype=int)
+    names=np.array([r[1] for r in rows],dtype=object)
+    rep=_cluster(np.array([r[2:] for r in rows],dtype=float),tol)
+    merged=np.nonzero(rep!=np.arange(rep.shape[0]))[0]
+    pt_map=dict(zip(names[merged],names[rep[merged]]))
+    if pt_map=={}:
+        return pt_map
+    execute=self.session.execute
+    execute(text('CREATE TEMP TABLE IF NOT EXISTS point_map (old INTEGER PRIMARY KEY,new INTEGER)'))
+    execute(text('DELETE FROM point_map'))
+    execute(text('INSERT INTO point_map VALUES (:old,:new)'),
+            [{'old':k,'new':v} for k,v in zip(ids[merged].tolist(),ids[rep[merged]].tolist())])
+    for table,column in _references('points'):
+        execute(text('UPDATE OR IGNORE {0} SET {1}=m.new FROM point_map m WHERE {0}.{1}=m.old'.format(table,column)))
+        execute(text('DELETE FROM {0} WHERE {1} IN (SELECT old FROM point_map)'.format(table,column)))
+    #ends of frames are kept in order of ids
+    execute(text("""UPDATE frames SET pt0_id=pt1_id,pt1_id=pt0_id,
+                 "order"=CASE "order" WHEN '01' THEN '10' ELSE '01' END WHERE pt0_id>pt1_id"""))
+    for table,column in _references('frames'):
+        execute(text('DELETE FROM {0} WHERE {1} IN (SELECT id FROM frames WHERE pt0_id=pt1_id)'.format(table,column)))
+    execute(text('DELETE FROM frames WHERE pt0_id=pt1_id'))
+    degenerate="""SELECT id FROM areas WHERE pt0_id=pt1_id OR pt0_id=pt2_id OR pt1_id=pt2_id
+        OR pt3_id IN (pt0_id,pt1_id,pt2_id)"""
+    for table,column in _references('areas'):
+        execute(text('DELETE FROM {0} WHERE {1} IN ({2})'.format(table,column,degenerate)))
+    execute(text('DELETE FROM areas WHERE id IN (%s)'%degenerate))
+    execute(text('DELETE FROM points WHERE id IN (SELECT old FROM point_map)'))
+    execute(text('DROP TABLE point_map'))
+    self.session.expire_all()
+    return pt_map
+
+def _uuids(n):
+    """
+    n distinct uuid strings at once.
+    """
+    return [str(uuid.uuid4()) for i in range(n)]
+
+def _insert_points(self,coors):
+    """
+    Insert points in batch. Points within the tolerance of each other or of 
+    points in the model are deduplicated in memory, the remaining ones are 
+    inserted with one executemany, with ids following the largest one.
+    
+    params:
+        coors: nx3 array of coordinates in SI.
+    return:
+        n-array of int, ids of the points at the coordinates.
+    """
+    n=coors.shape[0]
+    if n==0:
+        return np.zeros(0,dtype=int)
+    tol=self.tolerance()
+    self.session.flush()
+    #only points in the bounding box of the new ones could be coincident
+    lo,hi=coors.min(axis=0)-tol,coors.max(axis=0)+tol
+    rows=self.session.execute(text("""SELECT p.id,p.x,p.y,p.z FROM points p JOIN point_index i ON p.id=i.id
+        WHERE i.max_x>=:x0 AND i.min_x<=:x1 AND i.max_y>=:y0 AND i.min_y<=:y1 AND i.max_z>=:z0 AND i.min_z<=:z1
+        ORDER BY p.id"""),dict(zip(['x0','y0','z0','x1','y1','z1'],np.concatenate([lo,hi]).tolist()))).fetchall()
+    n0=len(rows)
+    old=np.array([r[1:] for r in rows],dtype=float).reshape((-1,3))
+    rep=_cluster(np.vstack([old,coors]),tol)
+    ids=np.zeros(n0+n,dtype=int)
+    ids[:n0]=[r[0] for r in rows]
+    new=np.nonzero(rep[n0:]==np.arange(n0,n0+n))[0]+n0
+    if new.shape[0]>0:
+        start=self.session.execute(text('SELECT coalesce(max(id),0) FROM points')).scalar()+1
+        ids[new]=np.arange(start,start+new.shape[0])
+        self.session.execute(Point.__table__.insert(),
+            [{'id':i,'name':name,'uuid':name,'x':x,'y':y,'z':z} 
+             for i,name,(x,y,z) in zip(ids[new].tolist(),_uuids(new.shape[0]),coors[new-n0].tolist())])
+    return ids[rep[n0:]]
+
 def merge_points(self,tol=1e-3):
     """
     merge points within certain tolerance.
@@ -260,54 +447,9 @@ def merge_points(self,tol=1e-3):
         status of success.
     """
     try:
-        pts=self.session.query(Point).order_by(Point.x,Point.y,Point.z).all()
-        pt_map=dict([(pt.name,pt.name) for pt in pts])
-        pts_to_rmv=[]
         scale=self.scale()
-        for pti,ptj in zip(pts[:-1],pts[1:]):
-            if (ptj.x-pti.x)**2+(ptj.y-pti.y)**2+(ptj.z-pti.z)**2<(tol*scale['L'])**2:
-#                pti.point_restraint.point_name=ptj.name
-#                pti.point_load.point_name=ptj.name
-#                pti.point_disp.point_name=ptj.name
-#                pti.point_mass.point_name=ptj.name
-#                pti.point_restraint+=ptj.point_restraint
-#                pti.point_load+=ptj.point_load
-#                pti.point_disp+=ptj.point_disp
-#                pti.point_mass+=ptj.point_mass
-                pt_map[ptj.name]=pt_map[pti.name]
-                pts_to_rmv.append(ptj)
-                
-        frames=self.session.query(Frame).all()
-        areas=self.session.query(Area).all()
-        logger.info(len(pts_to_rmv))
-        for frm in frames:
-            if (frm.pt0_name in pts_to_rmv) or (frm.pt1_name in pts_to_rmv):
-                if pt_map[frm.pt0_name]<pt_map[frm.pt1_name]:
-                    frm.pt0_name=pt_map[frm.pt0_name]
-                    frm.pt1_name=pt_map[frm.pt1_name]
-                    frm.order='01'
-                    self.session.add(frm)
-                elif pt_map[frm.pt0_name]>pt_map[frm.pt1_name]:
-                    frm.pt0_name=pt_map[frm.pt1_name]
-                    frm.pt1_name=pt_map[frm.pt0_name]
-                    frm.order='10'  
-                    self.session.add(frm)
-                else:
-                    self.session.delete(frm)
-                
-        for area in areas:
-            area.pt0_name=pt_map[area.pt0_name]
-            area.pt1_name=pt_map[area.pt1_name]
-            area.pt2_name=pt_map[area.pt2_name]
-            area.pt3_name=pt_map[area.pt3_name]
-            self.session.add(area)       
-
-        for pt in pts_to_rmv:
-            self.session.delete(pt) 
-                
-        self.session.flush()
-        pts=self.session.query(Point).all()
-        logger.info('merge elements %d'%len(pts))
+        pt_map=_merge_coincident(self,tol*scale['L'])
+        logger.info('%d points merged'%len(pt_map))
         return True
     except Exception as e:
         logger.info(str(e))
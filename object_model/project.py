@@ -116,6 +116,7 @@ def set_unit(self,unit):
         config=self.session.query(Config).first()
         config.unit=unit
         self.session.add(config)
+        self.clear_config_cache()
         return True
     except Exception as e:
         logger.info(str(e))
@@ -155,6 +156,7 @@ def set_tolerance(self,tol):
         config=self.session.query(Config).first()
         config.tolerance=tol*scale['L']
         self.session.add(config)
+        self.clear_config_cache()
         return True
     except Exception as e:
         logger.info(str(e))
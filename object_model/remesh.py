@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 22:04:51 2026
+
+@author: HZJ
+"""
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.sql import text
+
+from .orm import Point,Frame,Area,Material,IsotropicElastic,FrameSection,AreaSection,PointRestraint
+from .db import _chunks
+import logger
+
+def _logged(self):
+    """
+    return:
+        True if the changes are logged, see db._change_log.
+    """
+    sql="SELECT count(*) FROM sqlite_temp_master WHERE type='table' AND name='changes'"
+    return self.session.execute(text(sql)).scalar()>0
+
+def get_changes(self):
+    """
+    return:
+        dict of table name and set of ids of points, frames, areas and
+        restrained points, or names of sections and materials, changed
+        since the last mesh, see db.TRACKED_TABLES. None if the changes are
+        not logged.
+    """
+    self.session.flush()
+    if not _logged(self):
+        return None
+    changes={}
+    for tbl,item in self.session.execute(text('SELECT tbl,item FROM changes')):
+        changes.setdefault(tbl,set()).add(item)
+    return changes
+
+def clear_changes(self):
+    """
+    Forget the logged changes, called once the FE model is meshed.
+    """
+    if _logged(self):
+        self.session.execute(text('DELETE FROM changes'))
+
+def _needs_full_mesh(self,changes):
+    """
+    return:
+        str, the reason why the changes cannot be patched, or None.
+    """
+    query=self.session.query
+    fe=self.fe_model
+    if fe.storage!='array' or fe.matrix_format=='ebe' or fe.scratch is not None:
+        return 'the FE model cannot be patched'
+    if changes.get('areas'):
+        return 'areas are changed'
+    points=changes.get('points',set())
+    for part in _chunks(points):
+        if any(i in self.pn_map for i in part) and \
+           query(Area).filter(or_(Area.pt0_id.in_(part),Area.pt1_id.in_(part),
+                                  Area.pt2_id.in_(part),Area.pt3_id.in_(part))).count()>0:
+            return 'points of areas are changed'
+        existing=set(i for i, in query(Point.id).filter(Point.id.in_(part)))
+        if any(i in self.pn_map and i not in existing for i in part):
+            return 'points are deleted'
+    sections=set(changes.get('area_sections',set()))
+    materials=changes.get('materials',set())|changes.get('isotropic_elastics',set())
+    for part in _chunks(materials):
+        sections.update(name for name, in query(AreaSection.name).filter(AreaSection.material_name.in_(part)))
+    for part in _chunks(sections):
+        if query(Area).filter(Area.section_name.in_(part)).count()>0:
+            return 'sections of areas are changed'
+    return None
+
+def _changed_frames(self,changes):
+    """
+    return:
+        set of ids of frames to be meshed again, the changed ones and the
+        ones on changed points, sections and materials.
+    """
+    query=self.session.query
+    frames=set(changes.get('frames',set()))
+    for part in _chunks(changes.get('points',set())):
+        frames.update(i for i, in query(Frame.id).filter(
+                or_(Frame.pt0_id.in_(part),Frame.pt1_id.in_(part))))
+    sections=set(changes.get('frame_sections',set()))
+    materials=changes.get('materials',set())|changes.get('isotropic_elastics',set())
+    for part in _chunks(materials):
+        sections.update(name for name, in query(FrameSection.name).filter(FrameSection.material_name.in_(part)))
+    for part in _chunks(sections):
+        frames.update(i for i, in query(Frame.id).filter(Frame.section_name.in_(part)))
+    return frames
+
+def remesh(self):
+    """
+    Patch the changes logged since the last mesh into the FE model. Added
+    and moved points, frames, frame sections, materials and restraints are
+    handled, only the beams affected are formed again and their changes are
+    added into the assembled K and M. Changes of areas and deleted points
+    need a full mesh.
+
+    return:
+        status of success, False if the model has to be meshed again.
+    """
+    changes=self.get_changes()
+    if changes is None or not self.fe_model.is_assembled:
+        return False
+    if changes=={}:
+        return True
+    reason=_needs_full_mesh(self,changes)
+    if reason is not None:
+        logger.info('Model has to be meshed again, %s.'%reason)
+        return False
+    query=self.session.query
+    fe=self.fe_model
+
+    #nodes
+    rows=[]
+    for part in _chunks(changes.get('points',set())):
+        rows+=query(Point.id,Point.x,Point.y,Point.z).filter(Point.id.in_(part)).all()
+    added=[r for r in rows if r[0] not in self.pn_map]
+    moved=[r for r in rows if r[0] in self.pn_map]
+    if added!=[]:
+        hids=fe.add_nodes([r[1:] for r in added])
+        self.pn_map.update(zip([r[0] for r in added],hids.tolist()))
+    if moved!=[]:
+        fe.move_nodes([self.pn_map[r[0]] for r in moved],[r[1:] for r in moved])
+
+    #beams
+    ids=_changed_frames(self,changes)
+    rows=[]
+    for part in _chunks(ids):
+        res=query(Frame.id,Frame.order,Frame.pt0_id,Frame.pt1_id,
+                  IsotropicElastic.E,IsotropicElastic.mu,FrameSection.A,FrameSection.I2,FrameSection.I3,FrameSection.J,Material.rho
+                  ).join(FrameSection,Frame.section_name==FrameSection.name
+                  ).join(Material,FrameSection.material_name==Material.name
+                  ).join(IsotropicElastic,IsotropicElastic.material_name==Material.name
+                  ).filter(Frame.id.in_(part)).all()
+        if len(res)!=query(Frame).filter(Frame.id.in_(part)).count():
+            raise Exception('Frames without section or elastic material cannot be meshed.')
+        rows+=res
+    existing=set(r[0] for r in rows)
+    removed=[i for i in ids if i in self.fb_map and i not in existing]
+    if removed!=[]:
+        fe.remove_beams([hid for i in removed for hid in self.fb_map.pop(i)])
+    conn=np.array([[self.pn_map[r[2]],self.pn_map[r[3]]] if r[1]!='10' else
+                    [self.pn_map[r[3]],self.pn_map[r[2]]] for r in rows],dtype=int).reshape((-1,2))
+    prop=np.array([r[4:] for r in rows],dtype=float).reshape((-1,7))
+    old=np.array([r[0] in self.fb_map for r in rows],dtype=bool)
+    if old.any():
+        fe.update_beams([self.fb_map[r[0]][0] for r in rows if r[0] in self.fb_map],conn[old],prop[old])
+    if (~old).any():
+        hids=fe.add_beams(conn[~old],prop[~old])
+        self.fb_map.update((r[0],[hid]) for r,hid in zip([r for r in rows if r[0] not in self.fb_map],hids.tolist()))
+
+    #restraints
+    points=changes.get('point_restraints',set())
+    restraints=dict((i,[None]*6) for i in points if i in self.pn_map)
+    for part in _chunks(restraints.keys()):
+        for r in query(PointRestraint.point_id,PointRestraint.u1,PointRestraint.u2,PointRestraint.u3,
+                       PointRestraint.r1,PointRestraint.r2,PointRestraint.r3).filter(PointRestraint.point_id.in_(part)):
+            restraints[r[0]]=[0 if res else None for res in r[1:]]
+    for i,disp in restraints.items():
+        fe.set_node_displacement(self.pn_map[i],disp)
+
+    self.clear_changes()
+    #the snapshot is only taken of a full mesh
+    self.mesh_arrays=None
+    logger.info('Model remeshed incrementally: %d nodes added, %d moved, %d beams formed again, %d removed, %d restraints.'%(
+            len(added),len(moved),len(rows),len(removed),len(restraints)))
+    return True
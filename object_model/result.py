@@ -5,7 +5,9 @@ Created on Thu Mar 29 10:22:39 2018
 @author: Dell
 """
 
-from .orm import ResultPointDisplacement,ResultPointReaction,ResultFrameForce,ResultModalPeriod
+from .orm import Point,Frame,Area,\
+ResultPointDisplacement,ResultPointReaction,ResultFrameForce,ResultAreaStress,ResultModalPeriod
+from .db import _id_of
 
 def get_result_point_displacement(self,name,loadcase):
     """
@@ -16,13 +18,12 @@ def get_result_point_displacement(self,name,loadcase):
         loadcase: str, name of loadcase
     return: list of float, displacement u1,u2,u3,r1,r2,r3
     """
-    res=self.session.query(ResultPointDisplacement).filter_by(point_name=name,loadcase_name=loadcase).first()
+    res=self.session.query(ResultPointDisplacement).filter_by(point_id=_id_of(self,Point,name),loadcase_name=loadcase).first()
     if res==None:
         return None
     else:
-        scale=self.scale()
-        return [res.u1/scale['L'],res.u2/scale['L'],res.u3/scale['L'],
-                res.r1,res.r2,res.r3]
+        return self.from_si([res.u1,res.u2,res.u3,res.r1,res.r2,res.r3],
+                            L=[1,1,1,0,0,0]).tolist()
         
 def get_result_point_reaction(self,name,loadcase):
     """
@@ -33,13 +34,12 @@ def get_result_point_reaction(self,name,loadcase):
         loadcase: str, name of loadcase
     return: list of float, reaction in u1,u2,u3,r1,r2,r3
     """
-    res=self.session.query(ResultPointReaction).filter_by(point_name=name,loadcase_name=loadcase).first()
+    res=self.session.query(ResultPointReaction).filter_by(point_id=_id_of(self,Point,name),loadcase_name=loadcase).first()
     if res==None:
         return None
     else:
-        scale=self.scale()
-        return [res.p1/scale['F'],res.p2/scale['F'],res.p3/scale['F'],
-                res.m1/scale['F']/scale['L'],res.m2/scale['F']/scale['L'],res.m3/scale['F']/scale['L']]
+        return self.from_si([res.p1,res.p2,res.p3,res.m1,res.m2,res.m3],
+                            F=1,L=[0,0,0,1,1,1]).tolist()
         
 def get_result_frame_force(self,name,loadcase):
     """
@@ -50,18 +50,28 @@ def get_result_frame_force(self,name,loadcase):
         loadcase: str, name of loadcase
     return: list of float, forces in both ends.
     """
-    reses=self.session.query(ResultFrameForce).filter_by(frame_name=name,loadcase_name=loadcase).all()
+    reses=self.session.query(ResultFrameForce).filter_by(frame_id=_id_of(self,Frame,name),loadcase_name=loadcase).all()
     if len(reses)==0:
         return None
     else:
-        scale=self.scale()
-        forces=[]
-        for res in reses:
-            forces.append([res.p01/scale['F'],res.p02/scale['F'],res.p03/scale['F'],
-                           res.m01/scale['F']/scale['L'],res.m02/scale['F']/scale['L'],res.m03/scale['F']/scale['L'],
-                           res.p11/scale['F'],res.p12/scale['F'],res.p13/scale['F'],
-                           res.m11/scale['F']/scale['L'],res.m12/scale['F']/scale['L'],res.m13/scale['F']/scale['L']])
-        return forces
+        forces=[[res.p01,res.p02,res.p03,res.m01,res.m02,res.m03,
+                 res.p11,res.p12,res.p13,res.m11,res.m12,res.m13] for res in reses]
+        return self.from_si(forces,F=1,L=[0,0,0,1,1,1]*2).tolist()
+    
+def get_result_area_stress(self,name,loadcase):
+    """
+    Get the result in the database.
+    
+    params:
+        name: str, name of area
+        loadcase: str, name of loadcase
+    return: list of float, mean membrane stress s11,s22,s12 in local csys.
+    """
+    res=self.session.query(ResultAreaStress).filter_by(area_id=_id_of(self,Area,name),loadcase_name=loadcase).first()
+    if res==None:
+        return None
+    else:
+        return self.from_si([res.s11,res.s22,res.s12],F=1,L=-2).tolist()
     
 def get_result_period(self,loadcase,order='all'):
     """
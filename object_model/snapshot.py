@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:26:08 2026
+
+@author: HZJ
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+from sqlalchemy.sql import text
+
+import logger
+
+#tables the mesh and the assembled matrices depend on
+MESH_TABLES=['points','frames','areas','frame_sections','area_sections',
+             'materials','isotropic_elastics','point_restraints']
+
+#arrays of the mesh kept in the snapshot, see Model._mesh_arrays
+MESH_ARRAYS=['point_ids','xyz','frame_ids','beam_conn','beam_prop',
+             'area3_ids','membrane3_conn','membrane3_prop',
+             'area4_ids','membrane4_conn','membrane4_prop',
+             'restraint_nodes','restraints']
+
+def content_hash(self):
+    """
+    return:
+        str, sha1 of the rows of the tables the FE model depends on.
+    """
+    self.session.flush()
+    h=hashlib.sha1()
+    for table in MESH_TABLES:
+        h.update(table.encode())
+        for row in self.session.execute(text('SELECT * FROM %s ORDER BY rowid'%table)):
+            h.update(repr(tuple(row)).encode())
+    return h.hexdigest()
+
+def save_snapshot(self,digest):
+    """
+    Save the mesh arrays, the assembled K and M and the solver information
+    of the last solution next to the database.
+
+    params:
+        digest: str, content hash of the model the FE model was meshed from.
+    return:
+        status of success.
+    """
+    path=self.snapshot_path()
+    if path is None or self.mesh_arrays is None or self.fe_model.matrix_format=='ebe':
+        return False
+    try:
+        arrays=dict(self.mesh_arrays)
+        arrays['hash']=np.array(digest)
+        arrays['solve_info']=np.array(json.dumps(self.fe_model.solve_info,default=float))
+        self.fe_model.save_matrices(path,**arrays)
+        logger.info('FE model snapshot saved to %s'%path)
+        return True
+    except Exception as e:
+        logger.info(str(e))
+        return False
+
+def load_snapshot(self,digest):
+    """
+    Restore the FE model from the snapshot if it was made from the same
+    content, meshing and assembly are skipped then.
+
+    params:
+        digest: str, content hash of the model.
+    return:
+        status of success.
+    """
+    path=self.snapshot_path()
+    if path is None or not os.path.exists(path) or self.fe_model.node_count>0:
+        return False
+    try:
+        with np.load(path) as arrays:
+            if str(arrays['hash'])!=digest or arrays['shape'][0]!=arrays['xyz'].shape[0]*6:
+                logger.info('FE model snapshot is out of date.')
+                return False
+            mesh=dict((name,arrays[name]) for name in MESH_ARRAYS)
+            info=json.loads(str(arrays['solve_info']))
+        self._build_fe(mesh)
+        self.fe_model.load_matrices(path)
+        self.fe_model.solve_info=info
+        self.mesh_arrays=mesh
+        logger.info('FE model restored from %s'%path)
+        return True
+    except Exception as e:
+        logger.info(str(e))
+        return False
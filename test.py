@@ -93,17 +93,104 @@ def simply_released_beam_test():
     model.set_node_restraint(2,[True]*6)
     model.set_node_restraint(0,[True]*6)
     
-    model.set_beam_releases(0,[True]*6,[False]*6)
-    model.set_beam_releases(1,[False]*6,[True]*6)
+    #bending moments released at the supports, the two beams work as one
+    #simply supported beam with torsion and axial force held by the supports
+    model.set_beam_releases(0,[False]*4+[True]*2,[False]*6)
+    model.set_beam_releases(1,[False]*6,[False]*4+[True]*2)
     
     model.assemble_KM()
     model.assemble_f()
     model.assemble_boundary()
     solve_linear(model)
     print(np.round(model.d_,6))
-    print("The result of node 1 should be about [0.00445,0.00890,-0.02296,-0.01930,-0.03860,-0.01930]")
-   
-simply_released_beam_test()
+    print("The result of node 1 should be about [0.00376,0.00753,-0.01954,0,0,0]")
+    
+    #load in local csys, axial part taken by both halves, transverse part 
+    #by bending of the whole span
+    l=np.sqrt(1.5)
+    V=model._transform_stack('beam')[0]
+    p=V.dot([0,0,-1e6])
+    d=V.T.dot([p[0]*l/(2*E*A),p[1]*(2*l)**3/(48*E*I3),p[2]*(2*l)**3/(48*E*I2)])
+    assert np.allclose(model.d_[6:9].reshape(3),d,rtol=1e-8)
+    assert np.allclose(model.d_[9:12],0,atol=1e-12)
+
+def _condense_reference(Ke,Me,re,released):
+    """
+    Condensation of one element, released DOFs are eliminated one by one.
+    """
+    K=Ke.copy()
+    r=re.copy()
+    for n in np.nonzero(released)[0]:
+        if abs(K[n,n])<1e-12*np.abs(K).max():
+            continue
+        r-=K[:,n]*r[n]/K[n,n]
+        K-=np.outer(K[:,n],K[n,:])/K[n,n]
+    b=np.nonzero(released)[0]
+    a=np.nonzero(~released)[0]
+    T=np.zeros((12,12))
+    T[a,a]=1
+    T[b[:,None],a]=-np.linalg.solve(Ke[b[:,None],b],Ke[b[:,None],a])
+    K[b,:]=K[:,b]=0
+    r[b]=0
+    return K,T.T.dot(Me).dot(T),r
+
+def condense_batch_test():
+    from fe_model.element import beam_stiffness,beam_mass,condense_batch
+    rng=np.random.RandomState(0)
+    sections=[(1.999e11,0.3,4.265e-3,3.301e-6,6.572e-5,9.651e-8,7849.0474,1.5),
+              (2e11,0.3,0.013,2.675e-5,3.435e-4,1.321e-6,7849,5.),
+              (3e10,0.2,0.12,9e-4,1.6e-3,2.1e-3,2500,3.2)]
+    Ke=np.array([beam_stiffness(*sec[:6],sec[7]).toarray() for sec in sections])
+    Me=np.array([beam_mass(sec[2],sec[5],sec[6],sec[7],'coor').toarray() for sec in sections])
+    re=rng.rand(len(sections),12)
+    patterns=[[False]*5+[True]+[False]*6,
+              [False]*4+[True]*2+[False]*6,
+              [False]*4+[True]*2+[False]*4+[True]*2,
+              [True]+[False]*11,
+              [False]*3+[True]+[False]*8,
+              [False]*6+[False]*3+[True]*3]
+    for released in patterns:
+        released=np.array(released)
+        Ke_,Me_,re_=condense_batch(Ke,Me,re,released)
+        for i in range(len(sections)):
+            K,M,r=_condense_reference(Ke[i],Me[i],re[i],released)
+            assert np.allclose(Ke_[i],K,rtol=1e-9,atol=1e-9*np.abs(K).max())
+            assert np.allclose(Me_[i],M,rtol=1e-9,atol=1e-9*np.abs(M).max())
+            assert np.allclose(re_[i],r,rtol=1e-9,atol=1e-12)
+    print("condense_batch agrees with condensation of single elements")
+
+def array_storage_test():
+    #FEModel Test
+    results=[]
+    for storage in ['object','array']:
+        model=FEModel(storage=storage)
+        model.add_node(0,0,0)
+        model.add_node(2,1,1)
+        E=1.999e11
+        mu=0.3
+        A=4.265e-3
+        J=9.651e-8
+        I3=6.572e-5
+        I2=3.301e-6
+        rho=7849.0474
+        
+        model.add_beam(0,1,E,mu,A,I2,I3,J,rho)
+        model.set_node_force(1,(0,0,-1e6,0,0,0))
+        model.set_node_restraint(0,[True]*6)
+        #fixed end forces of a uniform load along local 2-axis
+        l=model.beams[0].length
+        q=-1e4
+        model.beams[0].re=[0,-q*l/2,0,0,0,-q*l**2/12,0,-q*l/2,0,0,0,q*l**2/12]
+        model.assemble_KM()
+        model.assemble_f()
+        model.assemble_boundary()
+        solve_linear(model)
+        results.append((model.d_,model.resolve_beam_force(0)))
+    print(np.round(results[0][0]-results[1][0],6))
+    print("The difference between object and array storage should be 0")
+    assert np.allclose(results[0][0],results[1][0],rtol=1e-10,atol=1e-14)
+    assert np.allclose(results[0][1],results[1][1],rtol=1e-10,atol=1e-6)
+    assert np.abs(results[0][0]).max()>0
 
 def planar_frame_test():
     #FEModel Test
@@ -250,7 +337,24 @@ def Membrane4_contruction_test():
     
     m=Membrane4(n1,n2,n3,n4,0.001,2e11,0.2,7845)
     
-    print(m._Ke)
+    K=m.Ke.toarray()
+    assert K.shape==(24,24)
+    assert np.allclose(K,K.T)
+    #only in-plane DOFs have stiffness, 3 of them are rigid body modes
+    assert np.allclose(K[:,[2,3,4,5,8,9,10,11,14,15,16,17,20,21,22,23]],0)
+    assert np.linalg.matrix_rank(K)==5
+    u=np.zeros(24)
+    u[[1,7,13,19]]=1 #translation in y
+    assert np.allclose(K.dot(u),0,atol=1e-6*np.abs(K).max())
+    x=np.asarray(m._x2D).reshape((4,2)) #rotation about local z
+    u=np.zeros(24)
+    u[[0,6,12,18]]=-x[:,1]
+    u[[1,7,13,19]]=x[:,0]
+    assert np.allclose(K.dot(u),0,atol=1e-6*np.abs(K).max())
+    #uniform strain 1 along local x, strain energy is E/(1-mu^2)*t*area/2
+    u=np.zeros(24)
+    u[[0,6,12,18]]=x[:,0]
+    assert np.isclose(u.dot(K).dot(u)/2,2e11/(1-0.2**2)*0.001/2)
     
 def shear_test4():
     model=FEModel()
@@ -323,4 +427,676 @@ def pseudo_cantilever_test4(l=25,h=5):
 
     np.set_printoptions(precision=6,suppress=True)
     print(res[(l+1)*(h+1)*6-6:])
-    print(r"correct answer should be ???")
\ No newline at end of file
+    print(r"correct answer should be ???")
+def membrane_stress_test():
+    """
+    A 2x1 strip of quads in tension, stress should be uniform.
+    """
+    model=FEModel()
+    for z in [0,1]:
+        for x in [0,1,2]:
+            model.add_node(x,0,z)
+    model.add_membrane4(0,1,4,3,0.1,2e11,0.3,7849)
+    model.add_membrane4(1,2,5,4,0.1,2e11,0.3,7849)
+    for i in range(6):
+        model.set_node_displacement(i,[None,0,None,0,0,0])
+    model.set_node_displacement(0,[0,0,0,0,0,0])
+    model.set_node_displacement(3,[0,0,None,0,0,0])
+    model.set_node_force(2,(50000,0,0,0,0,0))
+    model.set_node_force(5,(50000,0,0,0,0,0))
+    model.assemble_KM()
+    model.assemble_f()
+    model.assemble_boundary()
+    solve_linear(model)
+
+    np.set_printoptions(precision=6,suppress=True)
+    stresses=model.resolve_membrane_stresses('membrane4')
+    nodal=model.resolve_membrane_nodal_stresses()
+    print(stresses)
+    print(nodal)
+    print(r"correct answer should be 1e6 along the strip and 0 otherwise")
+    #local x of the quads is along edge 0-1, the strip is along local y
+    assert stresses.shape==(2,4,3)
+    assert nodal.shape==(6,3)
+    for s in (stresses.reshape((-1,3)),nodal):
+        assert np.allclose(s,[0,1e6,0],atol=1e-3)
+
+"""
+Storage and solver tests
+"""
+def frame_model(fmt='full',n=3,storeys=2,storage='object',scratch=None):
+    """
+    3D frame of nxn columns with beams along both directions and a 
+    membrane wall in the first bay, lateral loads at the top.
+    """
+    model=FEModel(storage=storage)
+    model.scratch=scratch
+    E=2e11
+    mu=0.3
+    rho=7849
+    col=(E,mu,0.013,2.675e-5,3.435e-4,1.321e-6,rho)
+    bm=(E,mu,4.265e-3,3.301e-6,6.572e-5,9.651e-8,rho)
+    idx={}
+    for k in range(storeys+1):
+        for j in range(n):
+            for i in range(n):
+                idx[i,j,k]=model.add_node(5.*i,4.*j,3.*k)
+    for k in range(storeys):
+        for j in range(n):
+            for i in range(n):
+                model.add_beam(idx[i,j,k],idx[i,j,k+1],*col)
+    for k in range(1,storeys+1):
+        for j in range(n):
+            for i in range(n-1):
+                model.add_beam(idx[i,j,k],idx[i+1,j,k],*bm)
+        for j in range(n-1):
+            for i in range(n):
+                model.add_beam(idx[i,j,k],idx[i,j+1,k],*bm)
+    for k in range(storeys):
+        model.add_membrane4(idx[0,0,k],idx[1,0,k],idx[1,0,k+1],idx[0,0,k+1],0.2,3e10,0.2,2500)
+    for j in range(n):
+        for i in range(n):
+            model.set_node_restraint(idx[i,j,0],[True]*6)
+            model.set_node_force(idx[i,j,storeys],(1e5,2e4*i,-5e4,0,0,1e3*j))
+    model.assemble_KM(fmt)
+    model.assemble_f()
+    model.assemble_boundary()
+    return model
+
+def storage_format_test():
+    from fe_model.symmetric import as_full,matvec
+    base=frame_model('full')
+    solve_linear(base,method='direct')
+    K=base.K.toarray()
+    M=base.M.toarray()
+    x=np.random.RandomState(0).rand(K.shape[0])
+    for fmt in ('triu','bsr','ebe'):
+        model=frame_model(fmt)
+        assert model.matrix_format==fmt
+        if fmt!='ebe':
+            assert np.allclose(as_full(model.K,fmt).toarray(),K)
+            assert np.allclose(as_full(model.M,fmt).toarray(),M)
+        assert np.allclose(matvec(model.K,x,fmt),K.dot(x))
+        assert np.allclose(matvec(model.M,x,fmt),M.dot(x))
+        solve_linear(model,method='cg',precond='jacobi',tol=1e-12)
+        assert model.solve_info['converged']
+        assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    print("Matrices and displacements of all the storage formats agree with full storage")
+
+def iterative_solver_test():
+    base=frame_model()
+    solve_linear(base,method='direct')
+    for method,precond in [('cg','jacobi'),('cg','block_jacobi'),('cg','ic'),('lgmres','block_jacobi')]:
+        model=frame_model()
+        solve_linear(model,method=method,precond=precond,tol=1e-12)
+        assert model.solve_info['converged'] and not model.solve_info['fallback']
+        assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    #cg without preconditioner stalls, it is solved again by LU factorization
+    model=frame_model()
+    solve_linear(model,method='cg',precond=None,tol=1e-12)
+    assert model.solve_info['converged'] and model.solve_info['fallback']
+    assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    #a mechanism cannot be solved
+    model=FEModel()
+    model.add_node(0,0,0)
+    model.add_node(1,0,0)
+    model.add_node(2,0,0)
+    model.add_beam(0,1,2e11,0.3,4.265e-3,3.301e-6,6.572e-5,9.651e-8,7849)
+    model.add_beam(1,2,2e11,0.3,4.265e-3,3.301e-6,6.572e-5,9.651e-8,7849)
+    model.set_node_restraint(0,[True]*6)
+    model.set_node_restraint(2,[True]*6)
+    model.set_beam_releases(0,[True]*6,[False]*6)
+    model.set_beam_releases(1,[False]*6,[True]*6)
+    model.set_node_force(1,(0,0,-1e6,0,0,0))
+    model.assemble_KM()
+    model.assemble_f()
+    model.assemble_boundary()
+    try:
+        solve_linear(model)
+    except Exception:
+        assert not model.is_solved
+    else:
+        raise AssertionError('a mechanism should not be solved')
+    print("Iterative solvers agree with the direct solver")
+
+def mixed_precision_test():
+    base=frame_model()
+    solve_linear(base,method='direct',tol=1e-12)
+    model=frame_model()
+    solve_linear(model,method='mixed',tol=1e-12)
+    assert model.solve_info['converged'] and model.solve_info['residual']<=1e-12
+    #float32 factors are refined to double precision
+    assert model.solve_info['iterations']>0
+    assert model.solve_info['factor_bytes']<0.6*base.solve_info['factor_bytes']
+    assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    print("Mixed precision solve agrees with the direct solver")
+
+def on_file(a):
+    """
+    True if the array is a view of a memory-mapped array.
+    """
+    while a is not None and not isinstance(a,np.memmap):
+        a=a.base
+    return a is not None
+
+def out_of_core_test():
+    import os
+    from fe_model.out_of_core import Scratch
+    base=frame_model(storage='array')
+    solve_linear(base,method='direct')
+    scratch=Scratch(chunk=100)
+    path=scratch.path
+    #the iterative solver reads the matrices on the files
+    for fmt in ('full','triu','bsr'):
+        for method in ('direct','cg'):
+            model=frame_model(fmt,storage='array',scratch=scratch)
+            assert on_file(model.K.data) and on_file(model.K.indices) and on_file(model.K_.data)
+            solve_linear(model,method=method)
+            assert model.solve_info['converged'] and not model.solve_info['fallback']
+            assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    assert scratch.nbytes>0 and len(os.listdir(path))>0
+    #temporary directory is removed with the scratch
+    del model
+    scratch.close()
+    assert not os.path.exists(path)
+    print("Out-of-core solve agrees with in-core solve")
+
+def substructure_test():
+    import fe_solver.substructure as ss
+    from fe_solver.substructure import solve_substructured,clear_superelement_cache
+    base=frame_model(storeys=5)
+    for i in range(18,27):
+        base.set_node_force(i,(0,1e4,-2e4,0,0,0),append=True)
+    base.assemble_f()
+    base.assemble_boundary(mode='f')
+    model=frame_model(storeys=5)
+    for i in range(18,27):
+        model.set_node_force(i,(0,1e4,-2e4,0,0,0),append=True)
+    model.assemble_f()
+    model.assemble_boundary(mode='f')
+    solve_linear(base,method='direct')
+    #the 2nd and the 4th floors are identical interiors
+    clear_superelement_cache()
+    solve_substructured(model,[range(18,27),range(36,45)],workers=1)
+    assert model.solve_info['converged'] and model.solve_info['residual']<=1e-10
+    assert model.solve_info['superelements']==1 and model.solve_info['reused']==1
+    assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    #the cache is bounded, dropped superelements stay valid for their owner
+    size=ss.SUPERELEMENT_CACHE_SIZE
+    ss.SUPERELEMENT_CACHE_SIZE=1
+    try:
+        clear_superelement_cache()
+        sub=solve_substructured(model,[range(27,36),range(45,54)],workers=1)
+        assert model.solve_info['superelements']==2
+        assert ss.superelement_cache_info()['size']==1
+        assert np.allclose(sub.recover(),base.d_.reshape(-1),rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    finally:
+        ss.SUPERELEMENT_CACHE_SIZE=size
+    print("Substructuring agrees with the direct solver")
+
+def reduction_test():
+    from fe_solver.reduction import GuyanReduction
+    model=frame_model()
+    K=model.K_.toarray()
+    M=model.M_.toarray()
+    #translations of the floors as masters
+    masters=np.array([i*6+j for i in range(9,27) for j in range(3)])
+    slaves=np.setdiff1d(np.arange(K.shape[0]),masters)
+    red=GuyanReduction(model,masters)
+    X=-np.linalg.solve(K[slaves][:,slaves],K[slaves][:,masters])
+    T=np.zeros((K.shape[0],masters.shape[0]))
+    T[masters,np.arange(masters.shape[0])]=1
+    T[slaves]=X
+    assert np.allclose(red.K_.toarray(),T.T.dot(K).dot(T),rtol=1e-8,atol=1e-8*np.abs(K).max())
+    assert np.allclose(red.M_.toarray(),T.T.dot(M).dot(T),rtol=1e-8,atol=1e-8*np.abs(M).max())
+    #static condensation is exact for loads on masters
+    f_=np.zeros(K.shape[0])
+    f_[masters]=model.f_.toarray().reshape(-1)[masters]
+    d0=np.linalg.solve(K,f_)
+    d=red.expand(np.linalg.solve(red.K_.toarray(),red.reduce(f_)))
+    assert np.allclose(d,d0,rtol=1e-8,atol=1e-8*np.abs(d0).max())
+    try:
+        GuyanReduction(frame_model('ebe'),masters)
+    except Exception as e:
+        assert 'ebe' in str(e)
+    else:
+        raise AssertionError('a matrix-free model should not be condensed')
+    print("Guyan reduction agrees with the dense projection")
+
+"""
+Object model tests
+"""
+_tmp=None
+
+def model_path(name):
+    """
+    Path of a model file in a new directory, all of them are removed at exit.
+    """
+    import os,tempfile
+    global _tmp
+    if _tmp is None:
+        _tmp=tempfile.TemporaryDirectory()
+    return os.path.join(tempfile.mkdtemp(dir=_tmp.name),name)
+
+def object_model_fixture(path,n=3,storeys=2):
+    """
+    Object model of a frame of (n+1)x(n+1) columns with a slab in the first
+    bay, restrained at the base and loaded at the top, saved to path.
+    """
+    import os
+    from object_model.model import Model
+    for f in (path,path[:-4]+'.fe.npz'):
+        if os.path.exists(f):
+            os.remove(f)
+    model=Model()
+    model.open(path)
+    model.set_unit('N_m_C')
+    model.add_material('Q345B',7849,'isotropic_elastic',E=2e11,mu=0.3)
+    model.add_frame_section('BIG','Q345B','I',[0.6,0.3,0.02,0.03])
+    model.add_area_section('M100','Q345B','m',0.1)
+    model.add_loadcase('L1','static-linear',1.)
+    x,y,z=np.meshgrid(np.arange(n+1.),np.arange(n+1.),np.arange(storeys+1.),indexing='ij')
+    coors=np.stack([x.ravel(),y.ravel(),z.ravel()],axis=1)
+    idx=np.arange(x.size).reshape(x.shape)
+    conn=np.vstack([np.stack([idx[:-1,:,1:].ravel(),idx[1:,:,1:].ravel()],axis=1),
+                    np.stack([idx[:,:-1,1:].ravel(),idx[:,1:,1:].ravel()],axis=1),
+                    np.stack([idx[:,:,:-1].ravel(),idx[:,:,1:].ravel()],axis=1)])
+    model.add_frames(coors,conn,model.get_frame_section_names()[0])
+    model.add_area_batch([((0,0,1),(1,0,1),(1,1,1),(0,1,1))],'M100')
+    for pt in model.get_point_name_by_coor(z=0):
+        model.set_point_restraint(pt,[True]*6)
+    for pt in model.get_point_name_by_coor(z=storeys):
+        model.set_point_load(pt,'L1',[1e4,2e3,-5e3,0,0,0])
+    model.session.commit()
+    model.save()
+    return model
+
+def object_model_counts(model):
+    from sqlalchemy.sql import text
+    return dict((t,model.session.execute(text('SELECT count(*) FROM %s'%t)).scalar()) 
+                for t in ('points','frames','areas','point_restraints','pointloads'))
+
+def save_test():
+    import os,sqlite3
+    from object_model.model import Model
+    path=model_path('save.mdo')
+    model=object_model_fixture(path)
+    counts=object_model_counts(model)
+    model.close()
+    assert sorted(os.listdir(os.path.dirname(path)))==['save.mdo']
+    conn=sqlite3.connect(path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0]=='delete'
+    conn.close()
+    model=Model()
+    model.open(path)
+    assert object_model_counts(model)==counts
+    model.close()
+    print("Saved model is a single file and is opened again")
+
+def merge_points_test():
+    from object_model.model import Model
+    from object_model.orm import Point,Frame,Area,PointRestraint,PointLoad
+    model=Model()
+    model.open(model_path('merge.mdo'))
+    model.set_unit('N_m_C')
+    model.add_material('Q345B',7849,'isotropic_elastic',E=2e11,mu=0.3)
+    S=model.get_frame_section_names()[0]
+    model.add_area_section('M100','Q345B','m',0.1)
+    model.add_loadcase('L1','static-linear',1.)
+    model.add_frame((0,0,0),(1,0,0),S)
+    model.add_frame((1.004,0,0),(2,0,0),S)
+    model.add_frame((1,0,0),(1.004,0,0),S)
+    model.add_frame((2,0,0),(2,0,1),S)
+    model.add_frame((0,0,0),(0,0,1),S)
+    model.add_frame((0,0,1),(2,0,1),S)
+    model.add_area((0,0,1),(1,0,1),(1.004,0,1),(0,1,1),'M100')
+    model.add_area((0,0,1),(2,0,1),(2,1,1),(0,1,1),'M100')
+    model.set_point_restraint(model.get_point_name_by_coor(0,0,0)[0],[True]*6)
+    model.set_point_restraint(model.get_point_name_by_coor(2,0,0)[0],[True]*6)
+    kept=model.get_point_name_by_coor(1,0,0)[0]
+    merged=model.get_point_name_by_coor(1.004,0,0)[0]
+    model.set_point_restraint(merged,[False,True,False,False,False,False])
+    model.set_point_load(kept,'L1',[0,0,-1e4,0,0,0])
+    model.set_point_load(merged,'L1',[0,0,-2e4,0,0,0])
+    model.session.commit()
+    session=model.session
+    kept_id=session.query(Point.id).filter_by(name=kept).scalar()
+    merged_id=session.query(Point.id).filter_by(name=merged).scalar()
+    n_points=len(model.get_point_names())
+    assert model.merge_points(0.01)
+    assert len(model.get_point_names())==n_points-2
+    assert merged not in model.get_point_names()
+    #the frame between the merged points and the area with merged corners are gone
+    assert session.query(Frame).count()==5
+    assert session.query(Area).count()==1
+    assert session.query(Frame).filter((Frame.pt0_id==merged_id)|(Frame.pt1_id==merged_id)).count()==0
+    assert session.query(Frame).filter((Frame.pt0_id==kept_id)|(Frame.pt1_id==kept_id)).count()==2
+    #records of the merged point move to the kept one unless it has them
+    assert [r.point_id for r in session.query(PointRestraint).filter_by(point_id=kept_id)]==[kept_id]
+    assert session.query(PointRestraint).filter_by(point_id=merged_id).count()==0
+    loads=session.query(PointLoad).filter((PointLoad.point_id==kept_id)|(PointLoad.point_id==merged_id)).all()
+    assert [(l.point_id,l.u3) for l in loads]==[(kept_id,-1e4)]
+    model.run(['L1'])
+    assert model.fe_model.is_solved
+    model.close()
+    print("Coincident points are merged with their restraints and loads")
+
+def _baseline_schema(path):
+    """
+    Bring a saved model back to the schema before the surrogate ids, names 
+    are the primary keys and the references, and there are no indexes, 
+    triggers nor R*Tree.
+    """
+    import re
+    import sqlite3
+    conn=sqlite3.connect(path)
+    for kind,name in conn.execute("""SELECT type,name FROM sqlite_master 
+                                  WHERE type IN ('trigger','index') AND name NOT LIKE 'sqlite_%'""").fetchall():
+        conn.execute('DROP %s "%s"'%(kind.upper(),name))
+    conn.execute('DROP TABLE point_index')
+    owners=('points','frames','areas')
+    tables=[r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    #the referring tables go first, so the referred ids are still there
+    tables=[t for t in tables if t not in owners]+['frames','areas','points']
+    for table in tables:
+        sql=conn.execute("SELECT sql FROM sqlite_master WHERE name=?",(table,)).fetchone()[0]
+        dst=[r[1] for r in conn.execute('PRAGMA table_info("%s")'%table) if r[1]!='id']
+        src=['"%s"'%c for c in dst]
+        for fk in conn.execute('PRAGMA foreign_key_list("%s")'%table).fetchall():
+            if fk[4]!='id':
+                continue
+            ref,col=fk[2],fk[3]
+            name=col[:-3]+'_name'
+            sql=re.sub(r'\b%s\b'%col,name,sql).replace('%s INTEGER'%name,'%s VARCHAR(32)'%name)
+            sql=sql.replace('FOREIGN KEY(%s) REFERENCES %s (id)'%(name,ref),'FOREIGN KEY(%s) REFERENCES %s (name)'%(name,ref))
+            i=dst.index(col)
+            dst[i]=name
+            src[i]='(SELECT name FROM "%s" WHERE id="%s_new"."%s")'%(ref,table,col)
+        if table in owners:
+            sql=sql.replace('\tid INTEGER NOT NULL, \n','').replace('PRIMARY KEY (id), \n\tUNIQUE (name)','PRIMARY KEY (name)')
+        elif dst==[r[1] for r in conn.execute('PRAGMA table_info("%s")'%table)]:
+            continue
+        conn.execute('ALTER TABLE "{0}" RENAME TO "{0}_new"'.format(table))
+        conn.execute(sql)
+        conn.execute('INSERT INTO "{0}" ({1}) SELECT {2} FROM "{0}_new" ORDER BY rowid'.format(
+                table,','.join('"%s"'%c for c in dst),','.join(src)))
+        conn.execute('DROP TABLE "%s_new"'%table)
+    conn.commit()
+    return conn
+
+def migration_test():
+    from sqlalchemy.sql import text
+    from object_model.model import Model
+    path=model_path('old.mdo')
+    model=object_model_fixture(path)
+    counts=object_model_counts(model)
+    model.close()
+    conn=_baseline_schema(path)
+    assert 'id' not in [r[1] for r in conn.execute('PRAGMA table_info(points)')]
+    assert 'pt0_name' in [r[1] for r in conn.execute('PRAGMA table_info(frames)')]
+    ends=conn.execute("""SELECT f.name,p0.x,p0.y,p0.z,p1.x,p1.y,p1.z FROM frames f 
+                      JOIN points p0 ON p0.name=f.pt0_name JOIN points p1 ON p1.name=f.pt1_name""").fetchall()
+    #rowids of the old file are not contiguous
+    conn.execute('DELETE FROM frames WHERE rowid IN (2,5)')
+    counts['frames']-=2
+    ends=[r for r in ends if r[0] in [n for n, in conn.execute('SELECT name FROM frames')]]
+    rowids={}
+    for table in ('points','frames','areas'):
+        rowids[table]=dict(conn.execute('SELECT name,rowid FROM %s'%table).fetchall())
+    conn.commit()
+    conn.close()
+    model=Model()
+    model.open(path)
+    assert object_model_counts(model)==counts
+    for table in ('points','frames','areas'):
+        ids=dict(model.session.execute(text('SELECT name,id FROM %s'%table)).fetchall())
+        assert ids==rowids[table]
+    #references by name are turned to the ids of the same points
+    assert sorted(model.session.execute(text("""SELECT f.name,p0.x,p0.y,p0.z,p1.x,p1.y,p1.z FROM frames f 
+        JOIN points p0 ON p0.id=f.pt0_id JOIN points p1 ON p1.id=f.pt1_id""")).fetchall())==sorted(ends)
+    indexes=[r[0] for r in model.session.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))]
+    assert 'ix_pointloads_loadcase' in indexes and 'ix_frames_ends' in indexes
+    #the migrated model works as a new one
+    assert model.get_point_name_by_coor(0,0,0)==[n for n,i in rowids['points'].items() if i==1]
+    model.run(['L1'])
+    assert model.fe_model.is_solved
+    model.close()
+    print("A model of the baseline schema is migrated with its rows and ids")
+
+def object_model_disps(model):
+    from sqlalchemy.sql import text
+    return np.array(model.session.execute(text("""SELECT p.x,p.y,p.z,d.u1,d.u2,d.u3,d.r1,d.r2,d.r3 
+        FROM result_point_displacement d JOIN points p ON p.id=d.point_id ORDER BY p.x,p.y,p.z""")).fetchall())
+
+def clear_results(model):
+    from sqlalchemy.sql import text
+    for table in ('result_point_displacement','result_point_reactions','result_area_stresses','result_frame_forces'):
+        model.session.execute(text('DELETE FROM %s'%table))
+    model.session.commit()
+
+def snapshot_test():
+    import os
+    from object_model.model import Model
+    path=model_path('snap.mdo')
+    model=object_model_fixture(path)
+    model.run(['L1'])
+    assert os.path.exists(model.snapshot_path())
+    d0=object_model_disps(model)
+    K0,M0=model.fe_model.K.tocsr(),model.fe_model.M.tocsr()
+    model.save()
+    model.close()
+    #an unchanged model is restored without meshing
+    model=Model()
+    model.open(path)
+    assert model.load_snapshot(model.content_hash())
+    assert model.fe_model.node_count==d0.shape[0]
+    assert abs(model.fe_model.K.tocsr()-K0).max()==0 and abs(model.fe_model.M.tocsr()-M0).max()==0
+    model.close()
+    model=Model()
+    model.open(path)
+    clear_results(model)
+    model.run(['L1'])
+    assert np.allclose(object_model_disps(model),d0,rtol=1e-10,atol=1e-15)
+    #a changed model is not restored from the snapshot
+    model.set_point_coordinate(model.get_point_name_by_coor(1,1,2)[0],1.1,1,2)
+    model.session.commit()
+    model.save()
+    model.close()
+    model=Model()
+    model.open(path)
+    assert not model.load_snapshot(model.content_hash())
+    model.close()
+    print("FE model snapshot is restored for the same content only")
+
+def patch_test():
+    from fe_model.symmetric import as_full
+    #a braced frame patched after the assembly and one assembled at once
+    brace=[[0,13]]
+    prop=[[2e11,0.3,4.265e-3,3.301e-6,6.572e-5,9.651e-8,7849]]
+    for fmt in ('full','triu','bsr'):
+        base=frame_model(fmt,storage='array')
+        base.add_beams(brace,prop)
+        base.assemble_KM(fmt)
+        base.assemble_f()
+        base.assemble_boundary()
+        solve_linear(base,method='direct')
+        model=frame_model(fmt,storage='array')
+        solve_linear(model,method='direct')
+        model.add_beams(brace,prop)
+        #the model stays assembled, old results are dropped
+        assert model.is_assembled and not model.is_solved
+        assert abs(as_full(model.K_,fmt)-as_full(base.K_,fmt)).max()<=1e-12*abs(as_full(base.K_,fmt)).max()
+        model.assemble_f()
+        model.assemble_boundary('f')
+        solve_linear(model,method='direct')
+        assert np.allclose(model.d_,base.d_,rtol=1e-10,atol=1e-10*np.abs(base.d_).max())
+    print("Patched matrices agree with assembled ones")
+
+def remesh_test():
+    import os
+    from object_model.model import Model
+    from object_model.orm import Frame
+    path=model_path('remesh.mdo')
+    model=object_model_fixture(path,n=4)
+    model.run(['L1'])
+    fe=model.fe_model
+    #change sections, move a point, add a brace, remove a beam and release
+    #a support
+    frames=[name for name, in model.session.query(Frame.name).order_by(Frame.id)]
+    for name in frames[3:8]:
+        model.session.query(Frame).filter_by(name=name).update({'section_name':'BIG'})
+    model.session.query(Frame).filter_by(name=frames[12]).delete()
+    model.set_point_coordinate(model.get_point_name_by_coor(2,2,2)[0],2.1,2.05,2.2)
+    model.add_frame((0,0,0),(1,1,1),'BIG')
+    model.set_point_restraint(model.get_point_name_by_coor(4,4,0)[0],[True,True,True,False,False,False])
+    model.session.commit()
+    clear_results(model)
+    model.run(['L1'])
+    #the FE model is patched instead of meshed again
+    assert model.fe_model is fe and fe.is_solved
+    d1=object_model_disps(model)
+    K1,M1,pn1=fe.K.tocsr(),fe.M.tocsr(),dict(model.pn_map)
+    model.save()
+    model.close()
+    os.remove(path[:-4]+'.fe.npz')
+    model=Model()
+    model.open(path)
+    clear_results(model)
+    model.run(['L1'])
+    assert np.allclose(object_model_disps(model),d1,rtol=1e-8,atol=1e-8*np.abs(d1).max())
+    names=sorted(pn1)
+    dofs=lambda pn:(np.array([pn[name] for name in names])[:,None]*6+np.arange(6)).reshape(-1)
+    d_1,d_2=dofs(pn1),dofs(model.pn_map)
+    K2,M2=model.fe_model.K.tocsr(),model.fe_model.M.tocsr()
+    assert abs(K1[d_1][:,d_1]-K2[d_2][:,d_2]).max()<=1e-12*abs(K2).max()
+    assert abs(M1[d_1][:,d_1]-M2[d_2][:,d_2]).max()<=1e-12*abs(M2).max()
+    model.close()
+    print("Remeshed model agrees with a full mesh")
+
+def reanalysis_test():
+    from fe_solver.reanalysis import Reanalysis,solve_reanalysis
+    col=(2e11,0.3,0.013,2.675e-5,3.435e-4,1.321e-6,7849)
+    big=(2e11,0.3,0.02,5e-5,6e-4,2e-6,7849)
+    for method in ('woodbury','pcg'):
+        model=frame_model(storage='array')
+        solve_linear(model,method='direct')
+        reanalysis=Reanalysis(model)
+        #stiffen two columns of the second storey, off the supports which
+        #are penalized in K_, node hid i+9 is above node i
+        hids=[9,13]
+        model.update_beams(hids,[[i,i+9] for i in hids],[big]*2)
+        model.assemble_f()
+        model.assemble_boundary('f')
+        solve_reanalysis(model,reanalysis,method,check=True)
+        info=model.solve_info
+        assert info['converged'] and not info['refactorized'] and info['rank']>0
+        assert info['error']<1e-8
+        d=model.d_.copy()
+        solve_linear(model,method='direct')
+        assert np.allclose(d,model.d_,rtol=1e-8,atol=1e-8*np.abs(model.d_).max())
+        #back to the base design, then past max_rank
+        model.update_beams(hids,[[i,i+9] for i in hids],[col]*2)
+        model.assemble_f()
+        model.assemble_boundary('f')
+        solve_reanalysis(model,reanalysis,method,check=True)
+        assert model.solve_info['error']<1e-8
+        reanalysis.max_rank=1
+        model.update_beams(hids,[[i,i+9] for i in hids],[big]*2)
+        model.assemble_f()
+        model.assemble_boundary('f')
+        solve_reanalysis(model,reanalysis,method,check=True)
+        info=model.solve_info
+        assert info['refactorized'] and info['rank']==0 and info['error']<1e-10
+        assert np.allclose(model.d_,d,rtol=1e-8,atol=1e-8*np.abs(d).max())
+    print("Re-analysis agrees with refactorization")
+
+def preconditioner_test():
+    from fe_solver.preconditioner import pyamg,incomplete_cholesky,rigid_body_modes
+    #incomplete Cholesky is symmetric and positive definite
+    model=frame_model()
+    P=incomplete_cholesky(model.K_,drop_tol=1e-2)
+    x,y=np.random.RandomState(0).rand(2,model.node_count*6)
+    assert abs(x.dot(P.matvec(y))-y.dot(P.matvec(x)))<=1e-10*abs(x.dot(P.matvec(y)))
+    assert x.dot(P.matvec(x))>0 and np.allclose(P.rmatvec(x),P.matvec(x))
+    #rigid body modes are the null space of the unrestrained matrix
+    B=rigid_body_modes(model.node_coordinates())
+    K=model.K.toarray()
+    assert abs(K.dot(B)).max()<=1e-8*abs(K).max()*abs(B).max()
+    if pyamg is None:
+        print("pyamg is not installed, algebraic multigrid is skipped")
+        return
+    base=frame_model(n=4,storeys=4)
+    solve_linear(base,method='direct')
+    model=frame_model(n=4,storeys=4)
+    solve_linear(model,method='cg',precond='amg',tol=1e-12)
+    assert model.solve_info['converged'] and not model.solve_info['fallback']
+    assert np.allclose(model.d_,base.d_,rtol=1e-8,atol=1e-8*np.abs(base.d_).max())
+    print("Preconditioners are symmetric and agree with the direct solver")
+
+def damped_bar(damping):
+    """
+    Axial bar fixed at one end, the free end moves along x only, so the 
+    model is a single degree of freedom system.
+    """
+    model=FEModel()
+    model.add_node(0,0,0)
+    model.add_node(3,0,0)
+    model.add_beam(0,1,2e11,0.3,4.265e-3,3.301e-6,6.572e-5,9.651e-8,7849)
+    model.set_node_restraint(0,[True]*6)
+    model.set_node_restraint(1,[False,True,True,True,True,True])
+    model.damping=damping
+    model.assemble_KM()
+    model.assemble_f()
+    model.assemble_boundary()
+    return model
+
+def damping_test():
+    from fe_model.damping import RayleighDamping,ModalDamping
+    from fe_solver.dynamic import Newmark_beta,Wilson_theta
+    model=damped_bar(None)
+    w=np.sqrt(model.K_[6,6]/model.M_[6,6])
+    xi=0.05
+    Tn=2*np.pi/w
+    T=np.arange(0,2*Tn,Tn/1000)
+    F=[np.zeros(12)]*T.shape[0]
+    u0,v0,a0=np.zeros((3,12))
+    u0[6]=1e-3
+    a0[6]=-w**2*u0[6]
+    #free vibration of a damped single degree of freedom system
+    wd=w*np.sqrt(1-xi**2)
+    ue=u0[6]*np.exp(-xi*w*T)*(np.cos(wd*T)+xi/np.sqrt(1-xi**2)*np.sin(wd*T))
+    #a mode with zero damping ratio is kept in the low-rank part
+    dampings=[RayleighDamping.from_ratios(xi,w),ModalDamping([xi,0.],[w,1.],np.eye(12)[:,[6,7]])]
+    for damping in dampings:
+        for integrator in (Newmark_beta,Wilson_theta):
+            model=damped_bar(damping)
+            with np.errstate(divide='raise'):
+                res=integrator(model,T,F,u0,v0,a0)
+            assert abs(res['u'][:,6]-ue).max()<=1e-4*u0[6]
+        #C is an operator, K_ keeps the index arrays of K
+        report=model.memory_audit()
+        assert 'C' not in report['matrices'] and 'C_' not in report['matrices']
+        assert np.shares_memory(model.K_.indices,model.K.indices)
+        assert report['shared']>=model.K_.indices.nbytes+model.K_.indptr.nbytes
+    print("Damped responses agree with the analytic solution")
+
+simply_released_beam_test()
+condense_batch_test()
+array_storage_test()
+Membrane4_contruction_test()
+membrane_stress_test()
+storage_format_test()
+iterative_solver_test()
+mixed_precision_test()
+out_of_core_test()
+substructure_test()
+reduction_test()
+save_test()
+merge_points_test()
+migration_test()
+snapshot_test()
+patch_test()
+remesh_test()
+reanalysis_test()
+preconditioner_test()
+damping_test()